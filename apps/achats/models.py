@@ -4,6 +4,7 @@ from django.db import transaction
 from apps.produits.models import Produit
 from apps.stock.models import MouvementStock
 from apps.finance.models import Transaction
+from apps.dashboard.models import Compteur
 
 User = get_user_model()
 
@@ -58,12 +59,12 @@ class Achat(models.Model):
             from django.utils import timezone
             today = timezone.now()
             prefix = f"A{today.strftime('%Y%m%d')}"
-            last_purchase = Achat.objects.filter(numero__startswith=prefix).order_by('-numero').first()
-            if last_purchase:
-                last_num = int(last_purchase.numero[-4:])
-                new_num = last_num + 1
-            else:
-                new_num = 1
+            
+            def dernier_numero():
+                # Only used once per day, when the day's counter is created
+                return Compteur.dernier_suffixe(Achat.objects.all(), 'numero', prefix)
+            
+            new_num = Compteur.suivant(prefix, initial=dernier_numero)
             self.numero = f"{prefix}{new_num:04d}"
         
         super().save(*args, **kwargs)
@@ -84,17 +85,19 @@ class Achat(models.Model):
             raise ValueError("Seuls les achats commandés peuvent être reçus")
         
         with transaction.atomic():
-            # Update stock for each item
-            for item in self.items.all():
-                MouvementStock.create_mouvement(
-                    produit=item.produit,
-                    quantite=item.quantite_recue or item.quantite,
-                    source='achat',
-                    user=self.utilisateur,
-                    reference=self.numero
-                )
-                
-                # Update product purchase price
+            items = list(self.items.select_related('produit'))
+            
+            # Le coût moyen (CUMP) est tenu par les mouvements au prix de chaque ligne
+            MouvementStock.create_mouvements(
+                [(item.produit, item.quantite_recue or item.quantite) for item in items],
+                source='achat',
+                user=self.utilisateur,
+                reference=self.numero,
+                couts=[item.prix_unitaire for item in items]
+            )
+            
+            for item in items:
+                # prix_achat reste le dernier prix payé
                 item.produit.prix_achat = item.prix_unitaire
                 item.produit.save(update_fields=['prix_achat'])
             
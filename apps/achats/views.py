@@ -8,12 +8,11 @@ from django.db.models import Sum
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-import csv
-from openpyxl import Workbook
 from .models import Achat, AchatItem, Fournisseur
 from .forms import AchatForm, AchatItemFormSet, FournisseurForm, FournisseurQuickForm
 from apps.produits.models import Categorie
 from apps.users.decorators import manager_or_admin_cashier_required
+from apps.dashboard.exports import ExportMixin, reponse_csv, reponse_xlsx, choix, date_format
 from django.utils.decorators import method_decorator
 
 
@@ -197,8 +196,26 @@ class FournisseurQuickCreateView(LoginRequiredMixin, UserPassesTestMixin, View):
             })
 
 
-class ExportAchatsView(LoginRequiredMixin, View):
+class ExportAchatsView(LoginRequiredMixin, ExportMixin, View):
+    type_export = 'achats'
+    nom_fichier = 'achats'
+    titre = "Achats"
+    colonnes = [
+        ('Numéro', 'numero'),
+        ('Fournisseur', 'fournisseur__nom'),
+        ('Date', 'date_achat', date_format('%d/%m/%Y')),
+        ('Statut', 'statut', choix(Achat.STATUT_CHOICES)),
+        ('Total TTC', 'total_ttc'),
+    ]
+    
+    @classmethod
+    def export_queryset(cls, parametres):
+        return Achat.objects.all()
+    
     def get(self, request):
+        if request.GET.get('arriere_plan'):
+            return self.lancer_export(request)
+        
         format_export = request.GET.get('format', 'csv')
         
         if format_export == 'excel':
@@ -207,46 +224,7 @@ class ExportAchatsView(LoginRequiredMixin, View):
             return self.export_csv()
     
     def export_csv(self):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="achats.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Numéro', 'Fournisseur', 'Date', 'Statut', 'Total TTC'])
-        
-        for achat in Achat.objects.select_related('fournisseur'):
-            writer.writerow([
-                achat.numero,
-                achat.fournisseur.nom,
-                achat.date_achat.strftime('%d/%m/%Y'),
-                achat.get_statut_display(),
-                achat.total_ttc
-            ])
-        
-        return response
+        return reponse_csv(self.export_queryset(self.request.GET), self.colonnes, 'achats.csv')
     
     def export_excel(self):
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Achats"
-        
-        # Headers
-        headers = ['Numéro', 'Fournisseur', 'Date', 'Statut', 'Total TTC']
-        ws.append(headers)
-        
-        # Data
-        for achat in Achat.objects.select_related('fournisseur'):
-            ws.append([
-                achat.numero,
-                achat.fournisseur.nom,
-                achat.date_achat.strftime('%d/%m/%Y'),
-                achat.get_statut_display(),
-                float(achat.total_ttc)
-            ])
-        
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename="achats.xlsx"'
-        wb.save(response)
-        
-        return response
\ No newline at end of file
+        return reponse_xlsx(self.export_queryset(self.request.GET), self.colonnes, 'achats.xlsx', self.titre)
\ No newline at end of file
@@ -9,7 +9,7 @@ from datetime import timedelta
 import json
 
 from apps.produits.models import Produit, Categorie
-from apps.ventes.models import Vente, VenteItem
+from apps.ventes.models import Vente, VenteDailyRollup
 from apps.achats.models import Achat, Fournisseur
 from apps.finance.models import Transaction
 from apps.stock.models import MouvementStock
@@ -38,6 +38,7 @@ class Shop360AdminSite(AdminSite):
         today = timezone.now().date()
         debut_mois = today.replace(day=1)
         debut_semaine = today - timedelta(days=today.weekday())
+        totaux_jour = VenteDailyRollup.totaux(today)
         
         # Statistiques générales
         stats = {
@@ -46,17 +47,11 @@ class Shop360AdminSite(AdminSite):
             'total_fournisseurs': Fournisseur.objects.filter(actif=True).count(),
             'total_users': User.objects.filter(is_active=True).count(),
             
-            # Ventes
-            'ventes_aujourd_hui': Vente.objects.filter(date_vente__date=today).count(),
-            'ca_aujourd_hui': Vente.objects.filter(date_vente__date=today).aggregate(
-                total=Sum('total_ttc')
-            )['total'] or 0,
-            'ca_semaine': Vente.objects.filter(date_vente__date__gte=debut_semaine).aggregate(
-                total=Sum('total_ttc')
-            )['total'] or 0,
-            'ca_mois': Vente.objects.filter(date_vente__date__gte=debut_mois).aggregate(
-                total=Sum('total_ttc')
-            )['total'] or 0,
+            # Ventes (agrégats journaliers)
+            'ventes_aujourd_hui': totaux_jour['nombre_ventes'],
+            'ca_aujourd_hui': totaux_jour['ca'],
+            'ca_semaine': VenteDailyRollup.totaux(debut_semaine, today)['ca'],
+            'ca_mois': VenteDailyRollup.totaux(debut_mois, today)['ca'],
             
             # Stock
             'stock_critique': Produit.objects.filter(
@@ -81,23 +76,19 @@ class Shop360AdminSite(AdminSite):
         }
         
         # Top produits
-        top_produits = VenteItem.objects.filter(
-            vente__date_vente__date__gte=debut_mois
-        ).values('produit__nom').annotate(
+        top_produits = VenteDailyRollup.periode(debut_mois, today).values('produit__nom').annotate(
             total_vendu=Sum('quantite'),
-            ca=Sum('total_ttc')
+            ca=Sum('chiffre_affaires')
         ).order_by('-total_vendu')[:5]
         
         # Évolution des ventes (7 derniers jours)
+        ventes_par_jour = VenteDailyRollup.par_jour(today - timedelta(days=6), today)
         ventes_evolution = []
         for i in range(7):
             date = today - timedelta(days=6-i)
-            ca = Vente.objects.filter(date_vente__date=date).aggregate(
-                total=Sum('total_ttc')
-            )['total'] or 0
             ventes_evolution.append({
                 'date': date.strftime('%d/%m'),
-                'ca': float(ca)
+                'ca': float(ventes_par_jour.get(date, {}).get('ca', 0))
             })
         
         # Évolution financière (recettes vs dépenses)
@@ -228,12 +219,12 @@ admin_site = Shop360AdminSite(name='shop360_admin')
 
 # Enregistrer tous les modèles
 from apps.produits.admin import ProduitAdmin, CategorieAdmin
-from apps.ventes.admin import VenteAdmin
+from apps.ventes.admin import VenteAdmin, ClientAdmin, VenteDailyRollupAdmin
 from apps.achats.admin import AchatAdmin, FournisseurAdmin
 from apps.finance.admin import TransactionAdmin, BudgetAdmin, CaisseFondsAdmin
-from apps.stock.admin import MouvementStockAdmin, InventaireAdmin
+from apps.stock.admin import MouvementStockAdmin, InventaireAdmin, StockSnapshotAdmin
 from apps.users.admin import UserAdmin, UserSessionAdmin, DailyAttendanceAdmin
-from apps.dashboard.models import Notification, ParametreSysteme
+from apps.dashboard.models import Notification, ParametreSysteme, Compteur, ExportJob
 
 admin_site.register(Produit, ProduitAdmin)
 admin_site.register(Categorie, CategorieAdmin)
@@ -247,11 +238,17 @@ admin_site.register(UserSession, UserSessionAdmin)
 admin_site.register(DailyAttendance, DailyAttendanceAdmin)
 
 # Enregistrer les modèles manquants
-from apps.stock.models import Inventaire, InventaireItem
+from apps.stock.models import Inventaire, InventaireItem, StockSnapshot
 from apps.finance.models import Budget, CaisseFonds
+from apps.ventes.models import Client
 
 admin_site.register(Inventaire, InventaireAdmin)
+admin_site.register(StockSnapshot, StockSnapshotAdmin)
 admin_site.register(Budget, BudgetAdmin)
 admin_site.register(CaisseFonds, CaisseFondsAdmin)
+admin_site.register(Client, ClientAdmin)
+admin_site.register(VenteDailyRollup, VenteDailyRollupAdmin)
 admin_site.register(Notification)
-admin_site.register(ParametreSysteme)
\ No newline at end of file
+admin_site.register(ParametreSysteme)
+admin_site.register(Compteur)
+admin_site.register(ExportJob)
\ No newline at end of file
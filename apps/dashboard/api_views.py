@@ -6,7 +6,7 @@ from django.utils import timezone
 from datetime import timedelta
 
 from apps.produits.models import Produit
-from apps.ventes.models import Vente, VenteItem
+from apps.ventes.models import VenteDailyRollup
 from apps.achats.models import Achat
 from apps.finance.models import Transaction
 
@@ -17,16 +17,13 @@ class DashboardStatsView(APIView):
     def get(self, request):
         today = timezone.now().date()
         debut_mois = today.replace(day=1)
+        totaux_jour = VenteDailyRollup.totaux(today)
         
         # Core statistics
         stats = {
-            'ventes_aujourd_hui': Vente.objects.filter(date_vente__date=today).count(),
-            'ca_aujourd_hui': Vente.objects.filter(date_vente__date=today).aggregate(
-                total=Sum('total_ttc')
-            )['total'] or 0,
-            'ca_mois': Vente.objects.filter(date_vente__date__gte=debut_mois).aggregate(
-                total=Sum('total_ttc')
-            )['total'] or 0,
+            'ventes_aujourd_hui': totaux_jour['nombre_ventes'],
+            'ca_aujourd_hui': totaux_jour['ca'],
+            'ca_mois': VenteDailyRollup.totaux(debut_mois, today)['ca'],
             'stock_critique': Produit.objects.filter(
                 quantite_stock__lte=F('seuil_alerte')
             ).count(),
@@ -63,20 +60,16 @@ class ChartDataView(APIView):
     
     def get_sales_evolution(self, start_date, end_date):
         """Sales evolution over time."""
+        ventes_par_jour = VenteDailyRollup.par_jour(start_date, end_date)
         data = []
         current_date = start_date
         
         while current_date <= end_date:
-            ca = Vente.objects.filter(date_vente__date=current_date).aggregate(
-                total=Sum('total_ttc')
-            )['total'] or 0
-            
-            nb_ventes = Vente.objects.filter(date_vente__date=current_date).count()
-            
+            jour = ventes_par_jour.get(current_date, {})
             data.append({
                 'date': current_date.isoformat(),
-                'ca': float(ca),
-                'nb_ventes': nb_ventes
+                'ca': float(jour.get('ca', 0)),
+                'nb_ventes': jour.get('nombre_ventes', 0)
             })
             
             current_date += timedelta(days=1)
@@ -85,25 +78,28 @@ class ChartDataView(APIView):
     
     def get_top_products(self, start_date, end_date):
         """Top selling products."""
-        return list(VenteItem.objects.filter(
-            vente__date_vente__date__range=[start_date, end_date]
-        ).values(
+        return list(VenteDailyRollup.periode(start_date, end_date).values(
             'produit__nom'
         ).annotate(
             quantite_vendue=Sum('quantite'),
-            ca=Sum('total_ttc')
+            ca=Sum('chiffre_affaires')
         ).order_by('-quantite_vendue')[:10])
     
     def get_category_distribution(self, start_date, end_date):
         """Sales distribution by category."""
-        return list(VenteItem.objects.filter(
-            vente__date_vente__date__range=[start_date, end_date]
-        ).values(
-            'produit__categorie__nom'
-        ).annotate(
-            total=Sum('total_ttc'),
-            quantite=Sum('quantite')
-        ).order_by('-total'))
+        return [
+            {
+                'produit__categorie__nom': c['categorie__nom'],
+                'total': c['total'],
+                'quantite': c['quantite']
+            }
+            for c in VenteDailyRollup.periode(start_date, end_date).values(
+                'categorie__nom'
+            ).annotate(
+                total=Sum('chiffre_affaires'),
+                quantite=Sum('quantite')
+            ).order_by('-total')
+        ]
     
     def get_financial_overview(self, start_date, end_date):
         """Financial overview for the period."""
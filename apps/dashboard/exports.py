@@ -0,0 +1,252 @@
+"""Streaming exports shared by the ventes, achats and finance views.
+
+An export is described by a list of columns ``(entete, champ)`` or
+``(entete, champ, formater)``. Rows are read with ``values_list`` in
+chunks through ``.iterator()`` so memory stays flat whatever the size of
+the queryset, and the response starts before the query has finished.
+
+XLSX files cannot be produced incrementally on the wire: they are written
+with an openpyxl write-only workbook into a temporary file, which is then
+streamed back. Rows beyond the Excel limit continue on a new sheet.
+
+Export views mix in ExportMixin; with ``?arriere_plan=1`` they queue an
+ExportJob instead, which the ``traiter_exports`` command runs through
+executer_export() and stores under EXPORT_ROOT, outside MEDIA_ROOT:
+files are only downloaded through the owner-checked dashboard view.
+"""
+import csv
+import secrets
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.files import File
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from openpyxl import Workbook
+
+from .models import ExportJob, Notification
+
+# Limite Excel : 1 048 576 lignes par feuille, en-tête compris
+XLSX_MAX_LIGNES = 1048576
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class _Tampon:
+    """File-like object for csv.writer that hands back each written line."""
+
+    def write(self, valeur):
+        return valeur
+
+
+def choix(choices):
+    """Formatter turning a stored choice value into its label."""
+    libelles = dict(choices)
+    return lambda valeur: libelles.get(valeur, valeur)
+
+
+def date_format(format_date):
+    """Formatter applying strftime to a date/datetime value."""
+    return lambda valeur: valeur.strftime(format_date)
+
+
+def lignes_export(queryset, colonnes, taille_lot=None, suivi=None):
+    """Yield formatted rows of ``queryset`` for the given columns.
+
+    ``suivi`` is called with the number of rows read so far after each
+    chunk, and once more at the end.
+    """
+    taille_lot = taille_lot or settings.EXPORT_TAILLE_LOT
+    champs = [colonne[1] for colonne in colonnes]
+    formateurs = [colonne[2] if len(colonne) > 2 else None for colonne in colonnes]
+
+    nombre = 0
+    for valeurs in queryset.values_list(*champs).iterator(chunk_size=taille_lot):
+        yield [
+            formater(valeur) if formater and valeur is not None else valeur
+            for valeur, formater in zip(valeurs, formateurs)
+        ]
+        nombre += 1
+        if suivi and nombre % taille_lot == 0:
+            suivi(nombre)
+    if suivi:
+        suivi(nombre)
+
+
+def reponse_csv(queryset, colonnes, nom_fichier, taille_lot=None):
+    """Stream ``queryset`` as a CSV attachment."""
+    writer = csv.writer(_Tampon())
+
+    def contenu():
+        yield writer.writerow([colonne[0] for colonne in colonnes])
+        for ligne in lignes_export(queryset, colonnes, taille_lot):
+            yield writer.writerow(ligne)
+
+    response = StreamingHttpResponse(contenu(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    return response
+
+
+def ecrire_csv(fichier, queryset, colonnes, taille_lot=None, suivi=None):
+    """Write ``queryset`` as UTF-8 CSV to the binary file ``fichier``."""
+    writer = csv.writer(_Tampon())
+    fichier.write(writer.writerow([colonne[0] for colonne in colonnes]).encode('utf-8'))
+    nombre = 0
+    for ligne in lignes_export(queryset, colonnes, taille_lot, suivi):
+        fichier.write(writer.writerow(ligne).encode('utf-8'))
+        nombre += 1
+    return nombre
+
+
+def ecrire_xlsx(fichier, queryset, colonnes, titre, taille_lot=None, max_lignes=XLSX_MAX_LIGNES,
+                suivi=None):
+    """Write ``queryset`` to ``fichier`` as XLSX, one row in memory at a time.
+
+    A new sheet ("<titre> (2)", ...) is started every ``max_lignes`` rows.
+    Returns the number of data rows written.
+    """
+    wb = Workbook(write_only=True)
+    entetes = [colonne[0] for colonne in colonnes]
+    ws = None
+    lignes_feuille = nombre = 0
+
+    for ligne in lignes_export(queryset, colonnes, taille_lot, suivi):
+        if ws is None or lignes_feuille >= max_lignes:
+            feuille = len(wb.worksheets) + 1
+            ws = wb.create_sheet(titre if feuille == 1 else f"{titre[:25]} ({feuille})")
+            ws.append(entetes)
+            lignes_feuille = 1
+        ws.append(ligne)
+        lignes_feuille += 1
+        nombre += 1
+
+    if ws is None:
+        wb.create_sheet(titre).append(entetes)
+
+    wb.save(fichier)
+    return nombre
+
+
+def reponse_xlsx(queryset, colonnes, nom_fichier, titre, taille_lot=None):
+    """Build the XLSX in a temporary file and stream it as an attachment."""
+    fichier = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        ecrire_xlsx(fichier, queryset, colonnes, titre, taille_lot)
+        fichier.seek(0)
+    except Exception:
+        fichier.close()
+        raise
+
+    # FileResponse lit le fichier par blocs et le ferme (donc le supprime) à la fin
+    return FileResponse(
+        fichier, as_attachment=True, filename=nom_fichier, content_type=XLSX_CONTENT_TYPE
+    )
+
+
+# Vues d'export utilisables en arrière-plan, par type d'ExportJob
+EXPORTS = {
+    'ventes': 'apps.ventes.views.ExportVentesView',
+    'achats': 'apps.achats.views.ExportAchatsView',
+    'transactions': 'apps.finance.views.ExportFinanceView',
+}
+
+
+class ExportMixin:
+    """Column layout, filters and background mode shared by export views.
+
+    Subclasses set ``type_export``, ``nom_fichier``, ``titre``, ``colonnes``
+    and ``filtres`` (the GET parameters understood by ``export_queryset``).
+    """
+    type_export = None
+    nom_fichier = None
+    titre = None
+    colonnes = []
+    filtres = []
+
+    @classmethod
+    def export_queryset(cls, parametres):
+        raise NotImplementedError
+
+    def lancer_export(self, request):
+        """Queue an ExportJob with the current filters instead of exporting inline."""
+        job = ExportJob.objects.create(
+            type=self.type_export,
+            format='excel' if request.GET.get('format') == 'excel' else 'csv',
+            parametres={cle: request.GET[cle] for cle in self.filtres if request.GET.get(cle)},
+            utilisateur=request.user,
+        )
+
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse({
+                'success': True,
+                'id': job.pk,
+                'statut_url': reverse('dashboard:export_statut', args=[job.pk]),
+            }, status=202)
+
+        messages.success(request, "Export lancé en arrière-plan. Une notification vous sera envoyée à la fin.")
+        return redirect(request.META.get('HTTP_REFERER') or '/')
+
+
+def executer_export(job):
+    """Generate the file of a claimed ExportJob and notify its owner."""
+    try:
+        vue = import_string(EXPORTS[job.type])
+        queryset = vue.export_queryset(job.parametres)
+        job.lignes_total = queryset.count()
+        ExportJob.objects.filter(pk=job.pk).update(lignes_total=job.lignes_total)
+
+        def suivi(nombre):
+            progression = min(99, nombre * 100 // job.lignes_total) if job.lignes_total else 99
+            ExportJob.objects.filter(pk=job.pk).update(lignes_traitees=nombre, progression=progression)
+
+        extension = 'xlsx' if job.format == 'excel' else 'csv'
+        with tempfile.TemporaryFile() as fichier:
+            if job.format == 'excel':
+                nombre = ecrire_xlsx(fichier, queryset, vue.colonnes, vue.titre, suivi=suivi)
+            else:
+                nombre = ecrire_csv(fichier, queryset, vue.colonnes, suivi=suivi)
+            fichier.seek(0)
+            # Jeton aléatoire : le chemin du fichier ne se devine pas à partir du numéro du job
+            job.fichier.save(
+                f"{vue.nom_fichier}_{job.pk}_{secrets.token_hex(16)}.{extension}", File(fichier), save=False
+            )
+    except Exception as e:
+        job.statut = 'echec'
+        job.erreur = str(e)
+        job.date_fin = timezone.now()
+        job.save(update_fields=['statut', 'erreur', 'date_fin'])
+        Notification.objects.create(
+            titre="Échec de l'export",
+            message=f"L'export {job.get_type_display().lower()} a échoué : {e}",
+            type="danger",
+            utilisateur=job.utilisateur,
+        )
+        raise
+
+    job.statut = 'termine'
+    job.lignes_traitees = nombre
+    job.progression = 100
+    job.date_fin = timezone.now()
+    job.date_expiration = job.date_fin + timedelta(hours=settings.EXPORT_DUREE_HEURES)
+    if not ExportJob.objects.filter(pk=job.pk, statut='en_cours').update(
+        statut=job.statut, lignes_traitees=nombre, progression=100, fichier=job.fichier.name,
+        date_fin=job.date_fin, date_expiration=job.date_expiration,
+    ):
+        # Job passé en échec par expirer_bloques() entre-temps : le fichier n'est plus attendu
+        job.fichier.delete(save=False)
+        job.refresh_from_db()
+        return job
+
+    Notification.objects.create(
+        titre="Export prêt",
+        message=f"Export {job.get_type_display().lower()} ({nombre} lignes) disponible "
+                f"jusqu'au {timezone.localtime(job.date_expiration).strftime('%d/%m/%Y %H:%M')}",
+        type="success",
+        utilisateur=job.utilisateur,
+        url=reverse('dashboard:export_telecharger', args=[job.pk]),
+    )
+    return job
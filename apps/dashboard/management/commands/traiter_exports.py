@@ -0,0 +1,54 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.dashboard.models import ExportJob
+from apps.dashboard.exports import executer_export
+
+
+class Command(BaseCommand):
+    help = 'Run queued background exports (ExportJob), fail stalled ones and purge expired files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--une-fois',
+            action='store_true',
+            help='Process the pending jobs then exit instead of polling',
+        )
+        parser.add_argument(
+            '--intervalle',
+            type=int,
+            help='Seconds between two polls of the queue (default: EXPORT_INTERVALLE_SECONDES)',
+        )
+
+    def handle(self, *args, **options):
+        intervalle = options['intervalle'] if options['intervalle'] is not None else settings.EXPORT_INTERVALLE_SECONDES
+
+        try:
+            while True:
+                bloques = ExportJob.expirer_bloques()
+                if bloques:
+                    self.stdout.write(self.style.WARNING(f'{bloques} stalled export(s) marked as failed'))
+
+                purges = ExportJob.purger_expires()
+                if purges:
+                    self.stdout.write(f'{purges} expired export file(s) deleted')
+
+                job = ExportJob.prendre_suivant()
+                if job is None:
+                    if options['une_fois']:
+                        break
+                    time.sleep(intervalle)
+                    continue
+
+                self.stdout.write(f'Export #{job.pk} ({job.type}, {job.format})...')
+                try:
+                    executer_export(job)
+                except Exception as e:
+                    # Le job est marqué en échec ; le worker continue
+                    self.stdout.write(self.style.ERROR(f'Export #{job.pk} failed: {e}'))
+                else:
+                    self.stdout.write(
+                        self.style.SUCCESS(f'Export #{job.pk} done: {job.lignes_traitees} row(s)')
+                    )
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
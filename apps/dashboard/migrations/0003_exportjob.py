@@ -0,0 +1,43 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:38
+
+import apps.dashboard.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_compteur'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('ventes', 'Ventes'), ('achats', 'Achats'), ('transactions', 'Transactions')], max_length=20)),
+                ('format', models.CharField(choices=[('csv', 'CSV'), ('excel', 'Excel')], default='csv', max_length=10)),
+                ('parametres', models.JSONField(blank=True, default=dict, help_text="Filtres de la vue d'export")),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('termine', 'Terminé'), ('echec', 'Échec'), ('expire', 'Expiré')], default='en_attente', max_length=20)),
+                ('progression', models.PositiveSmallIntegerField(default=0)),
+                ('lignes_total', models.PositiveIntegerField(default=0)),
+                ('lignes_traitees', models.PositiveIntegerField(default=0)),
+                ('fichier', models.FileField(blank=True, storage=apps.dashboard.models.stockage_exports, upload_to='%Y/%m/')),
+                ('erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_debut', models.DateTimeField(blank=True, null=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+                ('date_expiration', models.DateTimeField(blank=True, null=True)),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exports', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Export',
+                'verbose_name_plural': 'Exports',
+                'ordering': ['-date_creation'],
+                'indexes': [models.Index(fields=['statut', 'date_creation'], name='dashboard_e_statut_ddab23_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,9 @@
-from django.db import models
+import threading
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction, IntegrityError
+from django.db.models import BigIntegerField, F, Max
+from django.db.models.functions import Cast, Substr
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -44,4 +49,204 @@ class ParametreSysteme(models.Model):
         verbose_name_plural = "Paramètres système"
     
     def __str__(self):
-        return self.nom_boutique
\ No newline at end of file
+        return self.nom_boutique
+
+class Compteur(models.Model):
+    """Compteur de numérotation (ex. un par jour et par type de document)."""
+    cle = models.CharField(max_length=50, unique=True)
+    valeur = models.PositiveBigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Compteur"
+        verbose_name_plural = "Compteurs"
+    
+    def __str__(self):
+        return f"{self.cle} = {self.valeur}"
+    
+    @classmethod
+    def allouer(cls, cle, nombre=1, initial=None):
+        """Reserve `nombre` consecutive values for `cle` and return the first one.
+        
+        The increment is a single conditional UPDATE, so concurrent workers
+        never read the same value. `initial` is an optional callable giving
+        the starting value when the counter row does not exist yet.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(cle=cle).update(valeur=F('valeur') + nombre):
+                depart = initial() if initial else 0
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(cle=cle, valeur=depart + nombre)
+                except IntegrityError:
+                    # Un autre worker vient de créer la ligne
+                    cls.objects.filter(cle=cle).update(valeur=F('valeur') + nombre)
+            fin = cls.objects.filter(cle=cle).values_list('valeur', flat=True).get()
+        return fin - nombre + 1
+    
+    @staticmethod
+    def dernier_suffixe(queryset, champ, prefix):
+        """Largest numeric suffix of `champ` among the rows starting with `prefix` (0 if none).
+        
+        Compared as integers, so V...10000 comes after V...9999.
+        """
+        suffixe = Cast(Substr(champ, len(prefix) + 1), BigIntegerField())
+        dernier = queryset.filter(**{f'{champ}__startswith': prefix}).aggregate(dernier=Max(suffixe))['dernier']
+        return dernier or 0
+    
+    @classmethod
+    def suivant(cls, cle, initial=None):
+        """Return the next value for `cle`.
+        
+        The counter row stays locked until the caller's transaction ends, so
+        callers on a hot path (the checkout) allocate their number before
+        opening their own transaction. With NUMEROTATION_BLOC > 1 each
+        process reserves a block of values at once and serves them from
+        memory; numbers then stay unique but may leave gaps and are no
+        longer ordered across workers.
+        
+        A block reserved inside a transaction is only shared with other
+        requests once that transaction commits: if it rolls back, the
+        counter UPDATE is undone and the block is dropped with it.
+        """
+        taille = getattr(settings, 'NUMEROTATION_BLOC', 1)
+        if taille <= 1:
+            return cls.allouer(cle, initial=initial)
+        
+        with _blocs_lock:
+            prochain, fin = _blocs.get(cle, (0, 0))
+            if prochain < fin:
+                _blocs[cle] = (prochain + 1, fin)
+                return prochain
+        
+        prochain = cls.allouer(cle, nombre=taille, initial=initial)
+        transaction.on_commit(lambda: _publier_bloc(cle, prochain + 1, prochain + taille))
+        return prochain
+
+
+def _publier_bloc(cle, prochain, fin):
+    """Make a committed block available to the next calls of Compteur.suivant."""
+    with _blocs_lock:
+        actuel, actuel_fin = _blocs.get(cle, (0, 0))
+        if actuel >= actuel_fin:
+            _blocs[cle] = (prochain, fin)
+
+
+# Blocs pré-alloués par processus : {cle: (prochaine valeur, fin exclue)}
+_blocs = {}
+_blocs_lock = threading.Lock()
+
+
+def stockage_exports():
+    """Private storage of export files, outside MEDIA_ROOT (served by ExportTelechargerView only)."""
+    return FileSystemStorage(location=settings.EXPORT_ROOT, base_url=None)
+
+
+class ExportJob(models.Model):
+    """Export CSV/Excel exécuté en arrière-plan par la commande traiter_exports."""
+    TYPE_CHOICES = [
+        ('ventes', 'Ventes'),
+        ('achats', 'Achats'),
+        ('transactions', 'Transactions'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('excel', 'Excel'),
+    ]
+    
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('termine', 'Terminé'),
+        ('echec', 'Échec'),
+        ('expire', 'Expiré'),
+    ]
+    
+    type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    parametres = models.JSONField(default=dict, blank=True, help_text="Filtres de la vue d'export")
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default='en_attente')
+    progression = models.PositiveSmallIntegerField(default=0)
+    lignes_total = models.PositiveIntegerField(default=0)
+    lignes_traitees = models.PositiveIntegerField(default=0)
+    fichier = models.FileField(upload_to='%Y/%m/', storage=stockage_exports, blank=True)
+    erreur = models.TextField(blank=True)
+    utilisateur = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exports')
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_debut = models.DateTimeField(null=True, blank=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+    date_expiration = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Export"
+        verbose_name_plural = "Exports"
+        ordering = ['-date_creation']
+        indexes = [
+            models.Index(fields=['statut', 'date_creation']),
+        ]
+    
+    def __str__(self):
+        return f"Export {self.get_type_display()} ({self.get_format_display()}) - {self.get_statut_display()}"
+    
+    @property
+    def disponible(self):
+        return self.statut == 'termine' and bool(self.fichier)
+    
+    @classmethod
+    def prendre_suivant(cls):
+        """Claim the oldest pending job, or return None.
+        
+        The claim is a conditional UPDATE on the status, so several workers
+        can poll the same queue without running a job twice.
+        """
+        from django.utils import timezone
+        
+        while True:
+            job = cls.objects.filter(statut='en_attente').order_by('date_creation').first()
+            if job is None:
+                return None
+            if cls.objects.filter(pk=job.pk, statut='en_attente').update(
+                statut='en_cours', date_debut=timezone.now()
+            ):
+                job.refresh_from_db()
+                return job
+    
+    @classmethod
+    def expirer_bloques(cls):
+        """Fail the jobs left 'en_cours' for longer than EXPORT_DELAI_MINUTES.
+        
+        Their worker has died (or been killed) before finishing; the owner is
+        notified so the export can be started again. Returns the number of jobs.
+        """
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        limite = timezone.now() - timedelta(minutes=settings.EXPORT_DELAI_MINUTES)
+        nombre = 0
+        for job in cls.objects.filter(statut='en_cours', date_debut__lt=limite).select_related('utilisateur'):
+            if cls.objects.filter(pk=job.pk, statut='en_cours').update(
+                statut='echec', erreur="Délai dépassé", date_fin=timezone.now()
+            ):
+                Notification.objects.create(
+                    titre="Échec de l'export",
+                    message=f"L'export {job.get_type_display().lower()} n'a pas abouti dans le délai prévu. "
+                            "Relancez-le.",
+                    type="danger",
+                    utilisateur=job.utilisateur,
+                )
+                nombre += 1
+        return nombre
+    
+    @classmethod
+    def purger_expires(cls):
+        """Delete the files of expired exports; return how many were purged."""
+        from django.utils import timezone
+        
+        expires = cls.objects.filter(statut='termine', date_expiration__lt=timezone.now())
+        nombre = 0
+        for job in expires:
+            job.fichier.delete(save=False)
+            job.statut = 'expire'
+            job.save(update_fields=['fichier', 'statut'])
+            nombre += 1
+        return nombre
@@ -7,4 +7,6 @@ urlpatterns = [
     path('', views.DashboardView.as_view(), name='index'),
     path('analytics/', views.AnalyticsView.as_view(), name='analytics'),
     path('api/charts/', views.ChartDataView.as_view(), name='chart_data'),
+    path('exports/<int:pk>/', views.ExportStatutView.as_view(), name='export_statut'),
+    path('exports/<int:pk>/telecharger/', views.ExportTelechargerView.as_view(), name='export_telecharger'),
 ]
\ No newline at end of file
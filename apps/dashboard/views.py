@@ -1,17 +1,20 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView, View
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, Http404
 from django.db.models import Sum, Count, Avg, F
+from django.db.models.functions import ExtractMonth
 from django.utils import timezone
+from django.urls import reverse
 from datetime import datetime, timedelta
 import json
 
 from apps.produits.models import Produit
-from apps.ventes.models import Vente, VenteItem
+from apps.ventes.models import Vente, VenteDailyRollup
 from apps.achats.models import Achat
 from apps.stock.models import MouvementStock
 from apps.finance.models import Transaction
+from .models import ExportJob
 
 today = timezone.now().date()
 start_week = today - timedelta(days=today.weekday())
@@ -29,15 +32,12 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         debut_mois = today.replace(day=1)
         debut_semaine = today - timedelta(days=today.weekday())
         
-        # Sales statistics
-        ventes_aujourd_hui = Vente.objects.filter(date_vente__date=today)
-        context['ventes_aujourd_hui'] = ventes_aujourd_hui.count()
-        context['ca_aujourd_hui'] = ventes_aujourd_hui.aggregate(
-            total=Sum('total_ttc')
-        )['total'] or 0
+        # Sales statistics (agrégats journaliers)
+        totaux_jour = VenteDailyRollup.totaux(today)
+        context['ventes_aujourd_hui'] = totaux_jour['nombre_ventes']
+        context['ca_aujourd_hui'] = totaux_jour['ca']
         
-        ventes_hier = Vente.objects.filter(date_vente__date=yesterday)
-        ca_hier = ventes_hier.aggregate(total=Sum('total_ttc'))['total'] or 0
+        ca_hier = VenteDailyRollup.totaux(yesterday)['ca']
         
         # Calculate growth percentage
         context['croissance_ca'] = 0
@@ -45,13 +45,9 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             context['croissance_ca'] = ((context['ca_aujourd_hui'] - ca_hier) / ca_hier) * 100
         
         # Monthly statistics
-        context['ca_mois'] = Vente.objects.filter(
-            date_vente__date__gte=debut_mois
-        ).aggregate(total=Sum('total_ttc'))['total'] or 0
-        
-        context['ventes_mois'] = Vente.objects.filter(
-            date_vente__date__gte=debut_mois
-        ).count()
+        totaux_mois = VenteDailyRollup.totaux(debut_mois, today)
+        context['ca_mois'] = totaux_mois['ca']
+        context['ventes_mois'] = totaux_mois['nombre_ventes']
         
         # Stock statistics
         context['stock_total'] = Produit.objects.aggregate(
@@ -66,13 +62,11 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         context['solde_total'] = Transaction.get_solde()
         
         # Top products
-        context['top_produits'] = VenteItem.objects.filter(
-            vente__date_vente__date__gte=debut_mois
-        ).values(
+        context['top_produits'] = VenteDailyRollup.periode(debut_mois, today).values(
             'produit__nom'
         ).annotate(
             total_vendu=Sum('quantite'),
-            ca=Sum('total_ttc')
+            ca=Sum('chiffre_affaires')
         ).order_by('-total_vendu')[:5]
         
         # Recent activities
@@ -83,31 +77,27 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         )[:5]
         
         # Weekly sales chart data (last 7 days)
+        ventes_par_jour = VenteDailyRollup.par_jour(today - timedelta(days=6), today)
         ventes_semaine = []
         for i in range(7):
             date = today - timedelta(days=6-i)
-            ca_jour = Vente.objects.filter(date_vente__date=date).aggregate(
-                total=Sum('total_ttc')
-            )['total'] or 0
             ventes_semaine.append({
                 'date': date.strftime('%d/%m'),
-                'ca': float(ca_jour)
+                'ca': float(ventes_par_jour.get(date, {}).get('ca', 0))
             })
         
         context['ventes_semaine_json'] = json.dumps(ventes_semaine)
         
         # Sales by category
-        ventes_par_categorie = VenteItem.objects.filter(
-            vente__date_vente__date__gte=debut_mois
-        ).values(
-            'produit__categorie__nom'
+        ventes_par_categorie = VenteDailyRollup.periode(debut_mois, today).values(
+            'categorie__nom'
         ).annotate(
-            total=Sum('total_ttc')
+            total=Sum('chiffre_affaires')
         ).order_by('-total')
         
         context['ventes_par_categorie_json'] = json.dumps([
             {
-                'categorie': item['produit__categorie__nom'] or 'Sans catégorie',
+                'categorie': item['categorie__nom'] or 'Sans catégorie',
                 'total': float(item['total'])
             }
             for item in ventes_par_categorie
@@ -168,43 +158,39 @@ class AnalyticsView(LoginRequiredMixin, TemplateView):
         debut_annee = today.replace(month=1, day=1)
         
         # Monthly performance
+        ca_par_mois = dict(
+            VenteDailyRollup.periode(debut_annee, today).annotate(
+                mois=ExtractMonth('jour')
+            ).order_by().values('mois').annotate(
+                total=Sum('chiffre_affaires')
+            ).values_list('mois', 'total')
+        )
         mois_data = []
-        for i in range(12):
-            date = debut_annee.replace(month=i+1) if i < today.month else None
-            if date:
-                ca = Vente.objects.filter(
-                    date_vente__year=today.year,
-                    date_vente__month=i+1
-                ).aggregate(total=Sum('total_ttc'))['total'] or 0
-                
-                mois_data.append({
-                    'mois': date.strftime('%b'),
-                    'ca': float(ca)
-                })
+        for i in range(today.month):
+            date = debut_annee.replace(month=i+1)
+            mois_data.append({
+                'mois': date.strftime('%b'),
+                'ca': float(ca_par_mois.get(i+1, 0))
+            })
         
         context['performance_mensuelle_json'] = json.dumps(mois_data)
         
-        # Product performance
-        produits_performance = VenteItem.objects.filter(
-            vente__date_vente__date__gte=debut_mois
-        ).values(
+        # Product performance (un produit n'apparaît qu'une fois par vente)
+        produits_performance = VenteDailyRollup.periode(debut_mois, today).values(
             'produit__nom'
         ).annotate(
             quantite=Sum('quantite'),
-            ca=Sum('total_ttc'),
-            nb_ventes=Count('vente', distinct=True)
+            ca=Sum('chiffre_affaires'),
+            nb_ventes=Sum('lignes')
         ).order_by('-ca')[:10]
         
         context['produits_performance'] = list(produits_performance)
         
         # Sales statistics
+        totaux_mois = VenteDailyRollup.totaux(debut_mois, today)
         context['stats_ventes'] = {
-            'ca_moyen': VenteItem.objects.filter(
-                vente__date_vente__date__gte=debut_mois
-            ).aggregate(avg=Avg('total_ttc'))['avg'] or 0,
-            'panier_moyen': Vente.objects.filter(
-                date_vente__date__gte=debut_mois
-            ).aggregate(avg=Avg('total_ttc'))['avg'] or 0,
+            'ca_moyen': totaux_mois['ca'] / totaux_mois['lignes'] if totaux_mois['lignes'] else 0,
+            'panier_moyen': totaux_mois['ca'] / totaux_mois['nombre_ventes'] if totaux_mois['nombre_ventes'] else 0,
         }
 
         # ⚡ Ajouter max_ca pour le template
@@ -237,17 +223,14 @@ class ChartDataView(LoginRequiredMixin, View):
     
     def get_sales_chart_data(self, start_date, end_date):
         """Get daily sales data for chart."""
+        ventes_par_jour = VenteDailyRollup.par_jour(start_date, end_date)
         data = []
         current_date = start_date
         
         while current_date <= end_date:
-            ca = Vente.objects.filter(date_vente__date=current_date).aggregate(
-                total=Sum('total_ttc')
-            )['total'] or 0
-            
             data.append({
                 'date': current_date.strftime('%d/%m'),
-                'ca': float(ca)
+                'ca': float(ventes_par_jour.get(current_date, {}).get('ca', 0))
             })
             
             current_date += timedelta(days=1)
@@ -256,9 +239,7 @@ class ChartDataView(LoginRequiredMixin, View):
     
     def get_products_chart_data(self, start_date, end_date):
         """Get top products data for chart."""
-        produits = VenteItem.objects.filter(
-            vente__date_vente__date__range=[start_date, end_date]
-        ).values(
+        produits = VenteDailyRollup.periode(start_date, end_date).values(
             'produit__nom'
         ).annotate(
             quantite=Sum('quantite')
@@ -276,20 +257,48 @@ class ChartDataView(LoginRequiredMixin, View):
     
     def get_categories_chart_data(self, start_date, end_date):
         """Get sales by category data for chart."""
-        categories = VenteItem.objects.filter(
-            vente__date_vente__date__range=[start_date, end_date]
-        ).values(
-            'produit__categorie__nom'
+        categories = VenteDailyRollup.periode(start_date, end_date).values(
+            'categorie__nom'
         ).annotate(
-            total=Sum('total_ttc')
+            total=Sum('chiffre_affaires')
         ).order_by('-total')
         
         return {
             'categories': [
                 {
-                    'name': c['produit__categorie__nom'] or 'Sans catégorie',
+                    'name': c['categorie__nom'] or 'Sans catégorie',
                     'total': float(c['total'])
                 }
                 for c in categories
             ]
-        }
\ No newline at end of file
+        }
+
+
+class ExportStatutView(LoginRequiredMixin, View):
+    """Progress of a background export, polled by the UI."""
+    
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, utilisateur=request.user)
+        return JsonResponse({
+            'id': job.pk,
+            'statut': job.statut,
+            'progression': job.progression,
+            'lignes_traitees': job.lignes_traitees,
+            'lignes_total': job.lignes_total,
+            'erreur': job.erreur,
+            'url': reverse('dashboard:export_telecharger', args=[job.pk]) if job.disponible else None,
+        })
+
+
+class ExportTelechargerView(LoginRequiredMixin, View):
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, utilisateur=request.user)
+        if not job.disponible:
+            raise Http404("Export indisponible ou expiré")
+        try:
+            fichier = job.fichier.open('rb')
+        except FileNotFoundError:
+            raise Http404("Export indisponible ou expiré")
+        # Nom proposé sans le jeton aléatoire du fichier stocké
+        base, extension = job.fichier.name.rsplit('/', 1)[-1].rsplit('.', 1)
+        return FileResponse(fichier, as_attachment=True, filename=f"{base.rsplit('_', 1)[0]}.{extension}")
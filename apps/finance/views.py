@@ -10,8 +10,10 @@ from datetime import datetime, timedelta
 import csv
 from openpyxl import Workbook
 from .models import Transaction, Budget, CaisseFonds
+from apps.ventes.models import Paiement
 from .forms import TransactionForm, BudgetForm, MouvementCaisseForm
 from apps.users.decorators import manager_or_admin_cashier_required
+from apps.dashboard.exports import ExportMixin, reponse_csv, reponse_xlsx, choix, date_format
 from django.utils.decorators import method_decorator
 from django.core.exceptions import ValidationError
 import json
@@ -33,6 +35,7 @@ class FinanceOverviewView(LoginRequiredMixin, TemplateView):
         # --- Solde ---
         context['solde_total'] = Transaction.get_solde()
         context['solde_caisse'] = CaisseFonds.get_solde_caisse()
+        context['encaissements_jour'] = Paiement.totaux_par_mode(timezone.localdate())
         
         # --- Stats mensuelles & annuelles ---
         context['ca_mois'] = Transaction.get_ca_periode(debut_mois, today)
@@ -360,7 +363,23 @@ class RapportFinancierView(LoginRequiredMixin, UserPassesTestMixin, TemplateView
         return context
 
 
-class ExportFinanceView(LoginRequiredMixin, View):
+class ExportFinanceView(LoginRequiredMixin, ExportMixin, View):
+    # Colonnes des transactions ; les budgets gardent leur export dédié
+    type_export = 'transactions'
+    nom_fichier = 'transactions'
+    titre = "Transactions"
+    colonnes = [
+        ('Date', 'date', date_format('%d/%m/%Y')),
+        ('Type', 'type', choix(Transaction.TYPE_CHOICES)),
+        ('Montant', 'montant'),
+        ('Catégorie', 'categorie', choix(Transaction.CATEGORY_CHOICES)),
+        ('Description', 'description'),
+    ]
+    
+    @classmethod
+    def export_queryset(cls, parametres):
+        return Transaction.objects.all()
+    
     def get(self, request):
         format_export = request.GET.get('format', 'csv')
         type_export = request.GET.get('type', 'transactions')
@@ -371,55 +390,20 @@ class ExportFinanceView(LoginRequiredMixin, View):
             else:
                 return self.export_budgets_csv()
         else:
+            if request.GET.get('arriere_plan'):
+                return self.lancer_export(request)
             if format_export == 'excel':
                 return self.export_transactions_excel()
             else:
                 return self.export_transactions_csv()
     
     def export_transactions_csv(self):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="transactions.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Date', 'Type', 'Montant', 'Catégorie', 'Description'])
-        
-        for transaction in Transaction.objects.all():
-            writer.writerow([
-                transaction.date.strftime('%d/%m/%Y'),
-                transaction.get_type_display(),
-                transaction.montant,
-                transaction.get_categorie_display(),
-                transaction.description
-            ])
-        
-        return response
+        return reponse_csv(self.export_queryset(self.request.GET), self.colonnes, 'transactions.csv')
     
     def export_transactions_excel(self):
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Transactions"
-        
-        # Headers
-        headers = ['Date', 'Type', 'Montant', 'Catégorie', 'Description']
-        ws.append(headers)
-        
-        # Data
-        for transaction in Transaction.objects.all():
-            ws.append([
-                transaction.date.strftime('%d/%m/%Y'),
-                transaction.get_type_display(),
-                float(transaction.montant),
-                transaction.get_categorie_display(),
-                transaction.description
-            ])
-        
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return reponse_xlsx(
+            self.export_queryset(self.request.GET), self.colonnes, 'transactions.xlsx', self.titre
         )
-        response['Content-Disposition'] = 'attachment; filename="transactions.xlsx"'
-        wb.save(response)
-        
-        return response
     
     def export_budgets_csv(self):
         response = HttpResponse(content_type='text/csv')
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Categorie, Produit
+from .models import Categorie, Produit, CodeBarre
 
 
 @admin.register(Categorie)
@@ -9,14 +9,21 @@ class CategorieAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('nom',)} if hasattr(Categorie, 'slug') else {}
 
 
+class CodeBarreInline(admin.TabularInline):
+    model = CodeBarre
+    extra = 1
+    fields = ('code',)
+
+
 @admin.register(Produit)
 class ProduitAdmin(admin.ModelAdmin):
     list_display = ('nom', 'categorie', 'prix_vente', 'quantite_stock', 'stock_critique', 'actif')
     list_filter = ('categorie', 'actif', 'date_ajout')
-    search_fields = ('nom', 'description')
+    search_fields = ('nom', 'description', 'codes_barres__code')
     prepopulated_fields = {'slug': ('nom',)}
     list_editable = ('prix_vente', 'quantite_stock', 'actif')
     readonly_fields = ('date_ajout',)
+    inlines = [CodeBarreInline]
     
     fieldsets = (
         ('Informations de base', {
@@ -33,6 +40,11 @@ class ProduitAdmin(admin.ModelAdmin):
         }),
     )
     
+    def save_model(self, request, obj, form, change):
+        # Stock modifié ici : mouvement d'ajustement au nom de l'utilisateur (voir Produit.save)
+        obj.modifie_par = request.user
+        super().save_model(request, obj, form, change)
+    
     def stock_critique(self, obj):
         return obj.stock_critique
     stock_critique.boolean = True
@@ -16,6 +16,11 @@ class ProduitViewSet(viewsets.ModelViewSet):
     ordering_fields = ['nom', 'prix_vente', 'quantite_stock', 'date_ajout']
     ordering = ['-date_ajout']
     
+    def perform_update(self, serializer):
+        # Stock modifié par l'API : mouvement d'ajustement au nom de l'utilisateur (voir Produit.save)
+        serializer.instance.modifie_par = self.request.user
+        serializer.save()
+    
     @action(detail=False, methods=['get'])
     def stock_critique(self, request):
         """Get products with critical stock levels."""
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class ProduitsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.produits'
-    verbose_name = 'Produits'
\ No newline at end of file
+    verbose_name = 'Produits'
+    
+    def ready(self):
+        import apps.produits.signals
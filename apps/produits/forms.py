@@ -1,7 +1,7 @@
 from django import forms
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Row, Column
-from .models import Produit, Categorie
+from .models import Produit, Categorie, CodeBarre
 
 
 class ProduitQuickForm(forms.ModelForm):
@@ -17,6 +17,12 @@ class ProduitQuickForm(forms.ModelForm):
 
 
 class ProduitForm(forms.ModelForm):
+    codes_barres = forms.CharField(
+        label="Codes-barres / SKU",
+        required=False,
+        help_text="Plusieurs codes possibles, séparés par des virgules"
+    )
+    
     class Meta:
         model = Produit
         fields = ['nom', 'categorie', 'description', 'prix_achat', 'prix_vente', 
@@ -47,10 +53,51 @@ class ProduitForm(forms.ModelForm):
                 Column('seuil_alerte', css_class='form-group col-md-6'),
                 css_class='form-row'
             ),
+            'codes_barres',
             'image',
             'actif',
             Submit('submit', 'Sauvegarder', css_class='btn btn-primary')
         )
+        if self.instance.pk:
+            self.fields['codes_barres'].initial = ', '.join(
+                self.instance.codes_barres.values_list('code', flat=True)
+            )
+    
+    def clean_codes_barres(self):
+        codes = []
+        for code in self.cleaned_data['codes_barres'].split(','):
+            code = code.strip()
+            if code and code not in codes:
+                codes.append(code)
+        
+        longueur_max = CodeBarre._meta.get_field('code').max_length
+        trop_longs = [code for code in codes if len(code) > longueur_max]
+        if trop_longs:
+            raise forms.ValidationError(
+                f"Code(s) trop long(s) ({longueur_max} caractères maximum) : {', '.join(trop_longs)}"
+            )
+        
+        deja_utilises = CodeBarre.objects.filter(code__in=codes)
+        if self.instance.pk:
+            deja_utilises = deja_utilises.exclude(produit=self.instance)
+        deja_utilises = list(deja_utilises.values_list('code', flat=True))
+        if deja_utilises:
+            raise forms.ValidationError(f"Code(s) déjà attribué(s) à un autre produit : {', '.join(deja_utilises)}")
+        return codes
+    
+    def save(self, commit=True):
+        produit = super().save(commit=commit)
+        if commit:
+            self.save_codes_barres()
+        return produit
+    
+    def save_codes_barres(self):
+        codes = self.cleaned_data.get('codes_barres', [])
+        existants = set(self.instance.codes_barres.values_list('code', flat=True))
+        self.instance.codes_barres.exclude(code__in=codes).delete()
+        for code in codes:
+            if code not in existants:
+                CodeBarre.objects.create(produit=self.instance, code=code)
 
 
 class CategorieForm(forms.ModelForm):
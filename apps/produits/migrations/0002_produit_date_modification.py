@@ -0,0 +1,20 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:45
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produit',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0002_produit_date_modification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodeBarre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, unique=True)),
+                ('date_ajout', models.DateTimeField(auto_now_add=True)),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='codes_barres', to='produits.produit')),
+            ],
+            options={
+                'verbose_name': 'Code-barres',
+                'verbose_name_plural': 'Codes-barres',
+                'ordering': ['code'],
+            },
+        ),
+    ]
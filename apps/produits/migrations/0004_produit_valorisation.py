@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-17 22:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0003_codebarre'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produit',
+            name='cout_moyen',
+            field=models.DecimalField(decimal_places=4, default=0, help_text='Coût unitaire moyen pondéré (CUMP) du stock', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='cout_ventes',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Coût de revient cumulé des quantités vendues', max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='produit',
+            name='valeur_stock',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Valeur du stock au coût de revient', max_digits=14),
+        ),
+    ]
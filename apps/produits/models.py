@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Case, When, Value
 from django.utils.text import slugify
 from django.urls import reverse
+from django.utils import timezone
 from PIL import Image
 import os
 
@@ -29,8 +31,22 @@ class Produit(models.Model):
     quantite_stock = models.PositiveIntegerField(default=0)
     seuil_alerte = models.PositiveIntegerField(default=5, help_text="Quantité minimum avant alerte")
     date_ajout = models.DateTimeField(auto_now_add=True)
+    date_modification = models.DateTimeField(auto_now=True, db_index=True)
     image = models.ImageField(upload_to='produits/', blank=True, null=True)
     actif = models.BooleanField(default=True)
+    # Valorisation tenue à chaque mouvement de stock (voir MouvementStock.create_mouvements)
+    cout_moyen = models.DecimalField(
+        max_digits=12, decimal_places=4, default=0,
+        help_text="Coût unitaire moyen pondéré (CUMP) du stock"
+    )
+    valeur_stock = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        help_text="Valeur du stock au coût de revient"
+    )
+    cout_ventes = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        help_text="Coût de revient cumulé des quantités vendues"
+    )
     
     class Meta:
         verbose_name = "Produit"
@@ -40,10 +56,26 @@ class Produit(models.Model):
     def __str__(self):
         return self.nom
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Quantité lue en base, pour repérer une saisie de stock hors mouvement au save()
+        instance._quantite_chargee = instance.__dict__.get('quantite_stock')
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.nom)
         
+        update_fields = kwargs.get('update_fields')
+        # Stock saisi directement (fiche, admin, API) : la quantité n'est pas écrite
+        # telle quelle, l'écart passe par un mouvement d'ajustement (historique,
+        # valorisation et instantanés restent cohérents)
+        cible = None
+        if not self._state.adding and (update_fields is None or 'quantite_stock' in update_fields) \
+                and self.quantite_stock != getattr(self, '_quantite_chargee', self.quantite_stock):
+            cible = self.quantite_stock
+        
         # Ensure unique slug
         original_slug = self.slug
         counter = 1
@@ -51,7 +83,34 @@ class Produit(models.Model):
             self.slug = f"{original_slug}-{counter}"
             counter += 1
         
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if cible is not None:
+                # Stock courant relu sous verrou : les ventes concurrentes ne sont pas écrasées
+                self.quantite_stock = Produit.objects.select_for_update().values_list(
+                    'quantite_stock', flat=True
+                ).get(pk=self.pk)
+            
+            # Stock jamais valorisé (nouveau produit) : coût moyen au prix d'achat
+            valoriser = not self.cout_moyen and self.prix_achat
+            if valoriser:
+                self.cout_moyen = self.prix_achat
+            if self._state.adding or valoriser:
+                self.valeur_stock = self.quantite_stock * self.cout_moyen
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'cout_moyen', 'valeur_stock'}
+            
+            super().save(*args, **kwargs)
+            self._quantite_chargee = self.quantite_stock
+            
+            if cible is not None and cible != self.quantite_stock:
+                from apps.stock.models import MouvementStock
+                MouvementStock.create_mouvement(
+                    self,
+                    cible - self.quantite_stock,
+                    source='ajustement',
+                    user=getattr(self, 'modifie_par', None),
+                    motif="Modification directe du stock du produit"
+                )
         
         # Resize image if uploaded
         if self.image:
@@ -70,11 +129,57 @@ class Produit(models.Model):
     
     def update_stock(self, delta):
         """Update stock quantity. Positive delta for increase, negative for decrease."""
-        new_quantity = self.quantite_stock + delta
-        if new_quantity < 0:
-            raise ValueError("Stock ne peut pas être négatif")
-        self.quantite_stock = new_quantity
-        self.save(update_fields=['quantite_stock'])
+        avant, apres = Produit.ajuster_stocks({self.pk: delta})[self.pk]
+        self.quantite_stock = self._quantite_chargee = apres
+    
+    @classmethod
+    def ajuster_stocks(cls, deltas):
+        """Atomically apply stock deltas ({produit_id: delta}) in one UPDATE.
+        
+        The new quantity is computed by the database (quantite_stock + delta)
+        and the row is only updated if it stays >= 0, so concurrent tills
+        cannot lose each other's updates. Returns {produit_id: (avant, apres)}
+        read back from the database inside the same transaction.
+        """
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return {}
+        
+        if len(deltas) == 1:
+            [(pk, delta)] = deltas.items()
+            nouvelle_quantite = F('quantite_stock') + delta
+        else:
+            nouvelle_quantite = F('quantite_stock') + Case(
+                *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+                output_field=models.IntegerField()
+            )
+        
+        with transaction.atomic():
+            updated = cls.objects.filter(pk__in=deltas).alias(
+                nouvelle_quantite=nouvelle_quantite
+            ).filter(nouvelle_quantite__gte=0).update(
+                quantite_stock=nouvelle_quantite,
+                date_modification=timezone.now()
+            )
+            
+            if updated != len(deltas):
+                # Identifier le(s) produit(s) en cause pour le message d'erreur
+                stocks = dict(cls.objects.filter(pk__in=deltas).values_list('pk', 'quantite_stock'))
+                manquants = [pk for pk in deltas if pk not in stocks]
+                if manquants:
+                    raise cls.DoesNotExist(f"Produit introuvable: {manquants[0]}")
+                noms = cls.objects.filter(
+                    pk__in=[pk for pk, delta in deltas.items() if stocks[pk] + delta < 0]
+                ).values_list('nom', flat=True)
+                raise ValueError(f"Stock ne peut pas être négatif ({', '.join(noms)})")
+            
+            stocks = cls.objects.filter(pk__in=deltas).order_by().values_list('pk', 'quantite_stock')
+            stocks = {pk: (apres - deltas[pk], apres) for pk, apres in stocks}
+        
+        # L'UPDATE ne déclenche pas post_save : invalider le cache des scans
+        from .scan import cache_codes
+        cache_codes.invalider_produits(deltas)
+        return stocks
     
     @property
     def stock_critique(self):
@@ -91,4 +196,18 @@ class Produit(models.Model):
         """Calculate profit margin percentage."""
         if self.prix_achat > 0:
             return ((self.prix_vente - self.prix_achat) / self.prix_achat) * 100
-        return 0
\ No newline at end of file
+        return 0
+
+class CodeBarre(models.Model):
+    """Code-barres ou SKU d'un produit (un produit peut en avoir plusieurs)."""
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='codes_barres')
+    code = models.CharField(max_length=50, unique=True)
+    date_ajout = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Code-barres"
+        verbose_name_plural = "Codes-barres"
+        ordering = ['code']
+    
+    def __str__(self):
+        return f"{self.code} - {self.produit.nom}"
@@ -5,6 +5,7 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from .models import Categorie
 from .forms import CategorieForm
+from .scan import chercher_par_code
 
 @method_decorator(csrf_exempt, name='dispatch')
 class CategorieQuickCreateView(LoginRequiredMixin, UserPassesTestMixin, View):
@@ -32,3 +33,13 @@ class CategorieQuickCreateView(LoginRequiredMixin, UserPassesTestMixin, View):
             })
         except Exception as e:
             return JsonResponse({'success': False, 'errors': {'non_field_errors': [str(e)]}})
+
+
+class ProduitScanView(LoginRequiredMixin, View):
+    """Look up a product by barcode/SKU for the caisse."""
+    
+    def get(self, request, code):
+        produit = chercher_par_code(code)
+        if produit is None:
+            return JsonResponse({'success': False, 'error': 'Code inconnu'}, status=404)
+        return JsonResponse({'success': True, 'produit': produit})
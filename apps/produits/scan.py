@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class CacheCodes:
+    """Thread-safe in-process LRU cache of barcode lookups.
+    
+    Entries expire after `ttl` seconds so that changes made by other worker
+    processes (which cannot invalidate this process) are picked up quickly.
+    A reverse index allows dropping every code of a product at once.
+    """
+    
+    def __init__(self, taille, ttl):
+        self.taille = taille
+        self.ttl = ttl
+        self._entrees = OrderedDict()  # code -> (expiration, produit_id, valeur)
+        self._par_produit = {}  # produit_id -> {codes}
+        self._lock = threading.Lock()
+    
+    def get(self, code):
+        """Return (found, value) for `code`."""
+        with self._lock:
+            entree = self._entrees.get(code)
+            if entree is None:
+                return False, None
+            if entree[0] < time.monotonic():
+                self._retirer(code)
+                return False, None
+            self._entrees.move_to_end(code)
+            return True, entree[2]
+    
+    def set(self, code, produit_id, valeur):
+        with self._lock:
+            self._retirer(code)
+            self._entrees[code] = (time.monotonic() + self.ttl, produit_id, valeur)
+            if produit_id is not None:
+                self._par_produit.setdefault(produit_id, set()).add(code)
+            while len(self._entrees) > self.taille:
+                self._retirer(next(iter(self._entrees)))
+    
+    def invalider_code(self, code):
+        with self._lock:
+            self._retirer(code)
+    
+    def invalider_produits(self, produit_ids):
+        with self._lock:
+            for produit_id in produit_ids:
+                for code in list(self._par_produit.get(produit_id, ())):
+                    self._retirer(code)
+    
+    def vider(self):
+        with self._lock:
+            self._entrees.clear()
+            self._par_produit.clear()
+    
+    def _retirer(self, code):
+        entree = self._entrees.pop(code, None)
+        if entree and entree[1] is not None:
+            codes = self._par_produit.get(entree[1])
+            if codes:
+                codes.discard(code)
+                if not codes:
+                    del self._par_produit[entree[1]]
+
+
+cache_codes = CacheCodes(
+    taille=getattr(settings, 'SCAN_CACHE_TAILLE', 50000),
+    ttl=getattr(settings, 'SCAN_CACHE_TTL', 30),
+)
+
+
+def produit_en_json(produit):
+    """Compact representation of a product, as used by the caisse."""
+    return {
+        'id': produit.pk,
+        'nom': produit.nom,
+        'prix_vente': float(produit.prix_vente),
+        'quantite_stock': produit.quantite_stock,
+        'categorie_id': produit.categorie_id,
+        'image': produit.image.url if produit.image else '',
+        'actif': produit.actif,
+    }
+
+
+def chercher_par_code(code):
+    """Return the product for a scanned barcode/SKU as a dict, or None."""
+    from .models import CodeBarre
+    
+    code = code.strip()
+    trouve, valeur = cache_codes.get(code)
+    if trouve:
+        return valeur
+    
+    code_barre = CodeBarre.objects.select_related('produit').filter(code=code).first()
+    if code_barre is None:
+        cache_codes.set(code, None, None)
+        return None
+    
+    valeur = produit_en_json(code_barre.produit)
+    cache_codes.set(code, code_barre.produit_id, valeur)
+    return valeur
@@ -16,4 +16,6 @@ class ProduitSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Produit
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        # Valorisation tenue par les mouvements de stock
+        read_only_fields = ['cout_moyen', 'valeur_stock', 'cout_ventes']
\ No newline at end of file
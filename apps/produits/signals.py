@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Produit, CodeBarre
+from .scan import cache_codes
+
+
+@receiver([post_save, post_delete], sender=Produit)
+def invalider_cache_produit(sender, instance, **kwargs):
+    """Drop cached barcode lookups of a product when it changes."""
+    cache_codes.invalider_produits([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=CodeBarre)
+def invalider_cache_code(sender, instance, **kwargs):
+    """Drop the cached lookup (possibly a cached miss) of a barcode."""
+    cache_codes.invalider_code(instance.code)
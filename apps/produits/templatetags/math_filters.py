@@ -1,7 +1,6 @@
 from django import template
 
 register = template.Library()
-print("DEBUG: math_filters loaded!")
 
 @register.filter
 def mul(value, arg):
@@ -3,7 +3,7 @@ from .views import (
     ProduitListView, ProduitDetailView, ProduitCreateView, ProduitUpdateView, ProduitDeleteView,
     CategorieListView, CategorieCreateView, ProduitQuickCreateView
 )
-from .quick_views import CategorieQuickCreateView
+from .quick_views import CategorieQuickCreateView, ProduitScanView
 
 app_name = 'produits'
 
@@ -15,6 +15,7 @@ urlpatterns = [
     path('<int:pk>/', ProduitDetailView.as_view(), name='detail'),
     path('<int:pk>/update/', ProduitUpdateView.as_view(), name='update'),
     path('<int:pk>/delete/', ProduitDeleteView.as_view(), name='delete'),
+    path('scan/<str:code>/', ProduitScanView.as_view(), name='scan'),
 
     # Categories
     path('categories/', CategorieListView.as_view(), name='categories'),
@@ -77,8 +77,11 @@ class ProduitUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return self.request.user.role in ['admin', 'manager', 'Administrateur', 'Gestionnaire']
     
     def form_valid(self, form):
+        # Une nouvelle quantité devient un mouvement d'ajustement à son nom (voir Produit.save)
+        form.instance.modifie_par = self.request.user
+        response = super().form_valid(form)
         messages.success(self.request, 'Produit modifié avec succès!')
-        return super().form_valid(form)
+        return response
 
 
 class ProduitDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import MouvementStock, Inventaire, InventaireItem
+from .models import MouvementStock, Inventaire, InventaireItem, StockSnapshot
 
 
 @admin.register(MouvementStock)
@@ -25,4 +25,18 @@ class InventaireAdmin(admin.ModelAdmin):
     list_filter = ('clos', 'date_creation')
     search_fields = ('nom', 'description')
     inlines = [InventaireItemInline]
-    readonly_fields = ('date_creation', 'date_cloture')
\ No newline at end of file
+    readonly_fields = ('date_creation', 'date_cloture')
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('date', 'produit', 'quantite', 'cout_unitaire')
+    search_fields = ('produit__nom',)
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        # Lignes écrites par prendre_instantane_stock
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
\ No newline at end of file
@@ -1,6 +1,10 @@
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import MouvementStock, Inventaire
+from django.utils import timezone
+from apps.produits.models import CodeBarre, Produit
+from .models import MouvementStock, Inventaire, StockSnapshot, lire_instant
 from .serializers import MouvementStockSerializer, InventaireSerializer
 
 
@@ -11,6 +15,52 @@ class MouvementStockViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['type', 'source', 'produit']
     ordering_fields = ['date']
     ordering = ['-date']
+    
+    @action(detail=False, methods=['get'])
+    def historique(self, request):
+        """Stock and valuation at ?date= (YYYY-MM-DD for the end of that day, or ISO datetime).
+        
+        Read from the nearest earlier snapshot plus the movements after it.
+        ?produit= and ?categorie= restrict the products; per-product lines
+        are listed with ?produit= or ?detail=1.
+        """
+        date = timezone.now()
+        if request.query_params.get('date'):
+            date = lire_instant(request.query_params['date'])
+            if date is None:
+                return Response({'error': "Date invalide"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        produits = Produit.objects.all()
+        produit = request.query_params.get('produit', '')
+        categorie = request.query_params.get('categorie', '')
+        if produit.isdigit():
+            produits = produits.filter(pk=int(produit))
+        if categorie.isdigit():
+            produits = produits.filter(categorie_id=int(categorie))
+        
+        valorisation = StockSnapshot.valorisation_a(date, produits)
+        data = {
+            'date': date,
+            'instantane': valorisation['instantane'],
+            'quantite': valorisation['quantite'],
+            'valeur': float(valorisation['valeur']),
+            'par_categorie': [
+                dict(ligne, valeur=float(ligne['valeur'])) for ligne in valorisation['par_categorie']
+            ],
+        }
+        if produit.isdigit() or request.query_params.get('detail'):
+            noms = dict(produits.values_list('pk', 'nom'))
+            data['produits'] = [
+                {
+                    'produit_id': pk,
+                    'nom': noms[pk],
+                    'quantite': quantite,
+                    'cout_unitaire': float(cout),
+                    'valeur': float(quantite * cout),
+                }
+                for pk, (quantite, cout) in sorted(valorisation['stocks'].items())
+            ]
+        return Response(data)
 
 
 class InventaireViewSet(viewsets.ModelViewSet):
@@ -18,4 +68,48 @@ class InventaireViewSet(viewsets.ModelViewSet):
     serializer_class = InventaireSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['clos']
-    ordering = ['-date_creation']
\ No newline at end of file
+    ordering = ['-date_creation']
+    
+    @action(detail=True, methods=['post'])
+    def comptages(self, request, pk=None):
+        """Add partial counts from a scanner: {"comptages": [{"produit_id" or "code", "quantite"}]}.
+        
+        ``quantite`` (default 1, one scan) is added to the counted quantity;
+        the new counts are returned with the products or codes not on the sheet.
+        """
+        if request.user.role not in ['admin', 'manager']:
+            return Response({'error': "Accès refusé"}, status=status.HTTP_403_FORBIDDEN)
+        
+        inventaire = self.get_object()
+        if inventaire.clos:
+            return Response({'error': "Inventaire déjà clos"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        lignes = request.data.get('comptages')
+        try:
+            if not isinstance(lignes, list):
+                raise ValueError
+            codes = CodeBarre.objects.in_bulk(
+                [str(ligne['code']) for ligne in lignes if 'code' in ligne], field_name='code'
+            )
+            deltas, inconnus = {}, []
+            for ligne in lignes:
+                if 'code' in ligne:
+                    code_barre = codes.get(str(ligne['code']))
+                    if code_barre is None:
+                        inconnus.append(ligne['code'])
+                        continue
+                    produit_id = code_barre.produit_id
+                else:
+                    produit_id = int(ligne['produit_id'])
+                deltas[produit_id] = deltas.get(produit_id, 0) + int(ligne.get('quantite', 1))
+            comptees = inventaire.ajouter_comptages(deltas)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return Response({'error': "Comptages invalides"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'comptages': [
+                {'produit_id': produit_id, 'quantite_comptee': quantite}
+                for produit_id, quantite in comptees.items()
+            ],
+            'inconnus': inconnus + [produit_id for produit_id in deltas if produit_id not in comptees],
+        })
\ No newline at end of file
@@ -8,10 +8,14 @@ from apps.produits.models import Produit
 class InventaireForm(forms.ModelForm):
     class Meta:
         model = Inventaire
-        fields = ['nom', 'description']
+        fields = ['nom', 'description', 'categories']
+        widgets = {
+            'categories': forms.CheckboxSelectMultiple,
+        }
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.fields['categories'].help_text = "Laisser vide pour inventorier tout le catalogue"
         self.helper = FormHelper()
         self.helper.add_input(Submit('submit', 'Créer inventaire', css_class='btn btn-primary'))
 
@@ -0,0 +1,42 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from apps.stock.models import StockSnapshot, lire_instant
+
+
+class Command(BaseCommand):
+    help = 'Snapshot the stock and unit cost of every product (run nightly or at month end)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Snapshot a past instant, YYYY-MM-DD (end of day) or ISO datetime '
+                 '(default: now minus StockSnapshot.MARGE, so in-flight movements are included)',
+        )
+        parser.add_argument(
+            '--purger-jours',
+            type=int,
+            help='Delete snapshots older than this many days, except the last one of each month',
+        )
+    
+    def handle(self, *args, **options):
+        date = None
+        if options['date'] is not None:
+            date = lire_instant(options['date'])
+            if date is None:
+                raise CommandError(f"Invalid date: {options['date']}")
+        
+        lignes = StockSnapshot.prendre(date)
+        self.stdout.write(self.style.SUCCESS(f'{lignes} product(s) snapshotted'))
+        
+        if options['purger_jours'] is not None:
+            limite = timezone.now() - timedelta(days=options['purger_jours'])
+            anciens = StockSnapshot.objects.filter(date__lt=limite)
+            # Le dernier instantané de chaque mois est gardé pour les valorisations de fin de mois
+            fins_de_mois = anciens.annotate(mois=TruncMonth('date')).values('mois').annotate(
+                derniere=Max('date')
+            ).values_list('derniere', flat=True)
+            supprimes, _ = anciens.exclude(date__in=list(fins_de_mois)).delete()
+            self.stdout.write(self.style.SUCCESS(f'{supprimes} old snapshot row(s) deleted'))
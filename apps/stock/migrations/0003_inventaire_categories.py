@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0003_codebarre'),
+        ('stock', '0002_alter_inventaire_utilisateur'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventaire',
+            name='categories',
+            field=models.ManyToManyField(blank=True, help_text='Catégories à inventorier (toutes si vide)', related_name='inventaires', to='produits.categorie'),
+        ),
+    ]
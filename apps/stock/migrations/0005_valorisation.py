@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-17 22:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0004_produit_valorisation'),
+        ('stock', '0004_stock_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mouvementstock',
+            name='cout_moyen_apres',
+            field=models.DecimalField(decimal_places=4, default=0, help_text='Coût moyen du produit après le mouvement', max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='mouvementstock',
+            name='cout_unitaire',
+            field=models.DecimalField(decimal_places=4, default=0, help_text='Coût de revient unitaire du mouvement', max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='stocksnapshot',
+            name='cout_unitaire',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='CoucheStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(auto_now_add=True)),
+                ('quantite_restante', models.PositiveIntegerField()),
+                ('cout_unitaire', models.DecimalField(decimal_places=4, max_digits=12)),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='couches_stock', to='produits.produit')),
+            ],
+            options={
+                'verbose_name': 'Couche de stock (FIFO)',
+                'verbose_name_plural': 'Couches de stock (FIFO)',
+                'ordering': ['date', 'pk'],
+                'indexes': [models.Index(fields=['produit', 'date'], name='couche_stock_produit_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-17 22:10
+
+from django.db import migrations
+from django.db.models import F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def valoriser_existant(apps, schema_editor):
+    """Open the valuation at the current purchase price.
+
+    Products start with cout_moyen = prix_achat; their cost of goods sold
+    and the cost of past movements are valued at that price as well.
+    """
+    Produit = apps.get_model('produits', 'Produit')
+    MouvementStock = apps.get_model('stock', 'MouvementStock')
+
+    vendus = MouvementStock.objects.filter(produit=OuterRef('pk')).values('produit').annotate(
+        net=Sum('quantite', filter=Q(type='SORTIE', source='vente'))
+            - Coalesce(Sum('quantite', filter=Q(type='ENTREE', source='retour')), 0)
+    ).values('net')
+    Produit.objects.update(
+        cout_moyen=F('prix_achat'),
+        valeur_stock=F('quantite_stock') * F('prix_achat'),
+        cout_ventes=Coalesce(Subquery(vendus, output_field=IntegerField()), Value(0)) * F('prix_achat'),
+    )
+
+    prix = Produit.objects.filter(pk=OuterRef('produit_id')).values('prix_achat')
+    MouvementStock.objects.update(cout_unitaire=Subquery(prix), cout_moyen_apres=Subquery(prix))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0005_valorisation'),
+    ]
+
+    operations = [
+        migrations.RunPython(valoriser_existant, migrations.RunPython.noop),
+    ]
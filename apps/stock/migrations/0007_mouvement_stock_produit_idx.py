@@ -0,0 +1,20 @@
+# Generated by Django 5.1.5 on 2026-10-17 22:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0004_produit_valorisation'),
+        ('stock', '0006_valorisation_existante'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mouvementstock',
+            index=models.Index(fields=['produit', 'date'], name='mouvement_stock_produit_idx'),
+        ),
+    ]
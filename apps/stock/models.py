@@ -1,9 +1,19 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Greatest
 from django.contrib.auth import get_user_model
-from apps.produits.models import Produit
+from apps.produits.models import Categorie, Produit
 
 User = get_user_model()
 
+# Précision des coûts unitaires et des montants de valorisation
+QUANTUM_COUT = Decimal('0.0001')
+QUANTUM_MONTANT = Decimal('0.01')
+
 
 class MouvementStock(models.Model):
     TYPE_CHOICES = [
@@ -32,50 +42,243 @@ class MouvementStock(models.Model):
     motif = models.TextField(blank=True)
     utilisateur = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     date = models.DateTimeField(auto_now_add=True)
+    cout_unitaire = models.DecimalField(
+        max_digits=12, decimal_places=4, default=0, help_text="Coût de revient unitaire du mouvement"
+    )
+    cout_moyen_apres = models.DecimalField(
+        max_digits=12, decimal_places=4, default=0, help_text="Coût moyen du produit après le mouvement"
+    )
     
     class Meta:
         verbose_name = "Mouvement de stock"
         verbose_name_plural = "Mouvements de stock"
         ordering = ['-date']
+        indexes = [
+            # Relecture des mouvements postérieurs à un instantané (StockSnapshot)
+            models.Index(fields=['date'], name='mouvement_stock_date_idx'),
+            # Dernier mouvement de chaque produit avant une date (StockSnapshot.stocks_a)
+            models.Index(fields=['produit', 'date'], name='mouvement_stock_produit_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_type_display()} - {self.produit.nom} ({self.quantite})"
     
-    @classmethod
-    def create_mouvement(cls, produit, quantite, source, user=None, reference="", motif=""):
-        """Create a stock movement and update product stock."""
-        quantite_avant = produit.quantite_stock
-        
-        # Determine movement type
+    @staticmethod
+    def _type_pour(quantite):
+        """Determine movement type from the signed quantity."""
         if quantite > 0:
-            type_mouvement = 'ENTREE'
+            return 'ENTREE'
         elif quantite < 0:
-            type_mouvement = 'SORTIE'
-        else:
-            type_mouvement = 'AJUSTEMENT'
-        
-        # Update product stock
-        nouvelle_quantite = quantite_avant + quantite
-        if nouvelle_quantite < 0:
-            raise ValueError("Stock ne peut pas être négatif")
-        
-        produit.quantite_stock = nouvelle_quantite
-        produit.save(update_fields=['quantite_stock'])
-        
-        # Create movement record
-        mouvement = cls.objects.create(
-            produit=produit,
-            type=type_mouvement,
-            quantite=abs(quantite),
-            quantite_avant=quantite_avant,
-            quantite_apres=nouvelle_quantite,
-            source=source,
-            reference=reference,
-            motif=motif,
-            utilisateur=user
-        )
+            return 'SORTIE'
+        return 'AJUSTEMENT'
+    
+    @classmethod
+    def create_mouvement(cls, produit, quantite, source, user=None, reference="", motif="", cout_unitaire=None):
+        """Create a stock movement and update product stock.
         
-        return mouvement
+        The stock is changed with a conditional UPDATE (see
+        Produit.ajuster_stocks) rather than read-modify-write, and the
+        before/after quantities come from the database. ``cout_unitaire``
+        is the unit cost of an entry (purchase price), see create_mouvements.
+        """
+        couts = [cout_unitaire] if cout_unitaire is not None else None
+        return cls.create_mouvements(
+            [(produit, quantite)], source, user=user, reference=reference, motif=motif, couts=couts
+        )[0]
+
+    @classmethod
+    def create_mouvements(cls, lignes, source, user=None, reference="", motif="", signaler=True, couts=None):
+        """Create stock movements for several products in one batch.
+
+        ``lignes`` is a list of ``(produit, quantite)`` pairs, optionally
+        ``(produit, quantite, reference)`` to override the reference per
+        line. All stock levels are changed by a single conditional UPDATE;
+        if any product would go negative nothing is written and ValueError
+        is raised. With ``signaler=False`` the caller notifies critical
+        stock itself (no post_save per movement).
+
+        The products' valuation is updated in the same transaction (see
+        _valoriser); ``couts`` gives the unit cost of each entry line, in the
+        order of ``lignes`` (None: the entry comes in at the current average,
+        as do all entries when ``couts`` is omitted).
+        """
+        from django.db.models.signals import post_save
+
+        if not lignes:
+            return []
+
+        deltas = {}
+        for produit, quantite, *_ in lignes:
+            deltas[produit.pk] = deltas.get(produit.pk, 0) + quantite
+
+        with transaction.atomic():
+            stocks = Produit.ajuster_stocks(deltas)
+
+            # Plusieurs lignes pour un même produit : on enchaîne avant/après
+            courants = {pk: avant for pk, (avant, apres) in stocks.items()}
+            mouvements = []
+            for produit, quantite, *ligne_reference in lignes:
+                quantite_avant = courants.get(produit.pk, produit.quantite_stock)
+                nouvelle_quantite = quantite_avant + quantite
+                courants[produit.pk] = nouvelle_quantite
+                produit.quantite_stock = nouvelle_quantite
+                mouvements.append(cls(
+                    produit=produit,
+                    type=cls._type_pour(quantite),
+                    quantite=abs(quantite),
+                    quantite_avant=quantite_avant,
+                    quantite_apres=nouvelle_quantite,
+                    source=source,
+                    reference=ligne_reference[0] if ligne_reference else reference,
+                    motif=motif,
+                    utilisateur=user
+                ))
+
+            cls._valoriser(mouvements, couts or [])
+            mouvements = cls.objects.bulk_create(mouvements)
+
+        if not signaler:
+            return mouvements
+
+        # bulk_create ne déclenche pas post_save : on le relaie pour les
+        # produits passés en stock critique afin de garder les alertes.
+        for mouvement in mouvements:
+            if mouvement.produit.stock_critique:
+                post_save.send(sender=cls, instance=mouvement, created=True)
+
+        return mouvements
+
+    @classmethod
+    def _valoriser(cls, mouvements, couts):
+        """Update the cost of the products moved by ``mouvements`` (not saved yet).
+
+        Weighted average (CUMP): an entry at cost c gives
+        cout_moyen = (avant * cout_moyen + q * c) / apres and the stock is
+        worth quantite * cout_moyen. With STOCK_VALORISATION = 'fifo', entries
+        add CoucheStock layers and exits consume the oldest ones; stock
+        not covered by layers (before FIFO was enabled) counts as the oldest
+        layer, at the average cost. Sales add their cost to cout_ventes and returns
+        take it back. Each movement records its unit cost and the average
+        after it. Products are written with one bulk_update.
+        """
+        fifo = settings.STOCK_VALORISATION == 'fifo'
+        pks = {mouvement.produit_id for mouvement in mouvements}
+        etats = {
+            pk: [cout_moyen, valeur, cout_ventes]
+            for pk, cout_moyen, valeur, cout_ventes in Produit.objects.filter(pk__in=pks).values_list(
+                'pk', 'cout_moyen', 'valeur_stock', 'cout_ventes'
+            )
+        }
+        couches = {pk: [] for pk in pks}
+        if fifo:
+            for couche in CoucheStock.objects.filter(produit_id__in=pks, quantite_restante__gt=0):
+                couches[couche.produit_id].append(couche)
+        entamees, nouvelles = set(), []
+
+        for index, mouvement in enumerate(mouvements):
+            etat = etats[mouvement.produit_id]
+            cout_moyen, valeur, cout_ventes = etat
+            delta = mouvement.quantite_apres - mouvement.quantite_avant
+
+            if delta > 0:
+                cout = couts[index] if index < len(couts) and couts[index] is not None else cout_moyen
+                cout = Decimal(str(cout))
+                if fifo:
+                    # Stock antérieur sans couche : il devient une couche au coût moyen avant de mélanger
+                    hors_couches = mouvement.quantite_avant - sum(
+                        couche.quantite_restante for couche in couches[mouvement.produit_id]
+                    )
+                    entrees = [(hors_couches, cout_moyen)] if hors_couches > 0 else []
+                    for quantite, cout_couche in entrees + [(delta, cout)]:
+                        couche = CoucheStock(
+                            produit_id=mouvement.produit_id, quantite_restante=quantite, cout_unitaire=cout_couche
+                        )
+                        couches[mouvement.produit_id].append(couche)
+                        nouvelles.append(couche)
+                    valeur += delta * cout
+                else:
+                    cout_moyen = (mouvement.quantite_avant * cout_moyen + delta * cout) / mouvement.quantite_apres
+                if mouvement.source == 'retour':
+                    cout_ventes -= delta * cout
+            elif delta < 0:
+                if fifo:
+                    cout = cls._consommer(couches[mouvement.produit_id], mouvement.quantite_avant, -delta, cout_moyen, entamees)
+                    valeur -= cout
+                    cout = cout / -delta
+                else:
+                    cout = cout_moyen
+                if mouvement.source == 'vente':
+                    cout_ventes += -delta * cout
+            else:
+                cout = cout_moyen
+
+            if fifo:
+                if mouvement.quantite_apres:
+                    cout_moyen = valeur / mouvement.quantite_apres
+            else:
+                # Ré-ancrée à chaque mouvement : les écarts de stock saisis hors mouvement se résorbent
+                valeur = mouvement.quantite_apres * cout_moyen
+            cout_moyen = cout_moyen.quantize(QUANTUM_COUT)
+            etat[:] = [cout_moyen, valeur.quantize(QUANTUM_MONTANT), cout_ventes.quantize(QUANTUM_MONTANT)]
+            mouvement.cout_unitaire = cout.quantize(QUANTUM_COUT)
+            mouvement.cout_moyen_apres = cout_moyen
+
+        produits = []
+        for pk, (cout_moyen, valeur, cout_ventes) in etats.items():
+            produits.append(Produit(pk=pk, cout_moyen=cout_moyen, valeur_stock=valeur, cout_ventes=cout_ventes))
+        Produit.objects.bulk_update(produits, ['cout_moyen', 'valeur_stock', 'cout_ventes'])
+        for mouvement in mouvements:
+            mouvement.produit.cout_moyen, mouvement.produit.valeur_stock, mouvement.produit.cout_ventes = \
+                etats[mouvement.produit_id]
+            mouvement.produit._quantite_chargee = mouvement.produit.quantite_stock
+
+        if fifo:
+            CoucheStock.objects.bulk_update(entamees, ['quantite_restante'])
+            CoucheStock.objects.bulk_create(nouvelles)
+
+    @staticmethod
+    def _consommer(couches, quantite_avant, quantite, cout_moyen, entamees):
+        """Take ``quantite`` out of FIFO ``couches`` (oldest first) and return its cost."""
+        cout = Decimal('0')
+        hors_couches = quantite_avant - sum(couche.quantite_restante for couche in couches)
+        if hors_couches > 0:
+            prise = min(hors_couches, quantite)
+            cout += prise * cout_moyen
+            quantite -= prise
+        for couche in couches:
+            if not quantite:
+                break
+            prise = min(couche.quantite_restante, quantite)
+            if not prise:
+                continue
+            couche.quantite_restante -= prise
+            cout += prise * couche.cout_unitaire
+            quantite -= prise
+            if couche.pk:
+                entamees.add(couche)
+        return cout
+
+
+class CoucheStock(models.Model):
+    """Couche FIFO : quantité entrée à un coût donné et pas encore sortie.
+    
+    Tenue seulement avec STOCK_VALORISATION = 'fifo'.
+    """
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='couches_stock')
+    date = models.DateTimeField(auto_now_add=True)
+    quantite_restante = models.PositiveIntegerField()
+    cout_unitaire = models.DecimalField(max_digits=12, decimal_places=4)
+    
+    class Meta:
+        verbose_name = "Couche de stock (FIFO)"
+        verbose_name_plural = "Couches de stock (FIFO)"
+        ordering = ['date', 'pk']
+        indexes = [
+            models.Index(fields=['produit', 'date'], name='couche_stock_produit_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.produit_id} : {self.quantite_restante} x {self.cout_unitaire}"
 
 
 class Inventaire(models.Model):
@@ -92,6 +295,18 @@ class Inventaire(models.Model):
     )
     
     clos = models.BooleanField(default=False)
+    categories = models.ManyToManyField(
+        Categorie,
+        blank=True,
+        related_name='inventaires',
+        help_text="Catégories à inventorier (toutes si vide)"
+    )
+    
+    # Lignes insérées par requête à l'ouverture de l'inventaire
+    TAILLE_LOT = 2000
+    # Produits par UPDATE lors de l'ajout de comptages et de la clôture
+    TAILLE_LOT_COMPTAGE = 300
+    TAILLE_LOT_CLOTURE = 300
     
     class Meta:
         verbose_name = "Inventaire"
@@ -101,28 +316,150 @@ class Inventaire(models.Model):
     def __str__(self):
         return f"{self.nom} - {self.date_creation.strftime('%d/%m/%Y')}"
     
-    def cloturer(self):
-        """Close inventory and create adjustment movements."""
+    def produits_concernes(self):
+        """Active products counted by this inventory (its categories, or all)."""
+        produits = Produit.objects.filter(actif=True)
+        categories = list(self.categories.values_list('pk', flat=True))
+        if categories:
+            produits = produits.filter(categorie_id__in=categories)
+        return produits
+    
+    def creer_items(self):
+        """Snapshot the system stock of the counted products into inventory lines.
+        
+        Products are read as (pk, quantite_stock) pairs in pk order and the
+        lines bulk-inserted TAILLE_LOT at a time, inside one transaction so
+        the snapshot is consistent. Returns the number of lines created.
+        """
+        produits = self.produits_concernes().order_by('pk')
+        total = 0
+        dernier_pk = 0
+        with transaction.atomic():
+            while True:
+                lot = list(
+                    produits.filter(pk__gt=dernier_pk).values_list('pk', 'quantite_stock')[:self.TAILLE_LOT]
+                )
+                if not lot:
+                    break
+                dernier_pk = lot[-1][0]
+                InventaireItem.objects.bulk_create(
+                    InventaireItem(inventaire=self, produit_id=pk, quantite_systeme=quantite)
+                    for pk, quantite in lot
+                )
+                total += len(lot)
+        return total
+    
+    def saisir_comptages(self, quantites, notes=None):
+        """Record the counted quantities (and notes) of several lines at once.
+        
+        ``quantites`` and ``notes`` map item pks to values; unknown pks are
+        ignored. The lines are loaded with one in_bulk and the changed ones
+        written with one bulk_update. Returns the number of lines changed.
+        """
+        if self.clos:
+            raise ValueError("Inventaire déjà clos")
+        notes = notes or {}
+        
+        modifies = []
+        for pk, item in self.items.in_bulk(set(quantites) | set(notes)).items():
+            quantite = quantites.get(pk, item.quantite_comptee)
+            note = notes.get(pk, item.note)
+            if quantite != item.quantite_comptee or note != item.note:
+                item.quantite_comptee = quantite
+                item.note = note
+                modifies.append(item)
+        InventaireItem.objects.bulk_update(modifies, ['quantite_comptee', 'note'])
+        return len(modifies)
+    
+    def ajouter_comptages(self, deltas):
+        """Add partial counts streamed by handheld scanners.
+        
+        ``deltas`` maps product pks to the quantity to add (negative to undo
+        a scan). The counts are changed in the database with F() so several
+        counters can send deltas concurrently; they never go below zero.
+        Returns {produit_id: quantite_comptee} for the products on the sheet.
+        """
         if self.clos:
             raise ValueError("Inventaire déjà clos")
         
+        a_ajouter = [(pk, delta) for pk, delta in deltas.items() if delta]
+        # Un UPDATE par lot pour rester sous la limite de paramètres de SQLite
+        for debut in range(0, len(a_ajouter), self.TAILLE_LOT_COMPTAGE):
+            lot = a_ajouter[debut:debut + self.TAILLE_LOT_COMPTAGE]
+            self.items.filter(produit_id__in=[pk for pk, _ in lot]).update(
+                quantite_comptee=Greatest(
+                    F('quantite_comptee') + Case(
+                        *[When(produit_id=pk, then=Value(delta)) for pk, delta in lot],
+                        default=Value(0)
+                    ),
+                    Value(0)
+                )
+            )
+        return dict(self.items.filter(produit_id__in=list(deltas)).values_list('produit_id', 'quantite_comptee'))
+    
+    def cloturer(self):
+        """Close the inventory and move the stock by the counted discrepancies.
+        
+        The discrepancies are selected in SQL and applied with
+        create_mouvements (one conditional UPDATE and one bulk INSERT of
+        movements per TAILLE_LOT_CLOTURE products), all in one transaction.
+        Admins and managers get a single summary notification once it is
+        committed. Returns the number of adjusted products.
+        """
         from django.utils import timezone
         
-        for item in self.items.all():
-            ecart = item.quantite_comptee - item.quantite_systeme
-            if ecart != 0:
-                MouvementStock.create_mouvement(
-                    produit=item.produit,
-                    quantite=ecart,
+        ecarts = (
+            self.items.exclude(quantite_comptee=F('quantite_systeme'))
+            .annotate(difference=F('quantite_comptee') - F('quantite_systeme'))
+            .select_related('produit')
+            .only('inventaire', 'produit__nom', 'produit__quantite_stock', 'produit__seuil_alerte')
+            .order_by('produit_id')
+        )
+        
+        with transaction.atomic():
+            # UPDATE conditionnel : deux clôtures simultanées ne passent pas toutes les deux
+            date_cloture = timezone.now()
+            if not Inventaire.objects.filter(pk=self.pk, clos=False).update(clos=True, date_cloture=date_cloture):
+                raise ValueError("Inventaire déjà clos")
+            
+            lignes = [(item.produit, item.difference) for item in ecarts]
+            for debut in range(0, len(lignes), self.TAILLE_LOT_CLOTURE):
+                MouvementStock.create_mouvements(
+                    lignes[debut:debut + self.TAILLE_LOT_CLOTURE],
                     source='inventaire',
                     user=self.utilisateur,
                     reference=f"INV-{self.pk}",
-                    motif=f"Ajustement inventaire: {item.produit.nom}"
+                    motif=f"Ajustement inventaire: {self.nom}",
+                    signaler=False
                 )
+            
+            self.clos = True
+            self.date_cloture = date_cloture
+            transaction.on_commit(lambda: self._notifier_cloture(lignes))
+        
+        return len(lignes)
+    
+    def _notifier_cloture(self, lignes):
+        """One summary notification per admin/manager instead of one per critical product."""
+        from apps.dashboard.models import Notification
         
-        self.clos = True
-        self.date_cloture = timezone.now()
-        self.save()
+        surplus = sum(ecart for _, ecart in lignes if ecart > 0)
+        manquants = -sum(ecart for _, ecart in lignes if ecart < 0)
+        critiques = sum(1 for produit, _ in lignes if produit.stock_critique)
+        message = f"{self.nom} : {len(lignes)} produit(s) ajusté(s) (+{surplus} / -{manquants})"
+        if critiques:
+            message += f", dont {critiques} en stock critique"
+        
+        Notification.objects.bulk_create([
+            Notification(
+                titre="Inventaire clôturé",
+                message=message,
+                type="warning" if critiques else "success",
+                utilisateur=admin,
+                url=f"/stock/inventaire/{self.pk}/"
+            )
+            for admin in User.objects.filter(role__in=['admin', 'manager'])
+        ])
 
 
 class InventaireItem(models.Model):
@@ -142,4 +479,217 @@ class InventaireItem(models.Model):
     
     @property
     def ecart(self):
-        return self.quantite_comptee - self.quantite_systeme
\ No newline at end of file
+        return self.quantite_comptee - self.quantite_systeme
+
+
+def lire_instant(valeur):
+    """Aware datetime for an ISO date or datetime string; a date means the end of that day.
+    
+    Returns None when ``valeur`` is not a valid date.
+    """
+    from datetime import datetime, time
+    from django.utils import timezone
+    from django.utils.dateparse import parse_date, parse_datetime
+    
+    try:
+        # parse_datetime accepte aussi une date seule (minuit) : la date est testée d'abord
+        jour = parse_date(valeur)
+        instant = datetime.combine(jour, time.max) if jour else parse_datetime(valeur)
+    except ValueError:
+        return None
+    if instant is None:
+        return None
+    return instant if timezone.is_aware(instant) else timezone.make_aware(instant)
+
+
+class StockSnapshot(models.Model):
+    """Stock et coût unitaire de chaque produit à un instant donné.
+    
+    Les instantanés sont pris pour tout le catalogue en même temps (même
+    date) par la commande prendre_instantane_stock, chaque nuit ou en fin
+    de mois. Le stock à une date quelconque part de l'instantané le plus
+    proche avant cette date et ne relit que les mouvements postérieurs.
+    """
+    date = models.DateTimeField()
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='instantanes_stock')
+    quantite = models.IntegerField()
+    cout_unitaire = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    
+    # Lignes insérées par requête
+    TAILLE_LOT = 2000
+    # Recul de l'instantané courant sur l'heure : transactions encore ouvertes
+    MARGE = timedelta(minutes=5)
+    
+    class Meta:
+        verbose_name = "Instantané de stock"
+        verbose_name_plural = "Instantanés de stock"
+        ordering = ['-date']
+        constraints = [
+            # L'index unique sert aussi la recherche du dernier instantané (date en tête)
+            models.UniqueConstraint(fields=['date', 'produit'], name='instantane_stock_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date:%d/%m/%Y %H:%M} - {self.produit_id} : {self.quantite}"
+    
+    @property
+    def valeur(self):
+        return self.quantite * self.cout_unitaire
+    
+    @classmethod
+    def prendre(cls, date=None):
+        """Snapshot every product at ``date`` and return the number of rows.
+        
+        The stock is always read from the movements (stocks_a), never from
+        the live quantite_stock column. Without ``date`` the snapshot is
+        taken MARGE before now: a movement is dated when it is written but
+        only visible once its transaction commits, and the margin lets the
+        transactions still open at that instant commit first, so no
+        movement dated before the snapshot is left out of it (movements
+        after the snapshot are replayed by stocks_a). An existing snapshot
+        at that date is replaced. A current snapshot first records the gaps
+        between the live stock and the ledger (rapprocher).
+        """
+        from django.utils import timezone
+        
+        if date is None:
+            cls.rapprocher()
+            date = timezone.now() - cls.MARGE
+        with transaction.atomic():
+            lignes = sorted(cls.stocks_a(date).items())
+            cls.objects.filter(date=date).delete()
+            instantanes = [
+                cls(date=date, produit_id=pk, quantite=quantite, cout_unitaire=cout)
+                for pk, (quantite, cout) in lignes
+            ]
+            cls.objects.bulk_create(instantanes, batch_size=cls.TAILLE_LOT)
+        return len(instantanes)
+    
+    @classmethod
+    def rapprocher(cls):
+        """Record an 'ajustement' movement for each product whose live stock differs from its ledger.
+        
+        Every stock change should be a movement (Produit.save routes direct
+        edits through one), but a queryset update or a manual SQL fix leaves
+        quantite_stock apart from the last quantite_apres, and stocks_a
+        would not see it. The gap is recorded as a movement from the ledger
+        quantity to the live one, without changing the stock, and valued
+        like any other movement. Returns the number of products.
+        """
+        derniers = MouvementStock.objects.filter(produit=OuterRef('pk')).order_by('-date', '-pk')
+        with transaction.atomic():
+            ecarts = Produit.objects.annotate(
+                quantite_mouvement=Subquery(derniers.values('quantite_apres')[:1])
+            ).exclude(quantite_mouvement=None).exclude(quantite_mouvement=F('quantite_stock'))
+            pks = list(ecarts.values_list('pk', flat=True))
+            if not pks:
+                return 0
+            # Produits en écart verrouillés puis relus : pas de mouvement concurrent entre-temps
+            list(Produit.objects.select_for_update().filter(pk__in=pks).values_list('pk'))
+            mouvements = [
+                MouvementStock(
+                    produit=Produit(pk=pk, quantite_stock=quantite),
+                    type=MouvementStock._type_pour(quantite - quantite_mouvement),
+                    quantite=abs(quantite - quantite_mouvement),
+                    quantite_avant=quantite_mouvement,
+                    quantite_apres=quantite,
+                    source='ajustement',
+                    motif="Écart entre le stock et l'historique des mouvements",
+                )
+                for pk, quantite, quantite_mouvement in ecarts.filter(pk__in=pks).values_list(
+                    'pk', 'quantite_stock', 'quantite_mouvement'
+                )
+            ]
+            MouvementStock._valoriser(mouvements, [])
+            MouvementStock.objects.bulk_create(mouvements, batch_size=cls.TAILLE_LOT)
+        return len(mouvements)
+    
+    @classmethod
+    def dernier_avant(cls, date):
+        """Date of the latest snapshot taken at or before ``date`` (None if there is none)."""
+        return cls.objects.filter(date__lte=date).order_by('-date').values_list('date', flat=True).first()
+    
+    @classmethod
+    def stocks_a(cls, date, produits=None):
+        """Stock and unit cost of each product at ``date``: {produit_id: (quantite, cout_unitaire)}.
+        
+        Starts from the latest snapshot before ``date`` and replays only the
+        movements after it: the stock of a product is the quantite_apres of
+        its last movement up to ``date`` (picked per product by a subquery),
+        else its snapshot quantity, and its cost the average after that
+        movement or in the snapshot. A product missing from the snapshot
+        and without such a movement starts from the quantite_avant of its
+        first later movement, or its current stock. Products created after
+        ``date`` are left out. ``produits`` restricts the result to a
+        Produit queryset.
+        """
+        if produits is None:
+            produits = Produit.objects.all()
+        produits = produits.filter(date_ajout__lte=date)
+        depuis = cls.dernier_avant(date)
+        
+        derniers = MouvementStock.objects.filter(produit=OuterRef('pk'), date__lte=date)
+        if depuis is not None:
+            derniers = derniers.filter(date__gt=depuis)
+        derniers = derniers.order_by('-date', '-pk')
+        lignes = produits.order_by().annotate(
+            quantite_mouvement=Subquery(derniers.values('quantite_apres')[:1]),
+            cout_mouvement=Subquery(derniers.values('cout_moyen_apres')[:1]),
+        ).values_list('pk', 'quantite_stock', 'cout_moyen', 'quantite_mouvement', 'cout_mouvement')
+        
+        instantanes = {}
+        if depuis is not None:
+            instantanes = {
+                pk: (quantite, cout)
+                for pk, quantite, cout in cls.objects.filter(
+                    date=depuis, produit_id__in=produits.values('pk')
+                ).values_list('produit_id', 'quantite', 'cout_unitaire')
+            }
+        
+        stocks, manquants = {}, {}
+        for pk, quantite, cout, quantite_mouvement, cout_mouvement in lignes:
+            if quantite_mouvement is not None:
+                stocks[pk] = (quantite_mouvement, cout_mouvement)
+            elif pk in instantanes:
+                stocks[pk] = instantanes[pk]
+            else:
+                manquants[pk] = (quantite, cout)
+        
+        # Produits sans instantané ni mouvement : stock juste avant leur premier mouvement suivant
+        suivants = MouvementStock.objects.filter(produit=OuterRef('pk'), date__gt=date).order_by('date', 'pk')
+        pks = list(manquants)
+        for debut in range(0, len(pks), cls.TAILLE_LOT):
+            for pk, quantite_avant in Produit.objects.filter(pk__in=pks[debut:debut + cls.TAILLE_LOT]).annotate(
+                quantite_avant=Subquery(suivants.values('quantite_avant')[:1])
+            ).values_list('pk', 'quantite_avant'):
+                quantite, cout = manquants[pk]
+                stocks[pk] = (quantite if quantite_avant is None else quantite_avant, cout)
+        return stocks
+    
+    @classmethod
+    def valorisation_a(cls, date, produits=None):
+        """Stock quantity and value at ``date``, in total and per category.
+        
+        ``stocks`` holds the per-product result of stocks_a().
+        """
+        stocks = cls.stocks_a(date, produits)
+        categories = dict(
+            (produits if produits is not None else Produit.objects.all()).values_list('pk', 'categorie__nom')
+        )
+        
+        total = {'quantite': 0, 'valeur': Decimal('0')}
+        par_categorie = {}
+        for pk, (quantite, cout) in stocks.items():
+            ligne = par_categorie.setdefault(categories[pk], {'quantite': 0, 'valeur': Decimal('0')})
+            for cumul in (total, ligne):
+                cumul['quantite'] += quantite
+                cumul['valeur'] += quantite * cout
+        return {
+            'date': date,
+            'instantane': cls.dernier_avant(date),
+            **total,
+            'par_categorie': [
+                {'categorie': nom, **valeurs} for nom, valeurs in sorted(par_categorie.items())
+            ],
+            'stocks': stocks,
+        }
\ No newline at end of file
@@ -2,8 +2,10 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, View
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q, F, Sum
-from django.urls import reverse_lazy
+from django.core.paginator import Paginator
+from django.urls import reverse, reverse_lazy
 from apps.achats import models
 from apps.produits.models import Produit
 from .models import MouvementStock, Inventaire, InventaireItem
@@ -41,9 +43,9 @@ class StockListView(LoginRequiredMixin, ListView):
             actif=True, quantite_stock__lte=F('seuil_alerte')
         )
 
-        # 🔥 Calcul de la valeur totale du stock
+        # 🔥 Valeur totale du stock au coût de revient, tenue par produit à chaque mouvement
         valeur_stock = Produit.objects.filter(actif=True).aggregate(
-            total=Sum(F('quantite_stock') * F('prix_vente'))
+            total=Sum('valeur_stock')
         )['total'] or 0
 
 
@@ -111,17 +113,12 @@ class InventaireCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
     
     def form_valid(self, form):
         form.instance.utilisateur = self.request.user
-        response = super().form_valid(form)
+        with transaction.atomic():
+            response = super().form_valid(form)
+            # Lignes des produits actifs (des catégories choisies) en quelques INSERT
+            nombre = self.object.creer_items()
         
-        # Create inventory items for all active products
-        for produit in Produit.objects.filter(actif=True):
-            InventaireItem.objects.create(
-                inventaire=self.object,
-                produit=produit,
-                quantite_systeme=produit.quantite_stock
-            )
-        
-        messages.success(self.request, 'Inventaire créé avec succès!')
+        messages.success(self.request, f'Inventaire créé avec succès ({nombre} produits à compter)!')
         return response
     
     def get_success_url(self):
@@ -140,30 +137,48 @@ class InventaireUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     model = Inventaire
     template_name = 'stock/inventaire_edit.html'
     fields = []
+    # Feuille saisie par pages : 2 champs par ligne, sous la limite Django
+    # de DATA_UPLOAD_MAX_NUMBER_FIELDS (1000) ; le scan passe par l'API comptages
+    lignes_par_page = 400
     
     def test_func(self):
         return self.request.user.role in ['admin', 'manager'] and not self.get_object().clos
     
+    def get_page(self):
+        items = self.object.items.select_related('produit__categorie').order_by('pk')
+        return Paginator(items, self.lignes_par_page).get_page(self.request.GET.get('page'))
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['items'] = self.object.items.select_related('produit').all()
+        page = self.get_page()
+        context.update(items=page.object_list, page_obj=page, is_paginated=page.has_other_pages())
         return context
     
     def post(self, request, *args, **kwargs):
-        inventaire = self.get_object()
+        inventaire = self.object = self.get_object()
         
-        # Update item quantities
+        # Toute la feuille est lue avant d'écrire : une requête de lecture, une d'écriture
+        quantites, notes = {}, {}
         for key, value in request.POST.items():
-            if key.startswith('quantite_'):
-                item_id = key.split('_')[1]
-                try:
-                    item = inventaire.items.get(pk=item_id)
-                    item.quantite_comptee = int(value or 0)
-                    item.save()
-                except (InventaireItem.DoesNotExist, ValueError):
-                    pass
+            champ, _, item_id = key.partition('_')
+            if champ not in ('quantite', 'note') or not item_id.isdigit():
+                continue
+            if champ == 'note':
+                notes[int(item_id)] = value.strip()
+                continue
+            try:
+                quantite = int(value or 0)
+            except ValueError:
+                continue
+            if quantite >= 0:
+                quantites[int(item_id)] = quantite
+        inventaire.saisir_comptages(quantites, notes)
         
         messages.success(request, 'Quantités mises à jour!')
+        # Page suivante de la feuille, ou retour au détail après la dernière
+        page = self.get_page()
+        if page.has_next():
+            return redirect(f"{reverse('stock:inventaire_edit', args=[inventaire.pk])}?page={page.next_page_number()}")
         return redirect('stock:inventaire_detail', pk=inventaire.pk)
 
 
@@ -177,8 +192,13 @@ class InventaireCloseView(LoginRequiredMixin, UserPassesTestMixin, View):
         if inventaire.clos:
             messages.error(request, 'Inventaire déjà clos!')
         else:
-            inventaire.cloturer()
-            messages.success(request, 'Inventaire clos avec succès!')
+            try:
+                nombre = inventaire.cloturer()
+            except ValueError as e:
+                # Stock devenu insuffisant depuis le comptage, ou clôture concurrente
+                messages.error(request, str(e))
+            else:
+                messages.success(request, f'Inventaire clos avec succès ({nombre} produits ajustés)!')
         
         return redirect('stock:inventaire_detail', pk=pk)
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Vente, VenteItem
+from .models import Client, Paiement, Vente, VenteDailyRollup, VenteItem
 
 
 class VenteItemInline(admin.TabularInline):
@@ -9,17 +9,30 @@ class VenteItemInline(admin.TabularInline):
     readonly_fields = ['total_ttc']
 
 
+class PaiementInline(admin.TabularInline):
+    model = Paiement
+    extra = 0
+    fields = ['date', 'mode_paiement', 'montant', 'utilisateur']
+    readonly_fields = fields
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        # Les paiements passent par enregistrer_paiement (montant_paye tenu à jour)
+        return False
+
+
 @admin.register(Vente)
 class VenteAdmin(admin.ModelAdmin):
     list_display = ('numero', 'client', 'total_ttc', 'mode_paiement', 'vendeur', 'date_vente')
     list_filter = ('mode_paiement', 'date_vente', 'vendeur')
     search_fields = ('numero', 'client', 'telephone_client')
     readonly_fields = ('numero', 'total_ht', 'total_ttc', 'date_vente')
-    inlines = [VenteItemInline]
+    raw_id_fields = ('compte_client',)
+    inlines = [VenteItemInline, PaiementInline]
     
     fieldsets = (
         ('Informations client', {
-            'fields': ('client', 'telephone_client')
+            'fields': ('client', 'telephone_client', 'compte_client')
         }),
         ('Détails vente', {
             'fields': ('numero', 'mode_paiement', 'vendeur', 'date_vente')
@@ -30,4 +43,25 @@ class VenteAdmin(admin.ModelAdmin):
         ('Notes', {
             'fields': ('note',)
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(Client)
+class ClientAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'telephone', 'nombre_ventes', 'chiffre_affaires', 'solde_du')
+    search_fields = ('nom', 'telephone', 'telephone_normalise')
+    readonly_fields = ('nombre_ventes', 'chiffre_affaires', 'solde_du', 'date_creation')
+
+
+@admin.register(VenteDailyRollup)
+class VenteDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('jour', 'produit', 'categorie', 'vendeur', 'mode_paiement', 'quantite', 'chiffre_affaires', 'nombre_ventes')
+    list_filter = ('mode_paiement', 'categorie', 'vendeur')
+    date_hierarchy = 'jour'
+    
+    def has_add_permission(self, request):
+        # Lignes tenues par la caisse et reconstruire_agregats_ventes
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -1,7 +1,10 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 from . import api_views
 
 router = DefaultRouter()
 router.register(r'ventes', api_views.VenteViewSet)
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    path('sync/', api_views.SyncVentesView.as_view(), name='ventes_sync'),
+] + router.urls
\ No newline at end of file
@@ -1,33 +1,152 @@
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, status
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum, Count
-from .models import Vente
-from .serializers import VenteSerializer
+from rest_framework.pagination import CursorPagination
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import TotauxVentes, Vente, VenteDailyRollup, VenteItem
+from .serializers import VenteListSerializer, VenteSerializer
+from .services import synchroniser_ventes
+
+
+class VentePagination(CursorPagination):
+    """Keyset pagination: deep pages cost the same as the first one (no OFFSET)."""
+    ordering = ('-date_vente', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 500
 
 
 class VenteViewSet(viewsets.ModelViewSet):
     queryset = Vente.objects.all()
     serializer_class = VenteSerializer
+    pagination_class = VentePagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['mode_paiement', 'vendeur']
-    ordering_fields = ['date_vente', 'total_ttc']
-    ordering = ['-date_vente']
+    # Le curseur se positionne sur le premier champ de tri : seul date_vente
+    # (quasi unique) est proposé, un tri par montant répéterait des ventes
+    ordering_fields = ['date_vente']
+    ordering = ['-date_vente', '-id']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset().select_related('vendeur')
+        if self.action != 'list':
+            # Articles et produits chargés en deux requêtes, quel que soit le nombre d'articles
+            queryset = queryset.prefetch_related(
+                Prefetch('items', queryset=VenteItem.objects.select_related('produit'))
+            )
+        return queryset
+    
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return VenteListSerializer
+        return super().get_serializer_class()
+    
+    @action(detail=True, methods=['post'])
+    def retour(self, request, pk=None):
+        """Return items: {"items": [{"produit_id", "quantite"}], "motif", "mode_remboursement"}.
+        
+        Without items, the whole sale is cancelled.
+        """
+        if request.user.role not in ['admin', 'manager']:
+            return Response({'error': "Accès refusé"}, status=status.HTTP_403_FORBIDDEN)
+        
+        vente = self.get_object()
+        items = request.data.get('items')
+        try:
+            retours = None
+            if items:
+                retours = {}
+                for item in items:
+                    produit_id = int(item['produit_id'])
+                    retours[produit_id] = retours.get(produit_id, 0) + int(item['quantite'])
+            mode = request.data.get('mode_remboursement')
+            if mode and mode not in dict(Vente.MODE_PAIEMENT_CHOICES):
+                raise ValidationError(f"Mode de paiement invalide: {mode}")
+            remboursement = vente.retourner(
+                retours,
+                utilisateur=request.user,
+                motif=request.data.get('motif', ''),
+                mode_remboursement=mode
+            )
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': "Articles invalides"}, status=status.HTTP_400_BAD_REQUEST)
+        except ValidationError as e:
+            return Response({'error': e.messages[0]}, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = self.get_serializer(self.get_queryset().get(pk=vente.pk)).data
+        data['remboursement'] = remboursement
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def statistiques(self, request):
-        """Get sales statistics."""
-        from django.utils import timezone
-        today = timezone.now().date()
+        """Sales statistics from the running totals and the daily rollup.
         
+        ?date_debut=&date_fin= (YYYY-MM-DD) adds the totals of that period.
+        Results are cached for STATISTIQUES_CACHE_TTL seconds.
+        """
+        dates = {}
+        for parametre in ('date_debut', 'date_fin'):
+            valeur = request.query_params.get(parametre)
+            try:
+                dates[parametre] = parse_date(valeur) if valeur else None
+            except ValueError:
+                dates[parametre] = None
+            if valeur and dates[parametre] is None:
+                return Response({'error': f"{parametre} invalide (AAAA-MM-JJ)"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        today = timezone.localdate()
+        cle = f"ventes:statistiques:{today}:{dates['date_debut']}:{dates['date_fin']}"
+        return Response(cache.get_or_set(
+            cle,
+            lambda: self._statistiques(today, dates['date_debut'], dates['date_fin']),
+            settings.STATISTIQUES_CACHE_TTL
+        ))
+    
+    def _statistiques(self, today, date_debut, date_fin):
+        totaux = TotauxVentes.lire()
+        jour = VenteDailyRollup.totaux(today)
         stats = {
-            'ventes_aujourd_hui': self.queryset.filter(date_vente__date=today).count(),
-            'ca_aujourd_hui': self.queryset.filter(date_vente__date=today).aggregate(
-                total=Sum('total_ttc')
-            )['total'] or 0,
-            'total_ventes': self.queryset.count(),
-            'ca_total': self.queryset.aggregate(total=Sum('total_ttc'))['total'] or 0,
+            'ventes_aujourd_hui': jour['nombre_ventes'],
+            'ca_aujourd_hui': jour['ca'],
+            'total_ventes': totaux.nombre_ventes,
+            'ca_total': totaux.chiffre_affaires,
         }
         
-        return Response(stats)
\ No newline at end of file
+        if date_debut or date_fin:
+            debut = date_debut or VenteDailyRollup.objects.order_by('jour').values_list('jour', flat=True).first() or today
+            fin = date_fin or today
+            periode = VenteDailyRollup.totaux(debut, fin)
+            stats['periode'] = {
+                'date_debut': debut,
+                'date_fin': fin,
+                'nombre_ventes': periode['nombre_ventes'],
+                'ca': periode['ca'],
+                'quantite': periode['quantite'],
+            }
+        
+        return stats
+
+
+class SyncVentesView(APIView):
+    """Receive the sales recorded by a till while it was offline."""
+    
+    def post(self, request):
+        ventes = request.data.get('ventes')
+        if not isinstance(ventes, list) or not all(isinstance(v, dict) for v in ventes):
+            return Response(
+                {'error': "Le champ 'ventes' doit être une liste de ventes"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        resultats = synchroniser_ventes(request.user, ventes)
+        return Response({
+            'resultats': resultats,
+            'succes': sum(1 for r in resultats if r['success']),
+            'echecs': sum(1 for r in resultats if not r['success']),
+        })
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class VentesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.ventes'
-    verbose_name = 'Ventes'
\ No newline at end of file
+    verbose_name = 'Ventes'
+    
+    def ready(self):
+        import apps.ventes.signals
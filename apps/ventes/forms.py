@@ -2,7 +2,7 @@ from django import forms
 from django.forms import inlineformset_factory
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Row, Column
-from .models import Vente, VenteItem
+from .models import Client, Vente, VenteItem
 
 
 class VenteForm(forms.ModelForm):
@@ -26,6 +26,15 @@ class VenteForm(forms.ModelForm):
             'note',
             Submit('submit', 'Sauvegarder', css_class='btn btn-primary')
         )
+    
+    def save(self, commit=True):
+        vente = super().save(commit=False)
+        # Nom ou téléphone modifié : rattacher la vente au bon client
+        if vente.pk and {'client', 'telephone_client'} & set(self.changed_data):
+            vente.compte_client = Client.pour(vente.client, vente.telephone_client)
+        if commit:
+            vente.save()
+        return vente
 
 
 class VenteItemForm(forms.ModelForm):
@@ -0,0 +1,222 @@
+import json
+import math
+import random
+import tempfile
+import threading
+import time
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client as ClientTest
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+from apps.produits.models import Categorie, Produit
+
+
+def centile(valeurs, p):
+    """Nearest-rank percentile of sorted ``valeurs`` (None when empty)."""
+    if not valeurs:
+        return None
+    rang = max(0, min(len(valeurs) - 1, math.ceil(p / 100 * len(valeurs)) - 1))
+    return valeurs[rang]
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the till: N simulated cashiers post sales to CaisseView concurrently on a '
+        'seeded throwaway database and report latency percentiles, lock errors and throughput as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--caissiers',
+            type=int,
+            default=4,
+            help='Number of concurrent cashiers, one thread each (default: 4)',
+        )
+        parser.add_argument(
+            '--ventes',
+            type=int,
+            default=50,
+            help='Number of sales posted by each cashier (default: 50)',
+        )
+        parser.add_argument(
+            '--articles',
+            type=int,
+            default=3,
+            help='Number of different products per sale (default: 3)',
+        )
+        parser.add_argument(
+            '--produits',
+            type=int,
+            default=200,
+            help='Number of products seeded in the catalogue (default: 200)',
+        )
+        parser.add_argument(
+            '--graine',
+            type=int,
+            default=0,
+            help='Random seed of the generated carts (default: 0)',
+        )
+        parser.add_argument(
+            '--sortie',
+            help='Write the JSON baseline to this file',
+        )
+        parser.add_argument(
+            '--reference',
+            help='Previous JSON baseline to compare the results with',
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        ancien_nom = connection.settings_dict['NAME']
+        with tempfile.TemporaryDirectory() as dossier:
+            # Base jetable : un fichier SQLite partagé par les threads, jamais la base réelle
+            if connection.vendor == 'sqlite':
+                connection.settings_dict.setdefault('TEST', {})['NAME'] = str(Path(dossier) / 'charge.sqlite3')
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                caissiers, produits = self.preparer(options)
+                resultats = self.simuler(caissiers, produits, options)
+            finally:
+                connections.close_all()
+                connection.creation.destroy_test_db(ancien_nom, verbosity=0)
+                teardown_test_environment()
+
+        rapport = self.rapport(resultats, options)
+        sortie = json.dumps(rapport, indent=2, ensure_ascii=False)
+        self.stdout.write(sortie)
+        if options['sortie']:
+            Path(options['sortie']).write_text(sortie + '\n', encoding='utf-8')
+        if options['reference']:
+            self.comparer(rapport, json.loads(Path(options['reference']).read_text(encoding='utf-8')))
+
+        # Seul le JSON va sur stdout, pour pouvoir le rediriger comme référence
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"{rapport['ventes']['reussies']} sale(s) in {rapport['duree_s']} s, "
+                f"p95 {rapport['latence_ms']['p95']} ms, {rapport['ventes']['verrous']} lock error(s)"
+            )
+        )
+
+    def preparer(self, options):
+        """Seed the cashiers and a catalogue with enough stock for every sale."""
+        User = get_user_model()
+        caissiers = [
+            User.objects.create_user(
+                username=f'caisse{i}', email=f'caisse{i}@charge.local', password=None, role='cashier'
+            )
+            for i in range(options['caissiers'])
+        ]
+        categorie = Categorie.objects.create(nom='Charge')
+        Produit.objects.bulk_create(
+            Produit(
+                nom=f'Produit {i}', slug=f'produit-charge-{i}', categorie=categorie, prix_achat=Decimal('500'),
+                prix_vente=Decimal('1000'), quantite_stock=10 ** 6
+            )
+            for i in range(options['produits'])
+        )
+        return caissiers, list(Produit.objects.values_list('pk', flat=True))
+
+    def simuler(self, caissiers, produits, options):
+        """Run one thread per cashier; returns (latencies, lock errors, other errors, duration)."""
+        url = reverse('ventes:caisse')
+        depart = threading.Barrier(len(caissiers) + 1)
+        verrou = threading.Lock()
+        latences, verrous, erreurs = [], [0], []
+
+        def caisse(numero, caissier):
+            client = ClientTest()
+            client.force_login(caissier)
+            hasard = random.Random(options['graine'] * 1000 + numero)
+            depart.wait()
+            try:
+                for _ in range(options['ventes']):
+                    panier = hasard.sample(produits, min(options['articles'], len(produits)))
+                    corps = json.dumps({
+                        'items': [{'produit_id': pk, 'quantite': hasard.randint(1, 3)} for pk in panier],
+                        'mode_paiement': 'especes',
+                    })
+                    debut = time.perf_counter()
+                    try:
+                        reponse = client.post(
+                            url, corps, content_type='application/json',
+                            HTTP_IDEMPOTENCY_KEY=uuid.uuid4().hex
+                        )
+                        erreur = None if reponse.status_code == 200 else reponse.json().get('error', '')
+                    except Exception as e:
+                        # Erreur levée hors de la vue (session, authentification...)
+                        erreur = str(e)
+                    duree = time.perf_counter() - debut
+                    with verrou:
+                        if erreur is None:
+                            latences.append(duree)
+                        elif 'locked' in erreur:
+                            verrous[0] += 1
+                        else:
+                            erreurs.append(erreur)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=caisse, args=(i, caissier))
+            for i, caissier in enumerate(caissiers)
+        ]
+        for thread in threads:
+            thread.start()
+        depart.wait()
+        debut = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return sorted(latences), verrous[0], erreurs, time.perf_counter() - debut
+
+    def rapport(self, resultats, options):
+        latences, verrous, erreurs, duree = resultats
+        en_ms = lambda valeur: None if valeur is None else round(valeur * 1000, 2)
+        return {
+            'date': timezone.now().isoformat(timespec='seconds'),
+            'django': django.get_version(),
+            'base': connection.vendor,
+            'parametres': {
+                cle: options[cle] for cle in ('caissiers', 'ventes', 'articles', 'produits', 'graine')
+            },
+            'duree_s': round(duree, 3),
+            'debit_ventes_s': round(len(latences) / duree, 2) if duree else None,
+            'ventes': {
+                'tentees': len(latences) + verrous + len(erreurs),
+                'reussies': len(latences),
+                'verrous': verrous,
+                'erreurs': len(erreurs),
+                'exemples_erreurs': sorted(set(erreurs))[:5],
+            },
+            'latence_ms': {
+                'p50': en_ms(centile(latences, 50)),
+                'p95': en_ms(centile(latences, 95)),
+                'p99': en_ms(centile(latences, 99)),
+                'moyenne': en_ms(sum(latences) / len(latences)) if latences else None,
+                'max': en_ms(latences[-1] if latences else None),
+            },
+        }
+
+    def comparer(self, rapport, reference):
+        """Print the change of the main figures against a previous baseline (on stderr)."""
+        if reference.get('parametres') != rapport['parametres']:
+            self.stderr.write(self.style.WARNING('Reference was run with different parameters'))
+        mesures = [
+            ('latence p50 (ms)', rapport['latence_ms']['p50'], reference['latence_ms']['p50']),
+            ('latence p95 (ms)', rapport['latence_ms']['p95'], reference['latence_ms']['p95']),
+            ('latence p99 (ms)', rapport['latence_ms']['p99'], reference['latence_ms']['p99']),
+            ('debit (ventes/s)', rapport['debit_ventes_s'], reference['debit_ventes_s']),
+            ('verrous', rapport['ventes']['verrous'], reference['ventes']['verrous']),
+        ]
+        for nom, actuel, avant in mesures:
+            if actuel is None or avant is None:
+                continue
+            ecart = f' ({(actuel - avant) / avant:+.1%})' if avant else ''
+            self.stderr.write(f'{nom}: {avant} -> {actuel}{ecart}')
@@ -0,0 +1,22 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from apps.ventes.models import CleIdempotence
+
+
+class Command(BaseCommand):
+    help = 'Delete expired caisse idempotency keys'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--heures',
+            type=int,
+            help='Keep keys younger than this many hours (default: IDEMPOTENCE_TTL_HEURES)',
+        )
+    
+    def handle(self, *args, **options):
+        ttl = timedelta(hours=options['heures']) if options['heures'] is not None else None
+        deleted = CleIdempotence.purger(ttl=ttl)
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'{deleted} idempotency key(s) deleted')
+        )
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from apps.ventes.models import Client, Vente
+
+
+class Command(BaseCommand):
+    help = 'Link free-text sale clients to deduplicated Client records and rebuild their totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--taille-lot',
+            type=int,
+            default=500,
+            help='Number of sales processed per transaction (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        taille_lot = options['taille_lot']
+        a_rattacher = Vente.objects.filter(compte_client__isnull=True).exclude(
+            Q(client='') & Q(telephone_client='')
+        ).order_by('pk')
+
+        dernier_pk = 0
+        total = 0
+        while True:
+            lot = list(
+                a_rattacher.filter(pk__gt=dernier_pk).values_list('pk', 'client', 'telephone_client')[:taille_lot]
+            )
+            if not lot:
+                break
+            dernier_pk = lot[-1][0]
+
+            with transaction.atomic():
+                clients = Client.pour_lot([(nom, telephone) for _, nom, telephone in lot])
+                ventes = []
+                for pk, nom, telephone in lot:
+                    client = clients.get(Client.cle_pour(nom, telephone))
+                    if client is not None:
+                        ventes.append(Vente(pk=pk, compte_client=client))
+                # bulk_update ne passe pas par Vente.save : totaux recalculés à la fin
+                Vente.objects.bulk_update(ventes, ['compte_client'])
+            total += len(ventes)
+            self.stdout.write(f'{total} sale(s) linked...')
+
+        Client.recalculer()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{total} sale(s) linked to {Client.objects.count()} client(s); totals rebuilt'
+            )
+        )
@@ -0,0 +1,30 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from apps.ventes.models import TotauxVentes, VenteDailyRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollup (VenteDailyRollup) and the running totals from the sales'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--debut',
+            type=date.fromisoformat,
+            help='First day to rebuild, YYYY-MM-DD (default: whole history)',
+        )
+        parser.add_argument(
+            '--fin',
+            type=date.fromisoformat,
+            help='Last day to rebuild, YYYY-MM-DD (default: whole history)',
+        )
+    
+    def handle(self, *args, **options):
+        lignes = VenteDailyRollup.recalculer(options['debut'], options['fin'])
+        totaux = TotauxVentes.recalculer()
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{lignes} rollup row(s) rebuilt; running totals: {totaux.nombre_ventes} sale(s), '
+                f'{totaux.chiffre_affaires} FCFA'
+            )
+        )
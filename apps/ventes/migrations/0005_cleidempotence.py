@@ -0,0 +1,27 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0004_vente_montant_paye_vente_statut_paiement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CleIdempotence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=100, unique=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('vente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cles_idempotence', to='ventes.vente')),
+            ],
+            options={
+                'verbose_name': "Clé d'idempotence",
+                'verbose_name_plural': "Clés d'idempotence",
+            },
+        ),
+    ]
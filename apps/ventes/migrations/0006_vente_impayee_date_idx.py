@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0005_cleidempotence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vente',
+            index=models.Index(condition=models.Q(('statut_paiement__in', ['partiel', 'impaye'])), fields=['-date_vente'], name='vente_impayee_date_idx'),
+        ),
+    ]
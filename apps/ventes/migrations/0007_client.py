@@ -0,0 +1,40 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0006_vente_impayee_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Client',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(blank=True, max_length=200)),
+                ('telephone', models.CharField(blank=True, max_length=20)),
+                ('telephone_normalise', models.CharField(blank=True, editable=False, max_length=20)),
+                ('nom_normalise', models.CharField(blank=True, editable=False, max_length=200)),
+                ('nombre_ventes', models.PositiveIntegerField(default=0)),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('solde_du', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Client',
+                'verbose_name_plural': 'Clients',
+                'ordering': ['nom'],
+                'indexes': [models.Index(fields=['nom_normalise'], name='ventes_clie_nom_nor_5e04b2_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('telephone_normalise', ''), _negated=True), fields=('telephone_normalise',), name='client_telephone_unique'), models.UniqueConstraint(condition=models.Q(('telephone_normalise', '')), fields=('nom_normalise',), name='client_nom_sans_telephone_unique')],
+            },
+        ),
+        migrations.AddField(
+            model_name='vente',
+            name='compte_client',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ventes', to='ventes.client'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_alter_transaction_utilisateur'),
+        ('ventes', '0007_client'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Paiement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('mode_paiement', models.CharField(choices=[('especes', 'Espèces'), ('carte', 'Carte bancaire'), ('cheque', 'Chèque'), ('virement', 'Virement'), ('mobile', 'Paiement mobile')], default='especes', max_length=20)),
+                ('date', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='paiements', to='finance.transaction')),
+                ('utilisateur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='paiements', to=settings.AUTH_USER_MODEL)),
+                ('vente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paiements', to='ventes.vente')),
+            ],
+            options={
+                'verbose_name': 'Paiement',
+                'verbose_name_plural': 'Paiements',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'mode_paiement'], name='ventes_paie_date_002d54_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:46
+
+from decimal import Decimal
+
+from django.db import migrations
+
+
+TAILLE_LOT = 500
+
+
+def creer_paiements(apps, schema_editor):
+    """One Paiement per existing RECETTE transaction of a sale.
+
+    When the transactions of a sale do not add up to its montant_paye,
+    montant_paye is kept as the reference and recorded as a single payment.
+    """
+    Vente = apps.get_model('ventes', 'Vente')
+    Paiement = apps.get_model('ventes', 'Paiement')
+    Transaction = apps.get_model('finance', 'Transaction')
+
+    ventes = Vente.objects.filter(montant_paye__gt=0).order_by('pk')
+    dernier_pk = 0
+    while True:
+        lot = list(
+            ventes.filter(pk__gt=dernier_pk).values_list(
+                'pk', 'montant_paye', 'mode_paiement', 'date_vente', 'vendeur_id'
+            )[:TAILLE_LOT]
+        )
+        if not lot:
+            break
+        dernier_pk = lot[-1][0]
+
+        transactions = {}
+        for transaction in Transaction.objects.filter(
+            vente_id__in=[ligne[0] for ligne in lot], type='RECETTE'
+        ).order_by('date'):
+            transactions.setdefault(transaction.vente_id, []).append(transaction)
+
+        paiements = []
+        for pk, montant_paye, mode, date_vente, vendeur_id in lot:
+            liees = transactions.get(pk, [])
+            if sum((t.montant for t in liees), Decimal('0')) == montant_paye:
+                paiements.extend(
+                    Paiement(
+                        vente_id=pk, montant=t.montant, mode_paiement=mode, date=t.date,
+                        utilisateur_id=t.utilisateur_id, transaction_id=t.pk
+                    )
+                    for t in liees
+                )
+            else:
+                paiements.append(Paiement(
+                    vente_id=pk, montant=montant_paye, mode_paiement=mode, date=date_vente,
+                    utilisateur_id=vendeur_id
+                ))
+        Paiement.objects.bulk_create(paiements)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0008_paiement'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_paiements, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produits', '0003_codebarre'),
+        ('ventes', '0009_paiements_existants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VenteDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('mode_paiement', models.CharField(choices=[('especes', 'Espèces'), ('carte', 'Carte bancaire'), ('cheque', 'Chèque'), ('virement', 'Virement'), ('mobile', 'Paiement mobile')], max_length=20)),
+                ('quantite', models.IntegerField(default=0)),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('lignes', models.IntegerField(default=0)),
+                ('nombre_ventes', models.IntegerField(default=0)),
+                ('categorie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agregats_ventes', to='produits.categorie')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agregats_ventes', to='produits.produit')),
+                ('vendeur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='agregats_ventes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Agrégat journalier des ventes',
+                'verbose_name_plural': 'Agrégats journaliers des ventes',
+                'ordering': ['-jour'],
+                'constraints': [models.UniqueConstraint(fields=('jour', 'produit', 'categorie', 'vendeur', 'mode_paiement'), name='vente_rollup_cle_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:50
+
+from django.db import migrations
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.db.models.functions import TruncDate
+
+
+def creer_agregats(apps, schema_editor):
+    """Build the daily rollup rows of the existing sales (see VenteDailyRollup.recalculer)."""
+    VenteItem = apps.get_model('ventes', 'VenteItem')
+    VenteDailyRollup = apps.get_model('ventes', 'VenteDailyRollup')
+
+    premier = ~Exists(VenteItem.objects.filter(vente=OuterRef('vente'), produit_id__lt=OuterRef('produit_id')))
+    agregats = VenteItem.objects.annotate(jour=TruncDate('vente__date_vente')).order_by().values(
+        'jour', 'produit', 'produit__categorie', 'vente__vendeur', 'vente__mode_paiement'
+    ).annotate(
+        total_quantite=Sum('quantite'),
+        total_ca=Sum('total_ttc'),
+        total_lignes=Count('pk'),
+        total_ventes=Count('pk', filter=premier),
+    )
+    VenteDailyRollup.objects.bulk_create([
+        VenteDailyRollup(
+            jour=agregat['jour'],
+            produit_id=agregat['produit'],
+            categorie_id=agregat['produit__categorie'],
+            vendeur_id=agregat['vente__vendeur'],
+            mode_paiement=agregat['vente__mode_paiement'],
+            quantite=agregat['total_quantite'],
+            chiffre_affaires=agregat['total_ca'],
+            lignes=agregat['total_lignes'],
+            nombre_ventes=agregat['total_ventes'],
+        )
+        for agregat in agregats.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0010_vente_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_agregats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0011_agregats_existants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TotauxVentes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre_ventes', models.BigIntegerField(default=0)),
+                ('chiffre_affaires', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'verbose_name': 'Totaux des ventes',
+                'verbose_name_plural': 'Totaux des ventes',
+            },
+        ),
+    ]
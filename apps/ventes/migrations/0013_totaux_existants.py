@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:53
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def creer_totaux(apps, schema_editor):
+    """Running totals row of the existing sales (see TotauxVentes.recalculer)."""
+    Vente = apps.get_model('ventes', 'Vente')
+    TotauxVentes = apps.get_model('ventes', 'TotauxVentes')
+
+    resultat = Vente.objects.aggregate(nombre=Count('pk'), ca=Sum('total_ttc'))
+    TotauxVentes.objects.update_or_create(pk=1, defaults={
+        'nombre_ventes': resultat['nombre'],
+        'chiffre_affaires': resultat['ca'] or Decimal('0'),
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0012_totaux_ventes'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_totaux, migrations.RunPython.noop),
+    ]
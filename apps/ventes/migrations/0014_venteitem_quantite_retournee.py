@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0013_totaux_existants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venteitem',
+            name='quantite_retournee',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
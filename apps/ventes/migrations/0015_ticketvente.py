@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-17 21:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventes', '0014_venteitem_quantite_retournee'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketVente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.CharField(max_length=20, unique=True)),
+                ('html', models.TextField()),
+                ('texte', models.TextField()),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('vente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ticket', to='ventes.vente')),
+            ],
+            options={
+                'verbose_name': 'Ticket de caisse',
+                'verbose_name_plural': 'Tickets de caisse',
+            },
+        ),
+    ]
@@ -1,14 +1,191 @@
-from django.db import models
+import re
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import models, IntegrityError
+from django.db.models import Case, Count, Exists, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from apps.produits.models import Produit
+from django.utils import timezone
+from apps.produits.models import Categorie, Produit
 from apps.stock.models import MouvementStock
 from apps.finance.models import Transaction
+from apps.dashboard.models import Compteur
 
 User = get_user_model()
 
 
+def normaliser_telephone(numero):
+    """Digits only, without the +221/00221 prefix ('77 123 45 67' == '+221771234567')."""
+    chiffres = re.sub(r'\D', '', numero or '')
+    if chiffres.startswith('00'):
+        chiffres = chiffres[2:]
+    if chiffres.startswith('221') and len(chiffres) == 12:
+        chiffres = chiffres[3:]
+    return chiffres
+
+
+def normaliser_nom(nom):
+    return ' '.join((nom or '').split()).casefold()
+
+
+class Client(models.Model):
+    """Client identifié par son téléphone (à défaut par son nom).
+    
+    nombre_ventes, chiffre_affaires et solde_du sont tenus à jour à chaque
+    vente ou paiement (voir Vente.save) ; Client.recalculer les reconstruit.
+    """
+    nom = models.CharField(max_length=200, blank=True)
+    telephone = models.CharField(max_length=20, blank=True)
+    telephone_normalise = models.CharField(max_length=20, blank=True, editable=False)
+    nom_normalise = models.CharField(max_length=200, blank=True, editable=False)
+    nombre_ventes = models.PositiveIntegerField(default=0)
+    chiffre_affaires = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    solde_du = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Client"
+        verbose_name_plural = "Clients"
+        ordering = ['nom']
+        indexes = [
+            models.Index(fields=['nom_normalise']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['telephone_normalise'],
+                condition=~models.Q(telephone_normalise=''),
+                name='client_telephone_unique',
+            ),
+            models.UniqueConstraint(
+                fields=['nom_normalise'],
+                condition=models.Q(telephone_normalise=''),
+                name='client_nom_sans_telephone_unique',
+            ),
+        ]
+    
+    def __str__(self):
+        if self.nom and self.telephone:
+            return f"{self.nom} ({self.telephone})"
+        return self.nom or self.telephone
+    
+    def normaliser(self):
+        self.telephone_normalise = normaliser_telephone(self.telephone)
+        self.nom_normalise = normaliser_nom(self.nom)
+    
+    def save(self, *args, **kwargs):
+        self.normaliser()
+        super().save(*args, **kwargs)
+    
+    @staticmethod
+    def cle_pour(nom, telephone):
+        """Identity key of a free-text client: the phone if any, else the name."""
+        telephone = normaliser_telephone(telephone)
+        if telephone:
+            return ('telephone', telephone)
+        nom = normaliser_nom(nom)
+        if nom:
+            return ('nom', nom)
+        return None
+    
+    @classmethod
+    def pour(cls, nom, telephone):
+        """Return the client matching a free-text name/phone, creating it if needed."""
+        cle = cls.cle_pour(nom, telephone)
+        if cle is None:
+            return None
+        return cls.pour_lot([(nom, telephone)])[cle]
+    
+    @classmethod
+    def pour_lot(cls, identites):
+        """Resolve ``(nom, telephone)`` pairs in two queries; return ``{cle: client}``."""
+        cles = {}
+        for nom, telephone in identites:
+            cle = cls.cle_pour(nom, telephone)
+            if cle is not None and cle not in cles:
+                cles[cle] = (nom, telephone)
+        if not cles:
+            return {}
+        
+        clients = cls._charger(cles)
+        manquants = []
+        for cle, (nom, telephone) in cles.items():
+            if cle not in clients:
+                client = cls(nom=(nom or '').strip(), telephone=(telephone or '').strip())
+                client.normaliser()
+                manquants.append(client)
+        if manquants:
+            # ignore_conflicts : un autre worker a pu créer le même client entre-temps
+            cls.objects.bulk_create(manquants, ignore_conflicts=True)
+            clients = cls._charger(cles)
+        return clients
+    
+    @classmethod
+    def _charger(cls, cles):
+        telephones = [valeur for type_cle, valeur in cles if type_cle == 'telephone']
+        noms = [valeur for type_cle, valeur in cles if type_cle == 'nom']
+        clients = {}
+        for client in cls.objects.filter(
+            Q(telephone_normalise__in=telephones) | Q(telephone_normalise='', nom_normalise__in=noms)
+        ):
+            if client.telephone_normalise:
+                clients[('telephone', client.telephone_normalise)] = client
+            else:
+                clients[('nom', client.nom_normalise)] = client
+        return clients
+    
+    @staticmethod
+    def variations(avant, apres, variations=None):
+        """Deltas ``{client_id: (ventes, CA, solde dû)}`` between two sale states.
+        
+        A state is ``(compte_client_id, total_ttc, montant_paye)``, or None
+        when the sale does not exist (creation / deletion). Deltas are added
+        to ``variations`` when given, to cumulate several sales.
+        """
+        if variations is None:
+            variations = {}
+        for etat, signe in ((avant, -1), (apres, 1)):
+            if etat is None or etat[0] is None:
+                continue
+            client_id, total, paye = etat
+            nombre, ca, du = variations.get(client_id, (0, Decimal('0'), Decimal('0')))
+            variations[client_id] = (
+                nombre + signe,
+                ca + signe * total,
+                du + signe * max(total - paye, Decimal('0')),
+            )
+        return variations
+    
+    @classmethod
+    def appliquer(cls, variations):
+        """Apply per-client deltas with F() updates (no read-modify-write)."""
+        for client_id, (nombre, ca, du) in variations.items():
+            if nombre or ca or du:
+                cls.objects.filter(pk=client_id).update(
+                    nombre_ventes=F('nombre_ventes') + nombre,
+                    chiffre_affaires=F('chiffre_affaires') + ca,
+                    solde_du=F('solde_du') + du,
+                )
+    
+    @classmethod
+    def recalculer(cls, queryset=None):
+        """Rebuild the running totals from the sales, in one UPDATE."""
+        ventes = Vente.objects.filter(compte_client=OuterRef('pk')).order_by().values('compte_client')
+        nombre = ventes.annotate(n=Count('pk')).values('n')
+        ca = ventes.annotate(s=Sum('total_ttc')).values('s')
+        du = ventes.filter(statut_paiement__in=Vente.STATUTS_IMPAYES).annotate(
+            s=Sum(F('total_ttc') - F('montant_paye'))
+        ).values('s')
+        
+        zero = models.Value(Decimal('0'), output_field=models.DecimalField())
+        return (queryset if queryset is not None else cls.objects.all()).update(
+            nombre_ventes=Coalesce(Subquery(nombre), 0),
+            chiffre_affaires=Coalesce(Subquery(ca), zero),
+            solde_du=Coalesce(Subquery(du), zero),
+        )
+
+
 class Vente(models.Model):
     MODE_PAIEMENT_CHOICES = [
         ('especes', 'Espèces'),
@@ -24,9 +201,13 @@ class Vente(models.Model):
         ('impaye', 'Impayé'),
     ]
     
+    # Statuts comptés comme créances clients
+    STATUTS_IMPAYES = ['partiel', 'impaye']
+    
     numero = models.CharField(max_length=20, unique=True, blank=True)
     client = models.CharField(max_length=200, blank=True)
     telephone_client = models.CharField(max_length=15, blank=True)
+    compte_client = models.ForeignKey(Client, on_delete=models.SET_NULL, null=True, blank=True, related_name='ventes')
     total_ht = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_ttc = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     montant_paye = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -47,6 +228,14 @@ class Vente(models.Model):
         verbose_name = "Vente"
         verbose_name_plural = "Ventes"
         ordering = ['-date_vente']
+        indexes = [
+            # Index partiel : seules les ventes non soldées (page des dettes)
+            models.Index(
+                fields=['-date_vente'],
+                condition=models.Q(statut_paiement__in=['partiel', 'impaye']),
+                name='vente_impayee_date_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"Vente {self.numero} - {self.total_ttc} FCFA ({self.get_statut_paiement_display()})"
@@ -55,21 +244,71 @@ class Vente(models.Model):
     def reste_a_payer(self):
         return self.total_ttc - self.montant_paye
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # État de référence pour mettre à jour les totaux du client au save()
+        instance._etat_client = instance._etat_compte()
+        # Clé d'agrégat journalier, pour détecter un changement de jour/vendeur/mode
+        instance._etat_agregat = instance.etat_agregat()
+        return instance
+    
+    def _etat_compte(self, avant=None, update_fields=None):
+        """(compte_client_id, total_ttc, montant_paye) as stored, or None if unknown."""
+        etat = []
+        for index, (champ, attribut) in enumerate((
+            ('compte_client', 'compte_client_id'), ('total_ttc', 'total_ttc'), ('montant_paye', 'montant_paye')
+        )):
+            if avant is not None and update_fields is not None \
+                    and champ not in update_fields and attribut not in update_fields:
+                etat.append(avant[index])
+            elif attribut in self.__dict__:
+                valeur = self.__dict__[attribut]
+                etat.append(valeur if index == 0 else Decimal(str(valeur)))
+            else:
+                return None
+        return tuple(etat)
+    
+    def etat_agregat(self):
+        """(jour, vendeur_id, mode_paiement) used by VenteDailyRollup, or None if not loaded."""
+        if not all(champ in self.__dict__ for champ in ('date_vente', 'vendeur_id', 'mode_paiement')):
+            return None
+        return (timezone.localdate(self.date_vente), self.vendeur_id, self.mode_paiement)
+    
     def save(self, *args, **kwargs):
         if not self.numero:
             # Generate sale number
             from django.utils import timezone
-            today = timezone.now()
-            prefix = f"V{today.strftime('%Y%m%d')}"
-            last_sale = Vente.objects.filter(numero__startswith=prefix).order_by('-numero').first()
-            if last_sale:
-                last_num = int(last_sale.numero[-4:])
-                new_num = last_num + 1
-            else:
-                new_num = 1
-            self.numero = f"{prefix}{new_num:04d}"
+            self.numero = Vente.allouer_numeros(timezone.now())[0]
         
-        super().save(*args, **kwargs)
+        nouvelle = self._state.adding
+        if nouvelle and self.compte_client_id is None:
+            self.compte_client = Client.pour(self.client, self.telephone_client)
+        avant = None if nouvelle else getattr(self, '_etat_client', None)
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Totaux du client mis à jour par différence avec l'état chargé
+            if nouvelle or avant is not None:
+                apres = self._etat_compte(avant, kwargs.get('update_fields'))
+                Client.appliquer(Client.variations(avant, apres))
+                TotauxVentes.ajouter(*TotauxVentes.variation(avant, apres))
+                self._etat_client = apres
+    
+    @classmethod
+    def allouer_numeros(cls, date, nombre=1):
+        """Return `nombre` new sale numbers for the day of `date`."""
+        prefix = f"V{date.strftime('%Y%m%d')}"
+        
+        def dernier_numero():
+            # Only used once per day, when the day's counter is created
+            return Compteur.dernier_suffixe(Vente.objects.all(), 'numero', prefix)
+        
+        if nombre == 1:
+            premier = Compteur.suivant(prefix, initial=dernier_numero)
+        else:
+            premier = Compteur.allouer(prefix, nombre=nombre, initial=dernier_numero)
+        return [f"{prefix}{num:04d}" for num in range(premier, premier + nombre)]
     
     def calculate_totals(self):
         """Calculate total amounts from sale items."""
@@ -83,54 +322,229 @@ class Vente(models.Model):
     
     def finaliser(self, montant_recu=None):
         """Finalize sale: update stock and create financial transaction."""
-        if not self.items.exists():
+        items = list(self.items.select_related('produit'))
+        if not items:
             raise ValidationError("Impossible de finaliser une vente sans articles")
         
-        if montant_recu is None:
-            montant_recu = self.total_ttc
-        
         with transaction.atomic():
-            # Update stock for each item
-            for item in self.items.all():
+            # Totals computed once from the items already loaded
+            self.total_ht = sum(item.total_ht for item in items)
+            self.total_ttc = sum(item.total_ttc for item in items)
+            
+            if montant_recu is None:
+                montant_recu = self.total_ttc
+            
+            for item in items:
                 if item.produit.quantite_stock < item.quantite:
                     raise ValidationError(
                         f"Stock insuffisant pour {item.produit.nom}. "
                         f"Stock disponible: {item.produit.quantite_stock}"
                     )
-                
-                # Create stock movement
-                MouvementStock.create_mouvement(
-                    produit=item.produit,
-                    quantite=-item.quantite,  # Negative for sale
-                    source='vente',
-                    user=self.vendeur,
-                    reference=self.numero
-                )
             
-            # Create financial transaction if there's a payment
-            if montant_recu > 0:
-                Transaction.objects.create(
-                    type='RECETTE',
-                    montant=montant_recu,
-                    description=f"Paiement Vente {self.numero}",
-                    vente=self,
-                    utilisateur=self.vendeur
-                )
+            # Stock movements for all items in one batch (negative for sale)
+            MouvementStock.create_mouvements(
+                [(item.produit, -item.quantite) for item in items],
+                source='vente',
+                user=self.vendeur,
+                reference=self.numero
+            )
             
-            # Update payment status
-            self.montant_paye = montant_recu
-            if self.montant_paye >= self.total_ttc:
-                self.statut_paiement = 'paye'
-            elif self.montant_paye > 0:
-                self.statut_paiement = 'partiel'
-            else:
-                self.statut_paiement = 'impaye'
+            # Payment (and its financial transaction) if there's one
+            Paiement.enregistrer(
+                [(self, self.mode_paiement, Decimal(str(montant_recu)))],
+                utilisateur=self.vendeur,
+                date=timezone.now()
+            )
             
-            # Recalculate totals and save payment status
-            self.calculate_totals()
+            # Update payment status from the payment ledger
+            self.actualiser_paiement(save=False)
+            self.save(update_fields=['total_ht', 'total_ttc', 'montant_paye', 'statut_paiement'])
+    
+    def retourner(self, retours=None, utilisateur=None, motif="", mode_remboursement=None):
+        """Take back sold items; ``retours`` maps produit_id to the returned quantity.
+        
+        Without ``retours`` everything not yet returned comes back (see
+        annuler). In one transaction the sale and its items are locked, the
+        stock is restored with 'retour' movements written in one batch, the
+        totals shrink, whatever was paid above the new total is refunded
+        (negative Paiement and DEPENSE transaction) and the daily rollup is
+        adjusted by difference. Returns the refunded amount.
+        """
+        with transaction.atomic():
+            self.refresh_from_db(from_queryset=Vente.objects.select_for_update())
+            # refresh_from_db ne passe pas par from_db : état de référence recopié
+            self._etat_client = self._etat_compte()
+            items = {
+                item.produit_id: item
+                for item in self.items.select_for_update().select_related('produit')
+            }
+            if retours is None:
+                retours = {
+                    produit_id: item.quantite - item.quantite_retournee
+                    for produit_id, item in items.items()
+                    if item.quantite > item.quantite_retournee
+                }
+            
+            modifies = []
+            retournes = []
+            for produit_id, quantite in retours.items():
+                item = items.get(int(produit_id))
+                if item is None:
+                    raise ValidationError(f"Produit absent de la vente: {produit_id}")
+                if quantite <= 0:
+                    raise ValidationError("La quantité retournée doit être supérieure à 0")
+                if quantite > item.quantite - item.quantite_retournee:
+                    raise ValidationError(
+                        f"Quantité retournée supérieure à la quantité vendue pour {item.produit.nom}"
+                    )
+                montant = quantite * item.prix_unitaire
+                item.quantite_retournee += quantite
+                item.total_ht -= montant
+                item.total_ttc -= montant
+                modifies.append(item)
+                # Part retournée, pour les mouvements et les agrégats
+                retournes.append(VenteItem(
+                    vente=self, produit=item.produit, quantite=quantite, total_ht=montant, total_ttc=montant
+                ))
+            if not retournes:
+                raise ValidationError("Aucun article à retourner")
+            
+            VenteItem.objects.bulk_update(modifies, ['quantite_retournee', 'total_ht', 'total_ttc'])
+            MouvementStock.create_mouvements(
+                [(item.produit, item.quantite) for item in retournes],
+                source='retour',
+                user=utilisateur,
+                reference=self.numero,
+                motif=motif
+            )
+            VenteDailyRollup.ajouter(retournes, signe=-1, comptages=False)
+            
+            self.total_ht -= sum(item.total_ht for item in retournes)
+            self.total_ttc -= sum(item.total_ttc for item in retournes)
+            remboursement = max(self.montant_paye - self.total_ttc, Decimal('0'))
+            if remboursement:
+                Paiement.enregistrer(
+                    [(self, mode_remboursement or self.mode_paiement, -remboursement)],
+                    utilisateur=utilisateur,
+                    date=timezone.now(),
+                    libelle="Remboursement retour"
+                )
+            # Totaux client et globaux mis à jour par Vente.save
+            self.actualiser_paiement(save=False)
+            self.save(update_fields=['total_ht', 'total_ttc', 'montant_paye', 'statut_paiement'])
+        return remboursement
+    
+    def annuler(self, utilisateur=None, motif=""):
+        """Cancel the sale: return every item not returned yet."""
+        return self.retourner(None, utilisateur=utilisateur, motif=motif)
+    
+    @property
+    def est_annulee(self):
+        items = self.items.all()
+        return bool(items) and all(item.quantite_retournee >= item.quantite for item in items)
+    
+    def actualiser_paiement(self, save=True):
+        """Re-derive montant_paye and statut_paiement from the Paiement rows."""
+        self.montant_paye = self.paiements.aggregate(total=Sum('montant'))['total'] or Decimal('0')
+        if self.montant_paye >= self.total_ttc:
+            self.statut_paiement = 'paye'
+        elif self.montant_paye > 0:
+            self.statut_paiement = 'partiel'
+        else:
+            self.statut_paiement = 'impaye'
+        
+        if save:
             self.save(update_fields=['montant_paye', 'statut_paiement'])
 
 
+class Paiement(models.Model):
+    """Règlement d'une vente ; plusieurs modes possibles pour une même vente."""
+    vente = models.ForeignKey(Vente, on_delete=models.CASCADE, related_name='paiements')
+    montant = models.DecimalField(max_digits=10, decimal_places=2)
+    mode_paiement = models.CharField(max_length=20, choices=Vente.MODE_PAIEMENT_CHOICES, default='especes')
+    date = models.DateTimeField(default=timezone.now, db_index=True)
+    utilisateur = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='paiements')
+    transaction = models.ForeignKey(
+        Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='paiements'
+    )
+    
+    class Meta:
+        verbose_name = "Paiement"
+        verbose_name_plural = "Paiements"
+        ordering = ['-date']
+        indexes = [
+            # Clôture de caisse : totaux par mode sur une période
+            models.Index(fields=['date', 'mode_paiement']),
+        ]
+    
+    def __str__(self):
+        return f"{self.vente.numero} - {self.montant} FCFA ({self.get_mode_paiement_display()})"
+    
+    @classmethod
+    def enregistrer(cls, reglements, utilisateur=None, date=None, libelle="Paiement"):
+        """Create payments and their RECETTE transactions in two bulk inserts.
+        
+        ``reglements`` is a list of ``(vente, mode_paiement, montant)``; zero
+        amounts are skipped and a negative amount (refund) is recorded with
+        a DEPENSE transaction. ``date`` defaults to each sale's date. The
+        caller updates montant_paye in the same transaction (directly or
+        with Vente.actualiser_paiement).
+        """
+        reglements = [reglement for reglement in reglements if reglement[2]]
+        if not reglements:
+            return []
+        
+        # bulk_create n'appelle pas Transaction.save : champs renseignés ici
+        transactions = Transaction.objects.bulk_create([
+            Transaction(
+                type='RECETTE' if montant > 0 else 'DEPENSE',
+                categorie='vente',
+                montant=abs(montant),
+                description=f"{libelle} Vente {vente.numero}",
+                date_valeur=timezone.localdate(date or vente.date_vente),
+                vente=vente,
+                utilisateur=utilisateur
+            )
+            for vente, mode, montant in reglements
+        ])
+        return cls.objects.bulk_create([
+            cls(
+                vente=vente,
+                montant=montant,
+                mode_paiement=mode,
+                date=date or vente.date_vente,
+                utilisateur=utilisateur,
+                transaction=transaction_vente
+            )
+            for (vente, mode, montant), transaction_vente in zip(reglements, transactions)
+        ])
+    
+    @classmethod
+    def totaux_par_mode(cls, date_debut, date_fin=None, utilisateur=None):
+        """Cash-up: amount and count per payment mode, in one grouped query.
+        
+        ``date_debut``/``date_fin`` are local dates (inclusive).
+        """
+        debut = timezone.make_aware(datetime.combine(date_debut, time.min))
+        fin = timezone.make_aware(datetime.combine(date_fin or date_debut, time.min)) + timedelta(days=1)
+        paiements = cls.objects.filter(date__gte=debut, date__lt=fin)
+        if utilisateur is not None:
+            paiements = paiements.filter(utilisateur=utilisateur)
+        
+        libelles = dict(Vente.MODE_PAIEMENT_CHOICES)
+        return [
+            {
+                'mode_paiement': ligne['mode_paiement'],
+                'libelle': libelles.get(ligne['mode_paiement'], ligne['mode_paiement']),
+                'total': ligne['total'],
+                'nombre': ligne['nombre'],
+            }
+            for ligne in paiements.order_by().values('mode_paiement').annotate(
+                total=Sum('montant'), nombre=Count('pk')
+            ).order_by('mode_paiement')
+        ]
+
+
 class VenteItem(models.Model):
     vente = models.ForeignKey(Vente, on_delete=models.CASCADE, related_name='items')
     produit = models.ForeignKey(Produit, on_delete=models.CASCADE)
@@ -140,6 +554,7 @@ class VenteItem(models.Model):
     total_ht = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total_ttc = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     taux_tva = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    quantite_retournee = models.PositiveIntegerField(default=0)
     
     class Meta:
         verbose_name = "Article vendu"
@@ -172,8 +587,8 @@ class VenteItem(models.Model):
         if not self.prix_unitaire:
             self.prix_unitaire = self.produit.prix_vente
         
-        # Calculate totals (assuming no VAT for simplicity)
-        self.total_ht = self.quantite * self.prix_unitaire
+        # Calculate totals (assuming no VAT for simplicity), net of returns
+        self.total_ht = (self.quantite - self.quantite_retournee) * self.prix_unitaire
         self.total_ttc = self.total_ht
         
         super().save(*args, **kwargs)
@@ -184,4 +599,293 @@ class VenteItem(models.Model):
     
     def clean(self):
         if self.quantite > self.produit.quantite_stock:
-            raise ValidationError(f"Stock insuffisant. Disponible: {self.produit.quantite_stock}")
\ No newline at end of file
+            raise ValidationError(f"Stock insuffisant. Disponible: {self.produit.quantite_stock}")
+
+class CleIdempotence(models.Model):
+    """Clé fournie par la caisse pour qu'un même envoi ne crée qu'une vente."""
+    cle = models.CharField(max_length=100, unique=True)
+    vente = models.ForeignKey(Vente, on_delete=models.CASCADE, related_name='cles_idempotence')
+    date_creation = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = "Clé d'idempotence"
+        verbose_name_plural = "Clés d'idempotence"
+    
+    def __str__(self):
+        return f"{self.cle} -> {self.vente.numero}"
+    
+    @classmethod
+    def purger(cls, ttl=None):
+        """Delete keys older than `ttl` (a timedelta, default IDEMPOTENCE_TTL_HEURES)."""
+        from datetime import timedelta
+        from django.conf import settings
+        from django.utils import timezone
+        
+        if ttl is None:
+            ttl = timedelta(hours=getattr(settings, 'IDEMPOTENCE_TTL_HEURES', 48))
+        deleted, _ = cls.objects.filter(date_creation__lt=timezone.now() - ttl).delete()
+        return deleted
+
+
+class VenteDailyRollup(models.Model):
+    """Ventes agrégées par jour, produit, catégorie, vendeur et mode de paiement.
+    
+    Les lignes sont incrémentées dans la transaction de la caisse
+    (VenteDailyRollup.ajouter) ; les autres modifications de ventes font
+    recalculer la journée concernée (voir signals) et la commande
+    reconstruire_agregats_ventes reconstruit une période.
+    
+    lignes compte les ventes contenant le produit ; nombre_ventes n'est
+    compté que sur la ligne du plus petit produit de chaque vente, pour que
+    sa somme sur une période donne le nombre de ventes. Les retours
+    diminuent quantite et chiffre_affaires sans changer ces comptages.
+    
+    Une vente réglée en plusieurs modes est entièrement comptée sous son
+    mode principal (le plus gros règlement, voir Vente.mode_paiement) ;
+    la répartition exacte par mode se lit dans Paiement.
+    """
+    TAILLE_LOT = 300
+    
+    jour = models.DateField()
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='agregats_ventes')
+    categorie = models.ForeignKey(Categorie, on_delete=models.CASCADE, related_name='agregats_ventes')
+    vendeur = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='agregats_ventes')
+    mode_paiement = models.CharField(max_length=20, choices=Vente.MODE_PAIEMENT_CHOICES)
+    quantite = models.IntegerField(default=0)
+    chiffre_affaires = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    lignes = models.IntegerField(default=0)
+    nombre_ventes = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Agrégat journalier des ventes"
+        verbose_name_plural = "Agrégats journaliers des ventes"
+        ordering = ['-jour']
+        constraints = [
+            # L'index unique sert aussi les filtres par période (jour en tête)
+            models.UniqueConstraint(
+                fields=['jour', 'produit', 'categorie', 'vendeur', 'mode_paiement'],
+                name='vente_rollup_cle_unique',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.jour} - {self.produit_id} : {self.chiffre_affaires} FCFA"
+    
+    @classmethod
+    def contributions(cls, items, signe=1, comptages=True):
+        """Deltas per rollup key for VenteItems whose ``vente`` and ``produit`` are loaded.
+        
+        All the items of a sale must be passed together (nombre_ventes goes
+        to its smallest product). With ``comptages=False`` only quantities
+        and amounts change (returns).
+        """
+        premiers = {}
+        for item in items:
+            premiers[item.vente_id] = min(premiers.get(item.vente_id, item.produit_id), item.produit_id)
+        
+        deltas = {}
+        for item in items:
+            jour, vendeur_id, mode = item.vente.etat_agregat()
+            cle = (jour, item.produit_id, item.produit.categorie_id, vendeur_id, mode)
+            quantite, ca, lignes, nombre = deltas.get(cle, (0, Decimal('0'), 0, 0))
+            compte = signe if comptages else 0
+            deltas[cle] = (
+                quantite + signe * (item.quantite - item.quantite_retournee),
+                ca + signe * item.total_ttc,
+                lignes + compte,
+                nombre + (compte if premiers[item.vente_id] == item.produit_id else 0),
+            )
+        return deltas
+    
+    @classmethod
+    def ajouter(cls, items, signe=1, comptages=True):
+        """Add (or with ``signe=-1`` remove) sale items with F() updates.
+        
+        Per chunk of TAILLE_LOT keys: one SELECT of the existing rows, one
+        INSERT of the missing ones (ignore_conflicts, a concurrent till may
+        create them first) and one UPDATE adding every delta through
+        Case/When, so the checkout keeps a fixed number of queries whatever
+        the number of lines. The caller runs this inside the transaction
+        that writes the items.
+        """
+        deltas = list(cls.contributions(items, signe, comptages).items())
+        for debut in range(0, len(deltas), cls.TAILLE_LOT):
+            lot = dict(deltas[debut:debut + cls.TAILLE_LOT])
+            lignes = cls._lignes(lot)
+            manquantes = [cle for cle in lot if cle not in lignes]
+            if manquantes:
+                cls.objects.bulk_create([
+                    cls(jour=jour, produit_id=produit_id, categorie_id=categorie_id,
+                        vendeur_id=vendeur_id, mode_paiement=mode)
+                    for jour, produit_id, categorie_id, vendeur_id, mode in manquantes
+                ], ignore_conflicts=True)
+                lignes.update(cls._lignes(manquantes))
+            
+            def increment(champ, position, output_field):
+                return F(champ) + Case(
+                    *[When(pk=lignes[cle], then=Value(valeurs[position])) for cle, valeurs in lot.items()],
+                    default=Value(0),
+                    output_field=output_field,
+                )
+            
+            cls.objects.filter(pk__in=lignes.values()).update(
+                quantite=increment('quantite', 0, models.IntegerField()),
+                chiffre_affaires=increment('chiffre_affaires', 1, models.DecimalField(max_digits=14, decimal_places=2)),
+                lignes=increment('lignes', 2, models.IntegerField()),
+                nombre_ventes=increment('nombre_ventes', 3, models.IntegerField()),
+            )
+    
+    @classmethod
+    def _lignes(cls, cles):
+        """{key: pk} of the existing rows among ``cles`` (one query)."""
+        cles = set(cles)
+        existantes = cls.objects.filter(
+            jour__in={cle[0] for cle in cles}, produit_id__in={cle[1] for cle in cles}
+        ).values_list('pk', 'jour', 'produit_id', 'categorie_id', 'vendeur_id', 'mode_paiement')
+        return {tuple(ligne[1:]): ligne[0] for ligne in existantes if tuple(ligne[1:]) in cles}
+    
+    @classmethod
+    def recalculer(cls, debut=None, fin=None):
+        """Rebuild the rows of the local dates ``debut``..``fin`` (inclusive) from the sale items.
+        
+        Without bounds the whole history is rebuilt. Returns the number of rows.
+        """
+        items = VenteItem.objects.all()
+        lignes = cls.objects.all()
+        if debut is not None:
+            items = items.filter(vente__date_vente__gte=timezone.make_aware(datetime.combine(debut, time.min)))
+            lignes = lignes.filter(jour__gte=debut)
+        if fin is not None:
+            items = items.filter(
+                vente__date_vente__lt=timezone.make_aware(datetime.combine(fin, time.min)) + timedelta(days=1)
+            )
+            lignes = lignes.filter(jour__lte=fin)
+        
+        premier = ~Exists(VenteItem.objects.filter(vente=OuterRef('vente'), produit_id__lt=OuterRef('produit_id')))
+        agregats = items.annotate(jour=TruncDate('vente__date_vente')).order_by().values(
+            'jour', 'produit', 'produit__categorie', 'vente__vendeur', 'vente__mode_paiement'
+        ).annotate(
+            total_quantite=Sum(F('quantite') - F('quantite_retournee')),
+            total_ca=Sum('total_ttc'),
+            total_lignes=Count('pk'),
+            total_ventes=Count('pk', filter=premier),
+        )
+        
+        with transaction.atomic():
+            lignes.delete()
+            return len(cls.objects.bulk_create([
+                cls(
+                    jour=agregat['jour'],
+                    produit_id=agregat['produit'],
+                    categorie_id=agregat['produit__categorie'],
+                    vendeur_id=agregat['vente__vendeur'],
+                    mode_paiement=agregat['vente__mode_paiement'],
+                    quantite=agregat['total_quantite'],
+                    chiffre_affaires=agregat['total_ca'],
+                    lignes=agregat['total_lignes'],
+                    nombre_ventes=agregat['total_ventes'],
+                )
+                for agregat in agregats.iterator()
+            ], batch_size=1000))
+    
+    @classmethod
+    def periode(cls, debut, fin=None):
+        """Rows of the local dates ``debut``..``fin`` (inclusive, ``fin`` defaults to debut)."""
+        return cls.objects.filter(jour__gte=debut, jour__lte=fin or debut)
+    
+    @classmethod
+    def totaux(cls, debut, fin=None):
+        """CA, number of sales, quantity and item lines over a period, in one aggregate."""
+        resultat = cls.periode(debut, fin).aggregate(
+            ca=Sum('chiffre_affaires'),
+            nombre_ventes=Sum('nombre_ventes'),
+            quantite=Sum('quantite'),
+            lignes=Sum('lignes'),
+        )
+        return {
+            'ca': resultat['ca'] or Decimal('0'),
+            'nombre_ventes': resultat['nombre_ventes'] or 0,
+            'quantite': resultat['quantite'] or 0,
+            'lignes': resultat['lignes'] or 0,
+        }
+    
+    @classmethod
+    def par_jour(cls, debut, fin=None):
+        """{jour: {'ca', 'nombre_ventes'}} for the days of the period that had sales."""
+        return {
+            ligne['jour']: {'ca': ligne['ca'], 'nombre_ventes': ligne['nombre_ventes']}
+            for ligne in cls.periode(debut, fin).order_by().values('jour').annotate(
+                ca=Sum('chiffre_affaires'), nombre_ventes=Sum('nombre_ventes')
+            )
+        }
+
+
+class TotauxVentes(models.Model):
+    """Totaux cumulés de toutes les ventes, sur une seule ligne (pk=1).
+    
+    Mis à jour par différence dans la transaction de chaque vente (voir
+    Vente.save) ; TotauxVentes.recalculer les reconstruit.
+    """
+    nombre_ventes = models.BigIntegerField(default=0)
+    chiffre_affaires = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name = "Totaux des ventes"
+        verbose_name_plural = "Totaux des ventes"
+    
+    def __str__(self):
+        return f"{self.nombre_ventes} ventes - {self.chiffre_affaires} FCFA"
+    
+    @staticmethod
+    def variation(avant, apres):
+        """(nombre, ca) delta between two Vente._etat_compte states (None = no sale)."""
+        nombre = (apres is not None) - (avant is not None)
+        ca = (apres[1] if apres else Decimal('0')) - (avant[1] if avant else Decimal('0'))
+        return nombre, ca
+    
+    @classmethod
+    def ajouter(cls, nombre, ca):
+        """Apply a delta with an F() update; rebuild the row if it is missing."""
+        if not nombre and not ca:
+            return
+        if not cls.objects.filter(pk=1).update(
+            nombre_ventes=F('nombre_ventes') + nombre,
+            chiffre_affaires=F('chiffre_affaires') + ca,
+        ):
+            # Les ventes en cours sont déjà en base : elles sont comptées
+            cls.recalculer()
+    
+    @classmethod
+    def recalculer(cls):
+        """Rebuild the totals from the Vente table."""
+        resultat = Vente.objects.aggregate(nombre=Count('pk'), ca=Sum('total_ttc'))
+        totaux, _ = cls.objects.update_or_create(pk=1, defaults={
+            'nombre_ventes': resultat['nombre'],
+            'chiffre_affaires': resultat['ca'] or Decimal('0'),
+        })
+        return totaux
+    
+    @classmethod
+    def lire(cls):
+        totaux = cls.objects.filter(pk=1).first()
+        return totaux if totaux is not None else cls.recalculer()
+
+
+class TicketVente(models.Model):
+    """Ticket de caisse rendu une seule fois (HTML et texte pour imprimante thermique).
+    
+    Supprimé quand la vente ou ses articles changent (voir signals) ; il est
+    alors rendu de nouveau au prochain affichage (voir tickets.py).
+    """
+    numero = models.CharField(max_length=20, unique=True)
+    vente = models.OneToOneField(Vente, on_delete=models.CASCADE, related_name='ticket')
+    html = models.TextField()
+    texte = models.TextField()
+    date_creation = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Ticket de caisse"
+        verbose_name_plural = "Tickets de caisse"
+    
+    def __str__(self):
+        return f"Ticket {self.numero}"
@@ -10,6 +10,18 @@ class VenteItemSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class VenteListSerializer(serializers.ModelSerializer):
+    """Lightweight representation for list pages (no items)."""
+    vendeur_nom = serializers.CharField(source='vendeur.get_full_name', read_only=True)
+    
+    class Meta:
+        model = Vente
+        fields = [
+            'id', 'numero', 'date_vente', 'client', 'telephone_client', 'total_ttc',
+            'montant_paye', 'statut_paiement', 'mode_paiement', 'vendeur', 'vendeur_nom',
+        ]
+
+
 class VenteSerializer(serializers.ModelSerializer):
     items = VenteItemSerializer(many=True, read_only=True)
     vendeur_nom = serializers.CharField(source='vendeur.get_full_name', read_only=True)
@@ -0,0 +1,573 @@
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction, IntegrityError
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.produits.models import Produit
+from apps.stock.models import MouvementStock
+from apps.dashboard.models import Notification
+from .models import Client, Paiement, TotauxVentes, Vente, VenteDailyRollup, VenteItem, CleIdempotence
+
+User = get_user_model()
+
+
+def _decimal(valeur):
+    """Convert a JSON number (often a float) to Decimal without float noise."""
+    return Decimal(str(valeur))
+
+
+def statut_pour(total_ttc, montant_paye):
+    """Return the payment status matching an amount paid."""
+    if montant_paye >= total_ttc:
+        return 'paye'
+    if montant_paye > 0:
+        return 'partiel'
+    return 'impaye'
+
+
+def vente_pour_cle(cle):
+    """Return the sale already recorded under an idempotency key, if any."""
+    return Vente.objects.filter(cles_idempotence__cle=cle).first()
+
+
+def _lire_panier(items):
+    """Validate a posted cart and return a list of (produit_id, quantite, item_data)."""
+    if not items:
+        raise ValidationError("Impossible de finaliser une vente sans articles")
+
+    lignes = []
+    produit_ids = set()
+    for item_data in items:
+        try:
+            produit_id = int(item_data['produit_id'])
+            quantite = int(item_data['quantite'])
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError("Article invalide dans le panier")
+        if quantite <= 0:
+            raise ValidationError("La quantité doit être supérieure à 0")
+        if produit_id in produit_ids:
+            raise ValidationError("Un produit ne peut apparaître qu'une fois dans le panier")
+        produit_ids.add(produit_id)
+        lignes.append((produit_id, quantite, item_data))
+    return lignes
+
+
+def _construire_items(lignes, produits):
+    """Build unsaved VenteItems from parsed cart lines; return (items, total)."""
+    vente_items = []
+    total = Decimal('0')
+    for produit_id, quantite, item_data in lignes:
+        produit = produits[produit_id]
+
+        prix_unitaire = item_data.get('prix_unitaire')
+        prix_unitaire = _decimal(prix_unitaire) if prix_unitaire else produit.prix_vente
+        prix_original = item_data.get('prix_original')
+        prix_original = _decimal(prix_original) if prix_original else produit.prix_vente
+
+        ligne_total = quantite * prix_unitaire
+        total += ligne_total
+        vente_items.append(VenteItem(
+            produit=produit,
+            quantite=quantite,
+            prix_unitaire=prix_unitaire,
+            prix_original=prix_original,
+            total_ht=ligne_total,
+            total_ttc=ligne_total,
+        ))
+    return vente_items, total
+
+
+def enregistrer_vente(vendeur, items, client='', telephone='', mode_paiement='especes',
+                      montant_paye=None, cle_idempotence=None, date_vente=None, paiements=None):
+    """Record a complete till sale in a constant number of queries.
+
+    ``items`` is the cart as posted by the caisse: a list of dicts with
+    ``produit_id``, ``quantite``, ``prix_unitaire`` and optionally
+    ``prix_original``. Products are loaded in one query, items, stock
+    movements, payments and their RECETTE transactions are written in bulk
+    inside a single atomic block.
+
+    ``paiements`` splits the payment over several modes (a list of dicts
+    with ``mode_paiement`` and ``montant``); otherwise ``montant_paye``
+    (default: the total) is paid with ``mode_paiement``.
+
+    When ``cle_idempotence`` is given and a sale was already recorded under
+    that key (a till retrying after a timeout), the original sale is
+    returned and nothing else is written. ``date_vente`` backdates a sale
+    made while the till was offline.
+    """
+    if cle_idempotence:
+        if len(cle_idempotence) > CleIdempotence._meta.get_field('cle').max_length:
+            raise ValidationError("Clé d'idempotence trop longue")
+        vente = vente_pour_cle(cle_idempotence)
+        if vente:
+            return vente
+        try:
+            return _enregistrer_vente(vendeur, items, client, telephone, mode_paiement,
+                                      montant_paye, cle_idempotence, date_vente, paiements)
+        except IntegrityError:
+            # Envoi concurrent avec la même clé : l'autre requête a gagné
+            vente = vente_pour_cle(cle_idempotence)
+            if vente is None:
+                raise
+            return vente
+
+    return _enregistrer_vente(vendeur, items, client, telephone, mode_paiement, montant_paye,
+                              date_vente=date_vente, paiements=paiements)
+
+
+def _enregistrer_vente(vendeur, items, client, telephone, mode_paiement, montant_paye,
+                       cle_idempotence=None, date_vente=None, paiements=None):
+    lignes = _lire_panier(items)
+    # Numéro alloué dans sa propre transaction courte, avant l'encaissement :
+    # la ligne du compteur n'est pas verrouillée pendant toute la vente
+    numero = Vente.allouer_numeros(timezone.localdate(date_vente))[0]
+
+    with transaction.atomic():
+        produits = Produit.objects.select_for_update().in_bulk([ligne[0] for ligne in lignes])
+
+        for produit_id, quantite, item_data in lignes:
+            produit = produits.get(produit_id)
+            if produit is None:
+                raise ValidationError(f"Produit introuvable: {produit_id}")
+            if produit.quantite_stock < quantite:
+                raise ValidationError(
+                    f"Stock insuffisant pour {produit.nom}. "
+                    f"Stock disponible: {produit.quantite_stock}"
+                )
+
+        vente_items, total_ht = _construire_items(lignes, produits)
+
+        # Pas de TVA pour l'instant : TTC = HT
+        total_ttc = total_ht
+        reglements = _lire_reglements(paiements, montant_paye, mode_paiement, total_ttc)
+        montant_paye = sum((montant for _, montant in reglements), Decimal('0'))
+
+        vente = Vente.objects.create(
+            numero=numero,
+            client=client,
+            telephone_client=telephone,
+            mode_paiement=_mode_principal(reglements, mode_paiement),
+            vendeur=vendeur,
+            total_ht=total_ht,
+            total_ttc=total_ttc,
+            montant_paye=montant_paye,
+            statut_paiement=statut_pour(total_ttc, montant_paye),
+        )
+        if date_vente:
+            # date_vente est auto_now_add : on la corrige après coup
+            Vente.objects.filter(pk=vente.pk).update(date_vente=date_vente)
+            vente.date_vente = date_vente
+
+        if cle_idempotence:
+            CleIdempotence.objects.create(cle=cle_idempotence, vente=vente)
+
+        for vente_item in vente_items:
+            vente_item.vente = vente
+        VenteItem.objects.bulk_create(vente_items)
+        # bulk_create n'envoie pas post_save : agrégats journaliers incrémentés ici
+        VenteDailyRollup.ajouter(vente_items)
+
+        try:
+            MouvementStock.create_mouvements(
+                [(item.produit, -item.quantite) for item in vente_items],
+                source='vente',
+                user=vendeur,
+                reference=vente.numero
+            )
+        except ValueError as e:
+            raise ValidationError(str(e))
+
+        Paiement.enregistrer(
+            [(vente, mode, montant) for mode, montant in reglements],
+            utilisateur=vendeur
+        )
+
+    return vente
+
+
+def _lire_reglements(paiements, montant_paye, mode_paiement, total):
+    """Tenders of a sale as ``[(mode, Decimal)]``, zero amounts dropped.
+
+    Raises ValidationError (or InvalidOperation for a bad amount).
+    """
+    if paiements:
+        if not isinstance(paiements, list):
+            raise ValidationError("Paiements invalides")
+        modes = dict(Vente.MODE_PAIEMENT_CHOICES)
+        reglements = []
+        for paiement in paiements:
+            if not isinstance(paiement, dict):
+                raise ValidationError("Paiements invalides")
+            mode = paiement.get('mode_paiement', mode_paiement)
+            if mode not in modes:
+                raise ValidationError(f"Mode de paiement invalide: {mode}")
+            montant = _decimal(paiement.get('montant', 0))
+            if montant < 0:
+                raise ValidationError("Montant de paiement négatif")
+            if montant:
+                reglements.append((mode, montant))
+        return reglements
+
+    montant = total if montant_paye is None else _decimal(montant_paye)
+    return [(mode_paiement, montant)] if montant > 0 else []
+
+
+def _mode_principal(reglements, mode_paiement):
+    """Mode recorded on the sale itself: the largest tender.
+
+    The daily rollup books the whole revenue of a split-tender sale under
+    this mode; the per-mode amounts stay in the Paiement ledger.
+    """
+    if not reglements:
+        return mode_paiement
+    return max(reglements, key=lambda reglement: reglement[1])[0]
+
+
+def enregistrer_paiement(vente, paiements, utilisateur):
+    """Record later payments of a sale, possibly over several modes.
+
+    The sale row is locked, the payments and their transactions are
+    inserted, then montant_paye/statut_paiement are re-derived from the
+    payment ledger, all in one transaction.
+    """
+    reglements = _lire_reglements(paiements, None, vente.mode_paiement, Decimal('0'))
+    if not reglements:
+        raise ValidationError("Le montant doit être supérieur à 0")
+
+    with transaction.atomic():
+        vente = Vente.objects.select_for_update().get(pk=vente.pk)
+        Paiement.enregistrer(
+            [(vente, mode, montant) for mode, montant in reglements],
+            utilisateur=utilisateur,
+            date=timezone.now(),
+            libelle="Complément paiement"
+        )
+        vente.actualiser_paiement()
+    return vente
+
+
+def regler_dettes(montant, utilisateur, mode_paiement='especes', client=None, ventes=None):
+    """Settle several unpaid sales with one amount, oldest sale first.
+
+    The sales are those of ``client`` or the ids in ``ventes``. Inside one
+    transaction the sale rows are locked, payments and transactions are
+    bulk-inserted and the sales are updated with a single bulk_update.
+    Returns ``(ventes réglées, montant non affecté)``; the unallocated part
+    (amount above the debt) is not recorded.
+    """
+    montant = _decimal(montant)
+    if montant <= 0:
+        raise ValidationError("Le montant doit être supérieur à 0")
+    if mode_paiement not in dict(Vente.MODE_PAIEMENT_CHOICES):
+        raise ValidationError(f"Mode de paiement invalide: {mode_paiement}")
+    if client is None and not ventes:
+        raise ValidationError("Indiquez un client ou des ventes à régler")
+
+    with transaction.atomic():
+        dettes = Vente.objects.select_for_update().filter(statut_paiement__in=Vente.STATUTS_IMPAYES)
+        if client is not None:
+            dettes = dettes.filter(compte_client=client)
+        if ventes:
+            dettes = dettes.filter(pk__in=ventes)
+        dettes = list(dettes.order_by('date_vente', 'pk'))
+        if not dettes:
+            raise ValidationError("Aucune dette à régler")
+
+        restant = montant
+        reglees = []
+        reglements = []
+        variations = {}
+        for vente in dettes:
+            part = min(vente.reste_a_payer, restant)
+            if part <= 0:
+                break
+            avant = (vente.compte_client_id, vente.total_ttc, vente.montant_paye)
+            vente.montant_paye += part
+            vente.statut_paiement = statut_pour(vente.total_ttc, vente.montant_paye)
+            # bulk_update n'appelle pas Vente.save : totaux client appliqués ici
+            Client.variations(avant, (vente.compte_client_id, vente.total_ttc, vente.montant_paye), variations)
+            reglements.append((vente, mode_paiement, part))
+            reglees.append(vente)
+            restant -= part
+
+        Paiement.enregistrer(reglements, utilisateur=utilisateur, date=timezone.now(), libelle="Règlement")
+        Vente.objects.bulk_update(reglees, ['montant_paye', 'statut_paiement'])
+        Client.appliquer(variations)
+
+    return reglees, restant
+
+
+def synchroniser_ventes(vendeur, ventes, taille_lot=None):
+    """Record a batch of sales made offline by a till.
+
+    Each entry of ``ventes`` is a cart as posted by the caisse plus an
+    ``idempotency_key`` and the ISO ``date`` of the sale. Keys already known
+    are answered from the key table, stock is checked for the whole batch
+    in one pass (oldest sale first), then accepted sales are written in
+    bulk, ``taille_lot`` sales per transaction. Returns one result dict per
+    entry, in input order.
+    """
+    taille_lot = taille_lot or getattr(settings, 'SYNC_TAILLE_LOT', 100)
+    resultats = [None] * len(ventes)
+
+    cles = [str(data['idempotency_key']) if data.get('idempotency_key') else None for data in ventes]
+    existantes = {
+        cle: (vente_id, numero)
+        for cle, vente_id, numero in CleIdempotence.objects.filter(
+            cle__in=[cle for cle in cles if cle]
+        ).values_list('cle', 'vente_id', 'vente__numero')
+    }
+
+    # 1. Lecture et validation des paniers
+    a_creer = []
+    doublons = []
+    vues = {}
+    for index, data in enumerate(ventes):
+        cle = cles[index]
+        if not cle:
+            resultats[index] = {'success': False, 'error': "Clé d'idempotence manquante"}
+            continue
+        resultats[index] = {'idempotency_key': cle}
+        if cle in existantes:
+            vente_id, numero = existantes[cle]
+            resultats[index].update(success=True, vente_id=vente_id, numero=numero, deja_synchronisee=True)
+            continue
+        if cle in vues:
+            doublons.append((index, vues[cle]))
+            continue
+        vues[cle] = index
+
+        try:
+            if len(cle) > CleIdempotence._meta.get_field('cle').max_length:
+                raise ValidationError("Clé d'idempotence trop longue")
+            lignes = _lire_panier(data.get('items'))
+            date_vente = parse_datetime(data['date']) if data.get('date') else timezone.now()
+            if date_vente is None:
+                raise ValidationError("Date invalide")
+            if timezone.is_naive(date_vente):
+                date_vente = timezone.make_aware(date_vente)
+            _lire_reglements(data.get('paiements'), data.get('montant_paye'), 'especes', Decimal('0'))
+        except InvalidOperation:
+            resultats[index].update(success=False, error="Montant payé invalide")
+            continue
+        except (ValidationError, ValueError, TypeError) as e:
+            message = e.messages[0] if isinstance(e, ValidationError) else str(e)
+            resultats[index].update(success=False, error=message)
+            continue
+        a_creer.append((index, data, cle, date_vente, lignes))
+
+    # 2. Contrôle du stock pour tout le lot en une passe
+    produits = Produit.objects.in_bulk({
+        produit_id for _, _, _, _, lignes in a_creer for produit_id, _, _ in lignes
+    })
+    restant = {pk: produit.quantite_stock for pk, produit in produits.items()}
+    acceptees = []
+    for entree in sorted(a_creer, key=lambda entree: entree[3]):
+        index, _, _, _, lignes = entree
+        erreur = None
+        for produit_id, quantite, _ in lignes:
+            if produit_id not in produits:
+                erreur = f"Produit introuvable: {produit_id}"
+            elif restant[produit_id] < quantite:
+                erreur = (
+                    f"Stock insuffisant pour {produits[produit_id].nom}. "
+                    f"Stock disponible: {restant[produit_id]}"
+                )
+            if erreur:
+                break
+        if erreur:
+            resultats[index].update(success=False, error=erreur)
+            continue
+        for produit_id, quantite, _ in lignes:
+            restant[produit_id] -= quantite
+        acceptees.append(entree)
+
+    # 3. Écriture par lots
+    for debut in range(0, len(acceptees), taille_lot):
+        lot = acceptees[debut:debut + taille_lot]
+        try:
+            numeros = _numeroter_lot(lot)
+            with transaction.atomic():
+                creees = _creer_lot(vendeur, lot, produits, numeros)
+        except (IntegrityError, ValueError, Produit.DoesNotExist):
+            # Stock modifié par une autre caisse, produit supprimé entre-temps ou
+            # clé envoyée en parallèle : on repasse vente par vente pour isoler les erreurs.
+            creees = []
+            for index, data, cle, date_vente, _ in lot:
+                try:
+                    vente = enregistrer_vente(
+                        vendeur=vendeur,
+                        items=data.get('items'),
+                        client=data.get('client', ''),
+                        telephone=data.get('telephone', ''),
+                        mode_paiement=data.get('mode_paiement', 'especes'),
+                        montant_paye=data.get('montant_paye'),
+                        cle_idempotence=cle,
+                        date_vente=date_vente,
+                        paiements=data.get('paiements')
+                    )
+                    creees.append((index, vente))
+                except ValidationError as e:
+                    resultats[index].update(success=False, error=e.messages[0])
+                except (IntegrityError, ValueError, Produit.DoesNotExist) as e:
+                    # Les lots précédents sont déjà écrits : l'échec est rapporté pour
+                    # cette vente seulement, la caisse pourra la renvoyer
+                    resultats[index].update(success=False, error=str(e))
+            produits = Produit.objects.in_bulk(produits.keys())
+
+        for index, vente in creees:
+            resultats[index].update(success=True, vente_id=vente.pk, numero=vente.numero)
+
+    for index, original in doublons:
+        resultats[index].update({k: v for k, v in resultats[original].items() if k != 'idempotency_key'})
+
+    nb_creees = sum(1 for r in resultats if r.get('success') and 'deja_synchronisee' not in r)
+    if nb_creees:
+        _notifier_synchronisation(vendeur, nb_creees)
+
+    return resultats
+
+
+def _numeroter_lot(lot):
+    """Allocate the numbers of a chunk of offline sales, one block per sale day."""
+    par_jour = {}
+    for entree in lot:
+        par_jour.setdefault(timezone.localdate(entree[3]), []).append(entree)
+    numeros = {}
+    for jour, entrees in par_jour.items():
+        for entree, numero in zip(entrees, Vente.allouer_numeros(jour, len(entrees))):
+            numeros[entree[0]] = numero
+    return numeros
+
+
+def _creer_lot(vendeur, lot, produits, numeros):
+    """Write a chunk of validated offline sales with bulk queries."""
+    # bulk_create n'appelle pas Vente.save : clients résolus pour tout le lot
+    clients = Client.pour_lot([(data.get('client', ''), data.get('telephone', '')) for _, data, *_ in lot])
+
+    ventes = []
+    items_par_vente = []
+    reglements_par_vente = []
+    for index, data, cle, date_vente, lignes in lot:
+        vente_items, total = _construire_items(lignes, produits)
+        mode_paiement = data.get('mode_paiement', 'especes')
+        reglements = _lire_reglements(data.get('paiements'), data.get('montant_paye'), mode_paiement, total)
+        montant_paye = sum((montant for _, montant in reglements), Decimal('0'))
+        ventes.append(Vente(
+            numero=numeros[index],
+            client=data.get('client', ''),
+            telephone_client=data.get('telephone', ''),
+            compte_client=clients.get(Client.cle_pour(data.get('client', ''), data.get('telephone', ''))),
+            mode_paiement=_mode_principal(reglements, mode_paiement),
+            vendeur=vendeur,
+            total_ht=total,
+            total_ttc=total,
+            montant_paye=montant_paye,
+            statut_paiement=statut_pour(total, montant_paye),
+        ))
+        items_par_vente.append(vente_items)
+        reglements_par_vente.append(reglements)
+
+    ventes = Vente.objects.bulk_create(ventes)
+    variations = {}
+    for vente in ventes:
+        Client.variations(None, (vente.compte_client_id, vente.total_ttc, vente.montant_paye), variations)
+    Client.appliquer(variations)
+    TotauxVentes.ajouter(len(ventes), sum((vente.total_ttc for vente in ventes), Decimal('0')))
+
+    # date_vente est auto_now_add : on remet l'heure réelle de la vente
+    for vente, (_, _, _, date_vente, _) in zip(ventes, lot):
+        vente.date_vente = date_vente
+    Vente.objects.bulk_update(ventes, ['date_vente'])
+
+    CleIdempotence.objects.bulk_create([
+        CleIdempotence(cle=cle, vente=vente) for vente, (_, _, cle, _, _) in zip(ventes, lot)
+    ])
+
+    vente_items = []
+    for vente, items in zip(ventes, items_par_vente):
+        for item in items:
+            item.vente = vente
+            vente_items.append(item)
+    VenteItem.objects.bulk_create(vente_items)
+    VenteDailyRollup.ajouter(vente_items)
+
+    MouvementStock.create_mouvements(
+        [(item.produit, -item.quantite, item.vente.numero) for item in vente_items],
+        source='vente',
+        user=vendeur
+    )
+
+    Paiement.enregistrer(
+        [
+            (vente, mode, montant)
+            for vente, reglements in zip(ventes, reglements_par_vente)
+            for mode, montant in reglements
+        ],
+        utilisateur=vendeur
+    )
+
+    return [(entree[0], vente) for entree, vente in zip(lot, ventes)]
+
+
+def _notifier_synchronisation(vendeur, nombre):
+    """One notification per synced batch instead of one per sale."""
+    admins = User.objects.filter(role__in=['admin', 'manager'])
+    Notification.objects.bulk_create([
+        Notification(
+            titre="Ventes synchronisées",
+            message=f"{nombre} vente(s) hors ligne synchronisée(s) par "
+                    f"{vendeur.get_full_name() or vendeur.username}",
+            type="success",
+            utilisateur=admin,
+            url="/ventes/"
+        )
+        for admin in admins
+    ])
+
+
+# Tranches d'ancienneté des créances : (clé, âge minimal, âge maximal inclus) en jours
+TRANCHES_CREANCES = [
+    ('0_30', 0, 30),
+    ('31_60', 31, 60),
+    ('61_90', 61, 90),
+    ('90_plus', 91, None),
+]
+
+
+def creances(queryset=None, maintenant=None):
+    """Outstanding customer debt, total and by age, in a single aggregate.
+
+    Returns ``{'total', 'nombre', 'tranches': {cle: montant}}`` where the
+    age of a sale is the number of whole days since ``date_vente``.
+    """
+    maintenant = maintenant or timezone.now()
+    if queryset is None:
+        queryset = Vente.objects.all()
+    queryset = queryset.filter(statut_paiement__in=Vente.STATUTS_IMPAYES).order_by()
+
+    reste = F('total_ttc') - F('montant_paye')
+    agregats = {'total': Sum(reste), 'nombre': Count('pk')}
+    for cle, age_min, age_max in TRANCHES_CREANCES:
+        condition = Q()
+        if age_min:
+            condition &= Q(date_vente__lte=maintenant - timedelta(days=age_min))
+        if age_max is not None:
+            condition &= Q(date_vente__gt=maintenant - timedelta(days=age_max + 1))
+        agregats[cle] = Sum(reste, filter=condition)
+
+    resultat = queryset.aggregate(**agregats)
+    return {
+        'total': resultat['total'] or Decimal('0'),
+        'nombre': resultat['nombre'],
+        'tranches': {
+            cle: resultat[cle] or Decimal('0') for cle, *_ in TRANCHES_CREANCES
+        },
+    }
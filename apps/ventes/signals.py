@@ -0,0 +1,84 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Client, TicketVente, TotauxVentes, Vente, VenteDailyRollup, VenteItem
+
+# Journées d'agrégats à recalculer au commit, une seule fois par journée
+_a_recalculer = threading.local()
+
+# Champs de la vente imprimés sur le ticket de caisse
+CHAMPS_TICKET = {
+    'numero', 'client', 'telephone_client', 'total_ht', 'total_ttc', 'mode_paiement',
+    'vendeur', 'vendeur_id', 'date_vente', 'note',
+}
+
+
+def recalculer_agregats_apres_commit(jour):
+    """Rebuild the rollup rows of ``jour`` once the current transaction commits."""
+    jours = getattr(_a_recalculer, 'jours', None)
+    if jours is None:
+        jours = _a_recalculer.jours = set()
+    jours.add(jour)
+    transaction.on_commit(lambda: _recalculer_jour(jour))
+
+
+def _recalculer_jour(jour):
+    if jour in _a_recalculer.jours:
+        _a_recalculer.jours.discard(jour)
+        VenteDailyRollup.recalculer(jour, jour)
+
+
+@receiver(post_delete, sender=Vente)
+def retirer_vente_du_client(sender, instance, **kwargs):
+    """Remove a deleted sale from its client's and the global running totals."""
+    etat = getattr(instance, '_etat_client', None) or instance._etat_compte()
+    Client.appliquer(Client.variations(etat, None))
+    if etat is not None:
+        TotauxVentes.ajouter(*TotauxVentes.variation(etat, None))
+
+
+@receiver(post_save, sender=Vente)
+def suivre_cle_agregat(sender, instance, created, update_fields=None, **kwargs):
+    """Rebuild the rollup days of a sale moved to another day, seller or payment mode."""
+    avant = getattr(instance, '_etat_agregat', None)
+    if update_fields is not None and not {'date_vente', 'vendeur', 'vendeur_id', 'mode_paiement'} & set(update_fields):
+        return
+    apres = instance.etat_agregat()
+    if not created and avant is not None and apres is not None and apres != avant:
+        recalculer_agregats_apres_commit(avant[0])
+        recalculer_agregats_apres_commit(apres[0])
+    instance._etat_agregat = apres
+
+
+@receiver(post_save, sender=Vente)
+def invalider_ticket(sender, instance, created, update_fields=None, **kwargs):
+    """Drop the stored ticket of a sale whose printed fields changed."""
+    if not created and (update_fields is None or CHAMPS_TICKET & set(update_fields)):
+        TicketVente.objects.filter(vente=instance).delete()
+
+
+@receiver(post_delete, sender=Vente)
+def retirer_vente_des_agregats(sender, instance, **kwargs):
+    recalculer_agregats_apres_commit(timezone.localdate(instance.date_vente))
+
+
+@receiver(post_save, sender=VenteItem)
+@receiver(post_delete, sender=VenteItem)
+def suivre_article_agregats(sender, instance, **kwargs):
+    """Items saved or deleted outside the checkout: rebuild the day of their sale
+    and drop its stored ticket.
+
+    The checkout and the offline sync bulk-insert their items and update the
+    rollup themselves (VenteDailyRollup.ajouter).
+    """
+    if VenteItem.vente.is_cached(instance):
+        date_vente = instance.vente.date_vente
+    else:
+        date_vente = Vente.objects.filter(pk=instance.vente_id).values_list('date_vente', flat=True).first()
+    if date_vente is not None:
+        recalculer_agregats_apres_commit(timezone.localdate(date_vente))
+    TicketVente.objects.filter(vente_id=instance.vente_id).delete()
@@ -0,0 +1,120 @@
+"""Receipts rendered once and kept as TicketVente rows.
+
+A ticket is rendered from ``ventes/ticket_contenu.html`` (HTML) and as a
+fixed-width text layout for thermal printers the first time it is shown,
+then served from the stored row. Several tickets are loaded, and the
+missing ones rendered, with a constant number of queries.
+"""
+import textwrap
+
+from django.conf import settings
+from django.contrib.humanize.templatetags.humanize import intcomma
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import TicketVente, Vente, VenteItem
+
+
+def ventes_a_imprimer(queryset=None):
+    """Sales with everything a ticket shows (seller, items, products) in three queries."""
+    if queryset is None:
+        queryset = Vente.objects.all()
+    return queryset.select_related('vendeur').prefetch_related(
+        Prefetch('items', queryset=VenteItem.objects.select_related('produit').order_by('pk'))
+    )
+
+
+def _montant(valeur):
+    return f"{intcomma(valeur)} FCFA"
+
+
+def _ligne(gauche, droite, largeur):
+    return f"{gauche}{droite.rjust(largeur - len(gauche))}" if len(gauche) + len(droite) < largeur \
+        else f"{gauche}\n{droite.rjust(largeur)}"
+
+
+def boutique():
+    """Shop name, header and footer lines of the tickets (TICKET_BOUTIQUE, TICKET_ENTETE, TICKET_PIED)."""
+    return {
+        'nom': settings.TICKET_BOUTIQUE,
+        'entete': settings.TICKET_ENTETE,
+        'pied': settings.TICKET_PIED,
+    }
+
+
+def rendre_texte(vente, largeur=None):
+    """Plain-text receipt, ``largeur`` characters wide (TICKET_LARGEUR by default)."""
+    largeur = largeur or settings.TICKET_LARGEUR
+    infos = boutique()
+    lignes = [infos['nom'].center(largeur)]
+    lignes += [ligne.center(largeur) for ligne in infos['entete']]
+    lignes += [
+        "=" * largeur,
+        f"Ticket N°: {vente.numero}",
+        f"Date: {timezone.localtime(vente.date_vente).strftime('%d/%m/%Y %H:%M')}",
+    ]
+    if vente.client:
+        lignes.append(f"Client: {vente.client}")
+    if vente.telephone_client:
+        lignes.append(f"Tél: {vente.telephone_client}")
+    if vente.vendeur:
+        lignes.append(f"Vendeur: {vente.vendeur.get_full_name() or vente.vendeur.username}")
+    lignes.append("-" * largeur)
+
+    for item in vente.items.all():
+        lignes.extend(textwrap.wrap(item.produit.nom, largeur) or [''])
+        lignes.append(_ligne(
+            f"  {item.quantite} x {intcomma(item.prix_unitaire)}", _montant(item.total_ttc), largeur
+        ))
+        if item.quantite_retournee:
+            lignes.append(f"  dont {item.quantite_retournee} retourné(s)")
+
+    lignes += [
+        "-" * largeur,
+        _ligne("Sous-total HT:", _montant(vente.total_ht), largeur),
+        _ligne("TVA:", _montant(0), largeur),
+        _ligne("TOTAL TTC:", _montant(vente.total_ttc), largeur),
+        f"Paiement: {vente.get_mode_paiement_display()}".center(largeur),
+        "=" * largeur,
+    ]
+    lignes += [ligne.center(largeur) for ligne in infos['pied']]
+    if vente.note:
+        lignes += textwrap.wrap(f"Note: {vente.note}", largeur)
+    return "\n".join(lignes) + "\n"
+
+
+def tickets_pour(queryset):
+    """TicketVente of each sale of ``queryset``, in order.
+
+    Stored tickets are read in one query; the missing ones are rendered from
+    ventes_a_imprimer() and stored. Sales without items are rendered but not
+    stored (drafts).
+    """
+    numeros = list(queryset.values_list('numero', flat=True))
+    tickets = TicketVente.objects.in_bulk(numeros, field_name='numero')
+
+    manquants = [numero for numero in numeros if numero not in tickets]
+    nouveaux = []
+    if manquants:
+        infos = boutique()
+        for vente in ventes_a_imprimer(Vente.objects.filter(numero__in=manquants)):
+            ticket = TicketVente(
+                numero=vente.numero,
+                vente=vente,
+                html=render_to_string('ventes/ticket_contenu.html', {'vente': vente, 'boutique': infos}),
+                texte=rendre_texte(vente),
+            )
+            tickets[vente.numero] = ticket
+            if vente.items.all():
+                nouveaux.append(ticket)
+
+    if nouveaux:
+        try:
+            with transaction.atomic():
+                TicketVente.objects.bulk_create(nouveaux)
+        except IntegrityError:
+            # Rendu en même temps par une autre requête : le sien est gardé
+            pass
+    return [tickets[numero] for numero in numeros if numero in tickets]
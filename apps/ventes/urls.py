@@ -9,9 +9,15 @@ urlpatterns = [
     path('<int:pk>/', views.VenteDetailView.as_view(), name='detail'),
     path('<int:pk>/edit/', views.VenteUpdateView.as_view(), name='edit'),
     path('<int:pk>/ticket/', views.TicketView.as_view(), name='ticket'),
+    path('<int:pk>/annuler/', views.AnnulerVenteView.as_view(), name='annuler'),
     path('<int:pk>/finalize/', views.FinalizeVenteView.as_view(), name='finalize'),
+    path('tickets/', views.TicketsView.as_view(), name='tickets'),
     path('caisse/', views.CaisseView.as_view(), name='caisse'),
+    path('caisse/catalogue/', views.CatalogueCaisseView.as_view(), name='caisse_catalogue'),
+    path('caisse/clients/', views.ClientRechercheView.as_view(), name='caisse_clients'),
+    path('caisse/cloture/', views.ClotureCaisseView.as_view(), name='caisse_cloture'),
     path('dettes/', views.DettesListView.as_view(), name='dettes'),
+    path('dettes/regler/', views.ReglementDettesView.as_view(), name='regler_dettes'),
     path('<int:pk>/payment/', views.EnregistrerPaiementView.as_view(), name='enregistrer_paiement'),
     path('export/', views.ExportVentesView.as_view(), name='export'),
 ]
\ No newline at end of file
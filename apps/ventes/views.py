@@ -2,20 +2,24 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, View
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
-from django.db.models import Sum, Count, Q
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.db.models import Sum, Count, Max, Q, Value
+from django.db.models.functions import Concat, Trim
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 import json
-import csv
-from openpyxl import Workbook
-from .models import Vente, VenteItem
+from .models import Client, Paiement, Vente, VenteItem, normaliser_nom, normaliser_telephone
 from .forms import VenteForm, VenteItemFormSet
-from apps.produits.models import Produit
+from .services import enregistrer_vente, enregistrer_paiement, regler_dettes, creances
+from .tickets import tickets_pour
+from apps.produits.models import Produit, Categorie
 from apps.users.decorators import cashier_access
+from apps.dashboard.exports import ExportMixin, reponse_csv, reponse_xlsx, choix, date_format
 from django.db import transaction
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from django.utils.decorators import method_decorator
+from django.core.exceptions import ValidationError
+from django.conf import settings
 
 
 class VenteListView(LoginRequiredMixin, ListView):
@@ -124,17 +128,33 @@ class DettesListView(LoginRequiredMixin, ListView):
     context_object_name = 'ventes'
     paginate_by = 20
     
+    def get_client(self):
+        """Client looked up by phone (?telephone=), through the indexed normalized number."""
+        if not hasattr(self, '_client'):
+            telephone = normaliser_telephone(self.request.GET.get('telephone'))
+            self._client = Client.objects.filter(telephone_normalise=telephone).first() if telephone else None
+        return self._client
+    
     def get_queryset(self):
-        return Vente.objects.filter(
-            statut_paiement__in=['partiel', 'impaye']
+        queryset = Vente.objects.filter(
+            statut_paiement__in=Vente.STATUTS_IMPAYES
         ).select_related('vendeur').order_by('-date_vente')
+        
+        if self.request.GET.get('telephone'):
+            client = self.get_client()
+            # Numéro inconnu : aucune dette, et non celles des clients de passage
+            if client is None:
+                return queryset.none()
+            queryset = queryset.filter(compte_client=client)
+        return queryset
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Total des dettes
-        dettes = self.get_queryset()
-        total_dettes = sum(v.reste_a_payer for v in dettes)
-        context['total_dettes'] = total_dettes
+        # Total des dettes et ancienneté, calculés en SQL
+        context['creances'] = creances(self.get_queryset())
+        context['total_dettes'] = context['creances']['total']
+        context['client'] = self.get_client()
+        context['telephone'] = self.request.GET.get('telephone', '')
         return context
 
 
@@ -143,39 +163,24 @@ class CaisseView(LoginRequiredMixin, View):
     template_name = 'ventes/caisse.html'
     
     def get(self, request):
-        produits = Produit.objects.filter(actif=True, quantite_stock__gt=0).select_related('categorie')
-        return render(request, self.template_name, {'produits': produits})
+        # Les produits sont chargés par la page via CatalogueCaisseView
+        categories = Categorie.objects.all()
+        return render(request, self.template_name, {'categories': categories})
     
     def post(self, request):
         try:
             data = json.loads(request.body)
-            print(f"DEBUG: Données reçues: {data}")  # DEBUG
             
-            # Create sale
-            vente = Vente.objects.create(
+            vente = enregistrer_vente(
+                vendeur=request.user,
+                items=data.get('items', []),
                 client=data.get('client', ''),
-                telephone_client=data.get('telephone', ''),
+                telephone=data.get('telephone', ''),
                 mode_paiement=data.get('mode_paiement', 'especes'),
-                vendeur=request.user
+                montant_paye=data.get('montant_paye'),
+                cle_idempotence=request.headers.get('Idempotency-Key') or data.get('idempotency_key'),
+                paiements=data.get('paiements')
             )
-            print(f"DEBUG: Vente créée: {vente.numero}")  # DEBUG
-            
-            # Create sale items
-            for item_data in data['items']:
-                print(f"DEBUG: Item data: {item_data}")  # DEBUG
-                produit = Produit.objects.get(pk=item_data['produit_id'])
-                VenteItem.objects.create(
-                    vente=vente,
-                    produit=produit,
-                    quantite=item_data['quantite'],
-                    prix_unitaire=item_data['prix_unitaire'],
-                    prix_original=item_data.get('prix_original', produit.prix_vente)
-                )
-            
-            # Finalize sale
-            montant_paye = data.get('montant_paye')
-            vente.finaliser(montant_recu=montant_paye)
-            print(f"DEBUG: Vente finalisée")  # DEBUG
             
             return JsonResponse({
                 'success': True,
@@ -184,15 +189,137 @@ class CaisseView(LoginRequiredMixin, View):
             })
             
         except Exception as e:
-            import traceback
-            print(f"ERROR: {str(e)}")  # DEBUG
-            print(f"TRACEBACK: {traceback.format_exc()}")  # DEBUG
             return JsonResponse({
                 'success': False,
-                'error': str(e)
+                'error': e.messages[0] if isinstance(e, ValidationError) else str(e)
             }, status=400)
 
 
+@method_decorator(cashier_access, name='dispatch')
+class ClotureCaisseView(LoginRequiredMixin, View):
+    """Cash-up of a day: collected amounts per payment mode.
+    
+    Cashiers see their own takings; admins and managers see every till,
+    or one seller with ?vendeur=<id>.
+    """
+    
+    def get(self, request):
+        jour = request.GET.get('date')
+        try:
+            jour = datetime.strptime(jour, '%Y-%m-%d').date() if jour else timezone.localdate()
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Date invalide'}, status=400)
+        
+        if request.user.role in ['admin', 'manager']:
+            vendeur = request.GET.get('vendeur', '')
+            utilisateur = int(vendeur) if vendeur.isdigit() else None
+        else:
+            utilisateur = request.user
+        
+        totaux = Paiement.totaux_par_mode(jour, utilisateur=utilisateur)
+        return JsonResponse({
+            'success': True,
+            'date': jour.isoformat(),
+            'modes': [dict(ligne, total=float(ligne['total'])) for ligne in totaux],
+            'total': float(sum(ligne['total'] for ligne in totaux)),
+        })
+
+
+@method_decorator(cashier_access, name='dispatch')
+class ClientRechercheView(LoginRequiredMixin, View):
+    """Customer lookup at the till: phone (or name) prefix -> clients with their balances."""
+    
+    def get(self, request):
+        q = request.GET.get('q', '').strip()
+        telephone = normaliser_telephone(q)
+        
+        if len(telephone) >= 3:
+            clients = Client.objects.filter(telephone_normalise__startswith=telephone)
+        elif len(q) >= 2:
+            clients = Client.objects.filter(nom_normalise__startswith=normaliser_nom(q))
+        else:
+            clients = Client.objects.none()
+        
+        return JsonResponse({'clients': [
+            {
+                'id': client.pk,
+                'nom': client.nom,
+                'telephone': client.telephone,
+                'nombre_ventes': client.nombre_ventes,
+                'chiffre_affaires': float(client.chiffre_affaires),
+                'solde_du': float(client.solde_du),
+            }
+            for client in clients[:10]
+        ]})
+
+
+@method_decorator(cashier_access, name='dispatch')
+class CatalogueCaisseView(LoginRequiredMixin, View):
+    """Compact JSON product catalogue for the caisse.
+    
+    The response carries a version (also sent as ETag). With
+    ?since=<version> only products changed since that version are returned;
+    a full catalogue is sent instead if products were deleted meanwhile.
+    """
+    # Recouvrement pour les transactions validées après la lecture de la version
+    MARGE = timedelta(seconds=5)
+    
+    def get(self, request):
+        etat = Produit.objects.aggregate(derniere=Max('date_modification'), nombre=Count('pk'))
+        derniere = etat['derniere']
+        version = f"{int(derniere.timestamp() * 1000000) if derniere else 0}.{etat['nombre']}"
+        etag = f'"{version}"'
+        
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+        
+        produits = None
+        depuis = self.lire_version(request.GET.get('since'))
+        if depuis:
+            date_depuis, nombre_client = depuis
+            crees = Produit.objects.filter(date_ajout__gt=date_depuis).count()
+            # Aucune suppression depuis la version du client : un delta suffit
+            if nombre_client + crees == etat['nombre']:
+                produits = Produit.objects.filter(date_modification__gte=date_depuis - self.MARGE)
+        
+        complet = produits is None
+        if complet:
+            produits = Produit.objects.filter(actif=True, quantite_stock__gt=0)
+        
+        response = JsonResponse({
+            'version': version,
+            'complet': complet,
+            'produits': [
+                {
+                    'id': p['id'],
+                    'nom': p['nom'],
+                    'prix_vente': float(p['prix_vente']),
+                    'quantite_stock': p['quantite_stock'],
+                    'categorie_id': p['categorie_id'],
+                    'image': settings.MEDIA_URL + p['image'] if p['image'] else '',
+                    'actif': p['actif'],
+                }
+                for p in produits.order_by('nom').values(
+                    'id', 'nom', 'prix_vente', 'quantite_stock', 'categorie_id', 'image', 'actif'
+                )
+            ],
+        })
+        response['ETag'] = etag
+        return response
+    
+    @staticmethod
+    def lire_version(version):
+        """Parse a catalogue version into (datetime, product count), or None."""
+        try:
+            horodatage, nombre = version.split('.')
+            date = datetime.fromtimestamp(int(horodatage) / 1000000, tz=dt_timezone.utc)
+            return date, int(nombre)
+        except (AttributeError, ValueError, OverflowError, OSError):
+            return None
+
+
 class FinalizeVenteView(LoginRequiredMixin, View):
     def post(self, request, pk):
         vente = get_object_or_404(Vente, pk=pk)
@@ -213,60 +340,198 @@ class EnregistrerPaiementView(LoginRequiredMixin, View):
     def post(self, request, pk):
         vente = get_object_or_404(Vente, pk=pk)
         try:
-            montant = float(request.POST.get('montant', 0))
+            montant = Decimal(request.POST.get('montant') or '0')
             mode = request.POST.get('mode_paiement', vente.mode_paiement)
             
             if montant <= 0:
                 messages.error(request, "Le montant doit être supérieur à 0")
                 return redirect('ventes:detail', pk=pk)
             
-            with transaction.atomic():
-                # Créer la transaction
-                from apps.finance.models import Transaction
-                Transaction.objects.create(
-                    type='RECETTE',
-                    montant=montant,
-                    description=f"Complément paiement Vente {vente.numero}",
-                    vente=vente,
-                    utilisateur=request.user
-                )
-                
-                # Mettre à jour le montant payé
-                vente.montant_paye += Decimal(str(montant))
-                
-                # Mettre à jour le statut
-                if vente.montant_paye >= vente.total_ttc:
-                    vente.statut_paiement = 'paye'
-                else:
-                    vente.statut_paiement = 'partiel'
-                
-                vente.save(update_fields=['montant_paye', 'statut_paiement'])
-                
+            enregistrer_paiement(vente, [{'mode_paiement': mode, 'montant': montant}], request.user)
             messages.success(request, f"Paiement de {montant} FCFA enregistré avec succès")
+        except InvalidOperation:
+            messages.error(request, "Montant invalide")
         except Exception as e:
-            messages.error(request, f"Erreur lors de l'enregistrement du paiement: {e}")
+            message = e.messages[0] if isinstance(e, ValidationError) else e
+            messages.error(request, f"Erreur lors de l'enregistrement du paiement: {message}")
             
         return redirect(request.META.get('HTTP_REFERER', 'ventes:list'))
 
 
-class TicketView(LoginRequiredMixin, DetailView):
-    model = Vente
-    template_name = 'ventes/ticket.html'
-    context_object_name = 'vente'
 
+class ReglementDettesView(LoginRequiredMixin, View):
+    """Settle several debts with one amount, oldest sale first.
+    
+    Accepts a form post or a JSON body with ``montant``, ``mode_paiement``
+    and either ``client`` (id), ``telephone`` or ``ventes`` (list of ids).
+    """
+    def post(self, request):
+        json_demande = request.content_type == 'application/json'
+        try:
+            if json_demande:
+                data = json.loads(request.body)
+                ventes = data.get('ventes') or []
+            else:
+                data = request.POST
+                ventes = data.getlist('ventes')
+            
+            client = None
+            if data.get('client'):
+                client = get_object_or_404(Client, pk=data.get('client'))
+            elif data.get('telephone'):
+                telephone = normaliser_telephone(data.get('telephone'))
+                client = get_object_or_404(Client, telephone_normalise=telephone) if telephone else None
+            
+            reglees, non_affecte = regler_dettes(
+                data.get('montant') or '0',
+                request.user,
+                mode_paiement=data.get('mode_paiement', 'especes'),
+                client=client,
+                ventes=[int(pk) for pk in ventes]
+            )
+        except (InvalidOperation, ValueError, TypeError):
+            erreur = "Montant ou ventes invalides"
+        except ValidationError as e:
+            erreur = e.messages[0]
+        else:
+            erreur = None
+        
+        if json_demande:
+            if erreur:
+                return JsonResponse({'success': False, 'error': erreur}, status=400)
+            return JsonResponse({
+                'success': True,
+                'ventes': [
+                    {
+                        'id': vente.pk,
+                        'numero': vente.numero,
+                        'montant_paye': str(vente.montant_paye),
+                        'reste_a_payer': str(vente.reste_a_payer),
+                        'statut_paiement': vente.statut_paiement,
+                    }
+                    for vente in reglees
+                ],
+                'non_affecte': str(non_affecte),
+            })
+        
+        if erreur:
+            messages.error(request, f"Erreur lors du règlement: {erreur}")
+        else:
+            message = f"{len(reglees)} vente(s) réglée(s)"
+            if non_affecte > 0:
+                message += f", {non_affecte} FCFA non affectés (supérieur à la dette)"
+            messages.success(request, message)
+        return redirect(request.META.get('HTTP_REFERER', 'ventes:dettes'))
+
+
+class AnnulerVenteView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """Cancel a sale: stock comes back and the amount paid is refunded."""
+    
+    def test_func(self):
+        return self.request.user.role in ['admin', 'manager']
+    
+    def post(self, request, pk):
+        vente = get_object_or_404(Vente, pk=pk)
+        try:
+            remboursement = vente.annuler(utilisateur=request.user, motif=request.POST.get('motif', ''))
+        except ValidationError as e:
+            messages.error(request, f"Annulation impossible: {e.messages[0]}")
+        else:
+            messages.success(request, f"Vente {vente.numero} annulée, {remboursement} FCFA remboursés")
+        return redirect('ventes:detail', pk=pk)
 
-class ExportVentesView(LoginRequiredMixin, View):
+class TicketView(LoginRequiredMixin, View):
+    """Receipt of a sale from its stored ticket; ?format=txt gives the printer text."""
+    
+    def get(self, request, pk):
+        tickets = tickets_pour(Vente.objects.filter(pk=pk))
+        if not tickets:
+            raise Http404("Vente introuvable")
+        ticket = tickets[0]
+        
+        if request.GET.get('format') == 'txt':
+            return HttpResponse(ticket.texte, content_type='text/plain; charset=utf-8')
+        return render(request, 'ventes/ticket.html', {'tickets': tickets, 'titre': f"Ticket {ticket.numero}"})
+
+
+class TicketsView(LoginRequiredMixin, View):
+    """Several receipts in one response, e.g. end-of-day reprints.
+    
+    ?date=YYYY-MM-DD (default today) or ?ids=1,2,3; cashiers get their own
+    sales, admins and managers every till or ?vendeur=<id>. With
+    ?format=txt the printer text of all tickets is downloaded.
+    """
+    max_tickets = 500
+    
     def get(self, request):
-        format_export = request.GET.get('format', 'csv')
-        date_debut = request.GET.get('date_debut')
-        date_fin = request.GET.get('date_fin')
+        ventes = Vente.objects.order_by('date_vente', 'pk')
+        ids = request.GET.get('ids')
+        try:
+            if ids:
+                ventes = ventes.filter(pk__in=[int(pk) for pk in ids.split(',') if pk.strip()])
+                jour = timezone.localdate()
+            else:
+                jour = request.GET.get('date')
+                jour = datetime.strptime(jour, '%Y-%m-%d').date() if jour else timezone.localdate()
+                debut = timezone.make_aware(datetime.combine(jour, datetime.min.time()))
+                ventes = ventes.filter(date_vente__gte=debut, date_vente__lt=debut + timedelta(days=1))
+        except ValueError:
+            return HttpResponse("Paramètres invalides", status=400)
+        
+        if request.user.role in ['admin', 'manager']:
+            vendeur = request.GET.get('vendeur', '')
+            if vendeur.isdigit():
+                ventes = ventes.filter(vendeur_id=int(vendeur))
+        else:
+            ventes = ventes.filter(vendeur=request.user)
+        
+        tickets = tickets_pour(ventes[:self.max_tickets])
+        if request.GET.get('format') == 'txt':
+            response = HttpResponse("\n\n\n".join(ticket.texte for ticket in tickets),
+                                    content_type='text/plain; charset=utf-8')
+            response['Content-Disposition'] = f'attachment; filename="tickets_{jour:%Y%m%d}.txt"'
+            return response
+        return render(request, 'ventes/ticket.html', {
+            'tickets': tickets, 'titre': f"Tickets du {jour:%d/%m/%Y}"
+        })
+
+
+class ExportVentesView(LoginRequiredMixin, ExportMixin, View):
+    type_export = 'ventes'
+    nom_fichier = 'ventes'
+    titre = "Ventes"
+    colonnes = [
+        ('Numéro', 'numero'),
+        ('Date', 'date_vente', date_format('%d/%m/%Y %H:%M')),
+        ('Client', 'client'),
+        ('Total TTC', 'total_ttc'),
+        ('Mode paiement', 'mode_paiement', choix(Vente.MODE_PAIEMENT_CHOICES)),
+        ('Vendeur', 'vendeur_nom'),
+    ]
+    filtres = ['date_debut', 'date_fin']
+    
+    @classmethod
+    def export_queryset(cls, parametres):
+        date_debut = parametres.get('date_debut')
+        date_fin = parametres.get('date_fin')
         
-        queryset = Vente.objects.all()
+        # Nom du vendeur calculé en SQL : pas de requête par ligne
+        queryset = Vente.objects.annotate(
+            vendeur_nom=Trim(Concat('vendeur__first_name', Value(' '), 'vendeur__last_name'))
+        )
         
         if date_debut:
             queryset = queryset.filter(date_vente__date__gte=date_debut)
         if date_fin:
             queryset = queryset.filter(date_vente__date__lte=date_fin)
+        return queryset
+    
+    def get(self, request):
+        if request.GET.get('arriere_plan'):
+            return self.lancer_export(request)
+        
+        format_export = request.GET.get('format', 'csv')
+        queryset = self.export_queryset(request.GET)
         
         if format_export == 'excel':
             return self.export_excel(queryset)
@@ -274,48 +539,7 @@ class ExportVentesView(LoginRequiredMixin, View):
             return self.export_csv(queryset)
     
     def export_csv(self, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="ventes.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Numéro', 'Date', 'Client', 'Total TTC', 'Mode paiement', 'Vendeur'])
-        
-        for vente in queryset:
-            writer.writerow([
-                vente.numero,
-                vente.date_vente.strftime('%d/%m/%Y %H:%M'),
-                vente.client,
-                vente.total_ttc,
-                vente.get_mode_paiement_display(),
-                vente.vendeur.get_full_name() if vente.vendeur else ''
-            ])
-        
-        return response
+        return reponse_csv(queryset, self.colonnes, 'ventes.csv')
     
     def export_excel(self, queryset):
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Ventes"
-        
-        # Headers
-        headers = ['Numéro', 'Date', 'Client', 'Total TTC', 'Mode paiement', 'Vendeur']
-        ws.append(headers)
-        
-        # Data
-        for vente in queryset:
-            ws.append([
-                vente.numero,
-                vente.date_vente.strftime('%d/%m/%Y %H:%M'),
-                vente.client,
-                float(vente.total_ttc),
-                vente.get_mode_paiement_display(),
-                vente.vendeur.get_full_name() if vente.vendeur else ''
-            ])
-        
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename="ventes.xlsx"'
-        wb.save(response)
-        
-        return response
\ No newline at end of file
+        return reponse_xlsx(queryset, self.colonnes, 'ventes.xlsx', self.titre)
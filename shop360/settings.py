@@ -88,6 +88,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Transactions ouvertes en écriture (BEGIN IMMEDIATE) : une caisse attend son
+            # tour au lieu d'échouer en "database is locked" en passant de lecture à écriture
+            'transaction_mode': 'IMMEDIATE',
+            # Attente maximale du verrou d'écriture, en secondes
+            'timeout': config('SQLITE_TIMEOUT', default=20, cast=int),
+        },
     }
 }
 
@@ -127,6 +134,53 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Numérotation des ventes/achats : taille des blocs pré-alloués par processus
+# (1 = numéros strictement consécutifs)
+NUMEROTATION_BLOC = config('NUMEROTATION_BLOC', default=1, cast=int)
+
+# Durée de conservation des clés d'idempotence de la caisse
+IDEMPOTENCE_TTL_HEURES = config('IDEMPOTENCE_TTL_HEURES', default=48, cast=int)
+
+# Nombre de ventes hors ligne écrites par transaction lors d'une synchronisation
+SYNC_TAILLE_LOT = config('SYNC_TAILLE_LOT', default=100, cast=int)
+
+# Cache des scans code-barres (par processus) : nombre d'entrées et durée en secondes
+SCAN_CACHE_TAILLE = config('SCAN_CACHE_TAILLE', default=50000, cast=int)
+SCAN_CACHE_TTL = config('SCAN_CACHE_TTL', default=30, cast=int)
+
+# Exports : nombre de lignes lues par aller-retour en base
+EXPORT_TAILLE_LOT = config('EXPORT_TAILLE_LOT', default=2000, cast=int)
+
+# Exports en arrière-plan : durée de conservation des fichiers (heures)
+# et intervalle d'interrogation de la file par le worker (secondes)
+EXPORT_DUREE_HEURES = config('EXPORT_DUREE_HEURES', default=24, cast=int)
+EXPORT_INTERVALLE_SECONDES = config('EXPORT_INTERVALLE_SECONDES', default=5, cast=int)
+
+# Exports en arrière-plan : dossier privé des fichiers (hors MEDIA_ROOT, jamais servi
+# directement) et durée au-delà de laquelle un export en cours est considéré abandonné
+EXPORT_ROOT = config('EXPORT_ROOT', default=str(BASE_DIR / 'exports'))
+EXPORT_DELAI_MINUTES = config('EXPORT_DELAI_MINUTES', default=60, cast=int)
+
+# Statistiques des ventes (API) : durée de mise en cache en secondes
+STATISTIQUES_CACHE_TTL = config('STATISTIQUES_CACHE_TTL', default=10, cast=int)
+
+# Tickets de caisse : largeur de la version texte en caractères
+# (42 pour une imprimante 80 mm, 32 pour 58 mm)
+TICKET_LARGEUR = config('TICKET_LARGEUR', default=42, cast=int)
+
+# Tickets de caisse : nom de la boutique, lignes d'en-tête et de pied, communs au
+# ticket HTML et à la version texte
+TICKET_BOUTIQUE = config('TICKET_BOUTIQUE', default="L'EXEMPLE SHOP")
+TICKET_ENTETE = (
+    'Boutique',
+    'Téléphones & Accessoires',
+    f"Tel: {config('TICKET_TELEPHONE', default='+33 1 23 45 67 89')}",
+)
+TICKET_PIED = ('Merci de votre visite !', f'À bientôt chez {TICKET_BOUTIQUE}')
+
+# Valorisation du stock : 'cump' (coût unitaire moyen pondéré) ou 'fifo' (couches par entrée)
+STOCK_VALORISATION = config('STOCK_VALORISATION', default='cump')
+
 # Custom User Model
 AUTH_USER_MODEL = 'users.User'
 